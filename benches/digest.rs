@@ -0,0 +1,160 @@
+use criterion::{black_box, criterion_group, criterion_main, BenchmarkId, Criterion, Throughput};
+
+use protein_digest::digest::{digest, digest_offsets};
+use protein_digest::enzyme::Enzyme;
+use protein_digest::index::PeptideIndex;
+
+const EGFR_FASTA: &str = include_str!("../benchmarks/egfr.fasta");
+
+/// Residues weighted by their approximate frequency in UniProtKB
+const RESIDUES: &[u8] = b"AAAAAAAARRRRRNNNNDDDDDCCQQQQEEEEEEEGGGGGGGHHHIIIIIILLLLLLLLLLKKKKKKMMFFFFPPPPPSSSSSSSTTTTTWYYYVVVVVVV";
+
+fn egfr() -> String {
+    EGFR_FASTA
+        .lines()
+        .filter(|line| !line.starts_with('>'))
+        .collect()
+}
+
+/// Deterministic random proteome, generated with the same linear congruential
+/// generator as the Python benchmarks
+fn synthetic_proteome(n_proteins: usize, seed: u64) -> Vec<String> {
+    let mut state = seed;
+    let mut next = || {
+        state = state
+            .wrapping_mul(6364136223846793005)
+            .wrapping_add(1442695040888963407);
+        (state >> 33) as usize
+    };
+    (0..n_proteins)
+        .map(|_| {
+            let len = 100 + next() % 900;
+            let mut seq = String::with_capacity(len);
+            seq.push('M');
+            for _ in 1..len {
+                seq.push(RESIDUES[next() % RESIDUES.len()] as char);
+            }
+            seq
+        })
+        .collect()
+}
+
+/// (digestion, miscleavages, min_len, max_len)
+const CASES: [(&str, usize, usize, usize); 7] = [
+    ("full", 0, 6, 30),
+    ("full", 2, 6, 30),
+    ("full", 2, 7, 50),
+    ("semi", 0, 6, 30),
+    ("semi", 2, 6, 30),
+    ("none", 0, 6, 30),
+    ("none", 0, 7, 50),
+];
+
+fn bench_single_protein(c: &mut Criterion) {
+    let seq = egfr();
+    let enzyme = Enzyme::from_name("trypsin").unwrap();
+    let mut group = c.benchmark_group("egfr");
+    for (digestion, miscleavages, min_len, max_len) in CASES {
+        let n_peptides = digest(
+            &seq,
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            true,
+        )
+        .len();
+        group.throughput(Throughput::Elements(n_peptides as u64));
+        let name = format!("{digestion}/mc{miscleavages}/len{min_len}-{max_len}");
+        group.bench_function(BenchmarkId::new("peptides", &name), |b| {
+            b.iter(|| {
+                digest(
+                    black_box(&seq),
+                    min_len,
+                    max_len,
+                    &enzyme,
+                    digestion,
+                    miscleavages,
+                    true,
+                )
+            })
+        });
+        group.bench_function(BenchmarkId::new("offsets", &name), |b| {
+            b.iter(|| {
+                digest_offsets(
+                    black_box(seq.as_bytes()),
+                    min_len,
+                    max_len,
+                    &enzyme,
+                    digestion,
+                    miscleavages,
+                    true,
+                )
+            })
+        });
+    }
+    group.finish();
+}
+
+fn bench_proteome(c: &mut Criterion) {
+    let seqs = synthetic_proteome(1000, 42);
+    let enzyme = Enzyme::from_name("trypsin").unwrap();
+    let mut group = c.benchmark_group("proteome");
+    group.sample_size(10);
+    for (digestion, miscleavages, min_len, max_len) in CASES {
+        let n_peptides: usize = seqs
+            .iter()
+            .map(|seq| {
+                digest(
+                    seq,
+                    min_len,
+                    max_len,
+                    &enzyme,
+                    digestion,
+                    miscleavages,
+                    true,
+                )
+                .len()
+            })
+            .sum();
+        group.throughput(Throughput::Elements(n_peptides as u64));
+        let name = format!("{digestion}/mc{miscleavages}/len{min_len}-{max_len}");
+        group.bench_function(BenchmarkId::new("peptides", &name), |b| {
+            b.iter(|| {
+                for seq in &seqs {
+                    black_box(digest(
+                        seq,
+                        min_len,
+                        max_len,
+                        &enzyme,
+                        digestion,
+                        miscleavages,
+                        true,
+                    ));
+                }
+            })
+        });
+        if digestion == "none" {
+            // the non-specific peptides of the proteome are too many to index repeatedly
+            continue;
+        }
+        group.bench_function(BenchmarkId::new("index", &name), |b| {
+            b.iter(|| {
+                PeptideIndex::build(
+                    black_box(&seqs),
+                    min_len,
+                    max_len,
+                    &enzyme,
+                    digestion,
+                    miscleavages,
+                    true,
+                )
+            })
+        });
+    }
+    group.finish();
+}
+
+criterion_group!(benches, bench_single_protein, bench_proteome);
+criterion_main!(benches);
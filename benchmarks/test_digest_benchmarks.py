@@ -0,0 +1,137 @@
+"""Digestion benchmarks for all backends.
+
+Run with `pytest benchmarks` (requires pytest-benchmark), optionally with
+`--benchmark-json` to store the results for regression comparisons with
+`pytest-benchmark compare`. Besides the timings, the throughput in peptides per
+second and the peak memory of a single run are reported as extra info.
+
+Peak memory is measured with tracemalloc and thus only covers allocations made
+through Python, e.g. the returned peptide strings but not the temporary
+buffers of the Rust extension.
+"""
+
+import importlib
+import pathlib
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+EGFR_FASTA = pathlib.Path(__file__).parent / "egfr.fasta"
+
+# residues weighted by their approximate frequency in UniProtKB
+RESIDUES = (
+    "AAAAAAAARRRRRNNNNDDDDDCCQQQQEEEEEEEGGGGGGGHHHIIIIIILLLLLLLLLLKKKKKKMMFFFF"
+    "PPPPPSSSSSSSTTTTTWYYYVVVVVVV"
+)
+
+# (digestion, miscleavages, min_len, max_len)
+CASES = [
+    ("full", 0, 6, 30),
+    ("full", 2, 6, 30),
+    ("full", 2, 7, 50),
+    ("semi", 0, 6, 30),
+    ("semi", 2, 6, 30),
+    ("none", 0, 6, 30),
+    ("none", 0, 7, 50),
+]
+
+
+def read_egfr():
+    with open(EGFR_FASTA) as f:
+        return "".join(line.strip() for line in f if not line.startswith(">"))
+
+
+def synthetic_proteome(n_proteins: int, seed: int = 42):
+    """Deterministic random proteome, generated with the same linear
+    congruential generator as the Rust benchmarks in benches/digest.rs"""
+    state = seed
+
+    def next_random():
+        nonlocal state
+        state = (state * 6364136223846793005 + 1442695040888963407) % 2**64
+        return state >> 33
+
+    seqs = []
+    for _ in range(n_proteins):
+        seq_len = 100 + next_random() % 900
+        seqs.append(
+            "M"
+            + "".join(
+                RESIDUES[next_random() % len(RESIDUES)] for _ in range(seq_len - 1)
+            )
+        )
+    return seqs
+
+
+@pytest.fixture(params=["digest", "digest_np", "digest_rs"])
+def backend(request):
+    try:
+        return importlib.import_module(f"protein_digest.{request.param}")
+    except ImportError as e:
+        pytest.skip(f"backend {request.param} not available: {e}")
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(benchmark, digest_all):
+    n_peptides = digest_all()
+    benchmark.extra_info["peptides"] = n_peptides
+    benchmark.extra_info["peak_memory_mb"] = peak_memory(digest_all) / 2**20
+    benchmark(digest_all)
+    benchmark.extra_info["peptides_per_second"] = n_peptides / benchmark.stats["mean"]
+
+
+@pytest.mark.parametrize("digestion,miscleavages,min_len,max_len", CASES)
+def test_single_protein(benchmark, backend, digestion, miscleavages, min_len, max_len):
+    seq = read_egfr()
+
+    def digest_all():
+        return len(
+            list(
+                backend.get_digested_peptides(
+                    seq,
+                    min_len=min_len,
+                    max_len=max_len,
+                    digestion=digestion,
+                    miscleavages=miscleavages,
+                )
+            )
+        )
+
+    run_benchmark(benchmark, digest_all)
+
+
+# non-specific digestion of a whole proteome takes minutes in pure Python
+@pytest.mark.parametrize(
+    "digestion,miscleavages,min_len,max_len",
+    [case for case in CASES if case[0] != "none"],
+)
+def test_proteome(benchmark, backend, digestion, miscleavages, min_len, max_len):
+    seqs = synthetic_proteome(500)
+
+    def digest_all():
+        return sum(
+            len(
+                list(
+                    backend.get_digested_peptides(
+                        seq,
+                        min_len=min_len,
+                        max_len=max_len,
+                        digestion=digestion,
+                        miscleavages=miscleavages,
+                    )
+                )
+            )
+            for seq in seqs
+        )
+
+    run_benchmark(benchmark, digest_all)
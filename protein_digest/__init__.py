@@ -0,0 +1,24 @@
+import importlib
+
+# digestion backends, ordered from fastest to slowest
+BACKENDS = {"rust": "digest_rs", "numpy": "digest_np", "python": "digest"}
+
+
+def get_backend(name: str = "auto"):
+    """Returns the module of a digestion backend.
+
+    All backends provide get_digested_peptides with the same signature. With
+    "auto" the compiled Rust extension is used if it is available, otherwise
+    the NumPy fallback and finally the pure Python implementation.
+    """
+    if name == "auto":
+        error = None
+        for backend in BACKENDS.values():
+            try:
+                return importlib.import_module(f".{backend}", __name__)
+            except ImportError as e:
+                error = e
+        raise ImportError("No digestion backend can be imported") from error
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    return importlib.import_module(f".{BACKENDS[name]}", __name__)
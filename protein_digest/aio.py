@@ -0,0 +1,210 @@
+"""asyncio interface that digests without blocking the event loop.
+
+Digestion runs on a bounded thread pool, with the Rust backend the worker
+threads run in parallel since the GIL is released while digesting.
+Concurrent requests for short sequences with the same parameters are
+collected for up to batch_delay seconds and digested with a single
+digest_many call, which saves the per-call overhead for small proteins.
+
+Cancelling a request that is still waiting for a worker or for its batch
+removes it, a digestion already running in a worker thread finishes in the
+background and its result is discarded.
+"""
+
+import asyncio
+import functools
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, List, Optional, Tuple, Union
+
+from . import digest, get_backend
+
+
+class AsyncDigester:
+    """Digests sequences on a thread pool of max_workers threads.
+
+    Sequences of at most batch_max_len residues are batched, up to batch_size
+    of them per batch. Can be used as an async context manager, which shuts
+    down the thread pool on exit.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        batch_size: int = 64,
+        batch_delay: float = 0.001,
+        batch_max_len: int = 2000,
+        backend: str = "auto",
+    ):
+        self.module = get_backend(backend)
+        self.executor = ThreadPoolExecutor(
+            max_workers or os.cpu_count(), thread_name_prefix="protein_digest"
+        )
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.batch_max_len = batch_max_len
+        # pending batches as lists of (seq, future), by event loop and parameters
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    async def digest(
+        self,
+        seq: str,
+        min_len: int = 6,
+        max_len: int = 50,
+        pre: List[str] = ["K", "R"],
+        not_post: List[str] = ["P"],
+        post: List[str] = [],
+        digestion: str = "full",
+        miscleavages: int = 0,
+        methionine_cleavage: bool = True,
+        enzyme=None,
+    ) -> List[str]:
+        """Digests a sequence into a list of peptides"""
+        kwargs = dict(
+            min_len=min_len,
+            max_len=max_len,
+            pre=pre,
+            not_post=not_post,
+            post=post,
+            digestion=digestion,
+            miscleavages=miscleavages,
+            methionine_cleavage=methionine_cleavage,
+            enzyme=enzyme,
+        )
+        loop = asyncio.get_running_loop()
+        if len(seq) > self.batch_max_len or self.batch_size <= 1:
+            (peptides,) = await loop.run_in_executor(
+                self.executor, functools.partial(self.digest_batch, [seq], kwargs)
+            )
+            return peptides
+
+        key = (loop, min_len, max_len, tuple(pre), tuple(not_post), tuple(post))
+        key += (digestion, miscleavages, methionine_cleavage, enzyme)
+        future = loop.create_future()
+        with self._lock:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = []
+                loop.call_later(self.batch_delay, self._flush, key, batch, kwargs)
+            batch.append((seq, future))
+            full = len(batch) >= self.batch_size
+        if full:
+            self._flush(key, batch, kwargs)
+        return await future
+
+    def _flush(self, key, batch, kwargs):
+        """Submits a pending batch to the thread pool, unless it has been
+        submitted already"""
+        with self._lock:
+            if self._batches.get(key) is not batch:
+                return
+            del self._batches[key]
+        batch = [(seq, future) for seq, future in batch if not future.cancelled()]
+        if not batch:
+            return
+
+        def set_results(task):
+            futures = [future for _, future in batch]
+            if task.cancelled():
+                for future in futures:
+                    future.cancel()
+                return
+            if task.exception() is not None:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(task.exception())
+                return
+            for future, peptides in zip(futures, task.result()):
+                if not future.done():
+                    future.set_result(peptides)
+
+        seqs = [seq for seq, _ in batch]
+        task = key[0].run_in_executor(
+            self.executor, functools.partial(self.digest_batch, seqs, kwargs)
+        )
+        task.add_done_callback(set_results)
+
+    def digest_batch(self, seqs: List[str], kwargs: dict) -> List[List[str]]:
+        """Digests sequences in the calling thread, in a single call if the
+        backend provides digest_many"""
+        if len(seqs) == 1:
+            return [list(self.module.get_digested_peptides(seqs[0], **kwargs))]
+        if hasattr(self.module, "digest_many"):
+            return self.module.digest_many(seqs, **kwargs)
+        return [list(self.module.get_digested_peptides(seq, **kwargs)) for seq in seqs]
+
+    async def digest_proteome(
+        self,
+        proteins: Union[str, os.PathLike, Iterable[Tuple[str, str]]],
+        batch_size: int = 1000,
+        **kwargs,
+    ) -> AsyncIterator[Tuple[str, List[str]]]:
+        """Digests a (gzipped) FASTA file or (protein_id, sequence) tuples.
+
+        Yields (protein_id, peptides) tuples in input order. Proteins are read
+        and digested on the thread pool in batches of batch_size proteins, the
+        next batch is digested while the current one is consumed. Further
+        keyword arguments are the digestion parameters of digest.
+        """
+        if isinstance(proteins, (str, os.PathLike)):
+            proteins = digest.read_fasta(proteins)
+        proteins = iter(proteins)
+
+        def digest_next_batch():
+            batch = list(itertools.islice(proteins, batch_size))
+            protein_ids = [protein_id for protein_id, _ in batch]
+            seqs = [seq for _, seq in batch]
+            return list(zip(protein_ids, self.digest_batch(seqs, kwargs)))
+
+        loop = asyncio.get_running_loop()
+        pending = loop.run_in_executor(self.executor, digest_next_batch)
+        try:
+            while True:
+                batch = await pending
+                if not batch:
+                    return
+                pending = loop.run_in_executor(self.executor, digest_next_batch)
+                for protein in batch:
+                    yield protein
+        finally:
+            pending.cancel()
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.shutdown(wait=False)
+
+
+_default_digester = None
+_default_lock = threading.Lock()
+
+
+def default_digester() -> AsyncDigester:
+    """Shared AsyncDigester with default settings, created on first use"""
+    global _default_digester
+    with _default_lock:
+        if _default_digester is None:
+            _default_digester = AsyncDigester()
+        return _default_digester
+
+
+async def adigest(seq: str, **kwargs) -> List[str]:
+    """Digests a sequence on the shared AsyncDigester, keyword arguments are
+    the digestion parameters of get_digested_peptides"""
+    return await default_digester().digest(seq, **kwargs)
+
+
+async def adigest_proteome(
+    proteins: Union[str, os.PathLike, Iterable[Tuple[str, str]]], **kwargs
+) -> AsyncIterator[Tuple[str, List[str]]]:
+    """Async iterator over the digested proteins of a FASTA file or of
+    (protein_id, sequence) tuples, see AsyncDigester.digest_proteome"""
+    async for protein in default_digester().digest_proteome(proteins, **kwargs):
+        yield protein
@@ -0,0 +1,198 @@
+"""Apache Arrow and Parquet export of digestion results, requires pyarrow.
+
+Peptides are returned as Arrow record batches with the columns protein_id,
+peptide, start and (exclusive) end. The peptide column is built without
+copying from a buffer of concatenated residues and an offset buffer, so no
+Python string is created per peptide. With the Rust backend both buffers are
+filled during digestion. Record batches implement the Arrow C data interface
+and can be passed to Polars (polars.from_arrow) or DuckDB without copying.
+"""
+
+import os
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import digest, digest_np, get_backend
+
+SCHEMA = pa.schema(
+    [
+        ("protein_id", pa.dictionary(pa.uint32(), pa.string())),
+        ("peptide", pa.large_string()),
+        ("start", pa.uint32()),
+        ("end", pa.uint32()),
+    ]
+)
+
+
+def digest_columns(
+    seqs: Sequence[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme=None,
+    backend: str = "auto",
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Digests sequences into peptide columns.
+
+    Returns (protein_indices, starts, ends, offsets, residues) NumPy arrays,
+    where the i-th peptide is residues[offsets[i]:offsets[i + 1]]. Backends
+    without positions, i.e. the pure Python backend, use the NumPy backend.
+    """
+    kwargs = dict(
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+    module = get_backend(backend)
+    if hasattr(module, "digest_many_columnar"):
+        return module.digest_many_columnar(seqs, **kwargs)
+    if not hasattr(module, "get_digested_offsets"):
+        module = digest_np
+
+    spans = [module.get_digested_offsets(seq, **kwargs) for seq in seqs]
+    counts = [len(starts) for starts, _ in spans]
+    protein_indices = np.repeat(np.arange(len(seqs), dtype=np.uint32), counts)
+    starts = np.concatenate([starts for starts, _ in spans] + [np.zeros(0, np.uint32)])
+    ends = np.concatenate([ends for _, ends in spans] + [np.zeros(0, np.uint32)])
+
+    lengths = ends.astype(np.int64) - starts
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    # gather the residues of all peptides from the concatenated sequences
+    all_residues = np.frombuffer("".join(seqs).encode("ascii"), dtype=np.uint8)
+    seq_offsets = np.zeros(len(seqs) + 1, dtype=np.int64)
+    np.cumsum([len(seq) for seq in seqs], out=seq_offsets[1:])
+    peptide_starts = seq_offsets[protein_indices] + starts
+    positions = np.repeat(peptide_starts - offsets[:-1], lengths)
+    positions += np.arange(offsets[-1])
+    return protein_indices, starts, ends, offsets, all_residues[positions]
+
+
+def to_record_batch(
+    seqs: Sequence[str],
+    protein_ids: Optional[Sequence[str]] = None,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme=None,
+    backend: str = "auto",
+) -> pa.RecordBatch:
+    """Digests sequences into an Arrow record batch with one row per peptide.
+
+    protein_id is dictionary encoded with the protein_ids as dictionary,
+    which default to the indices of the sequences as strings.
+    """
+    protein_indices, starts, ends, offsets, residues = digest_columns(
+        seqs,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+        backend=backend,
+    )
+    if protein_ids is None:
+        protein_ids = [str(i) for i in range(len(seqs))]
+    peptides = pa.LargeStringArray.from_buffers(
+        len(starts), pa.py_buffer(offsets), pa.py_buffer(residues)
+    )
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.DictionaryArray.from_arrays(
+                pa.array(protein_indices), pa.array(protein_ids, pa.string())
+            ),
+            peptides,
+            pa.array(starts),
+            pa.array(ends),
+        ],
+        schema=SCHEMA,
+    )
+
+
+def iter_record_batches(
+    proteins: Union[str, os.PathLike, Iterable[Tuple[str, str]]],
+    batch_size: int = 10000,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme=None,
+    backend: str = "auto",
+) -> Iterator[pa.RecordBatch]:
+    """Digests a (gzipped) FASTA file or (protein_id, sequence) tuples into
+    record batches of the peptides of up to batch_size proteins each"""
+    if isinstance(proteins, (str, os.PathLike)):
+        proteins = digest.read_fasta(proteins)
+
+    def record_batch(batch):
+        protein_ids, seqs = zip(*batch)
+        return to_record_batch(
+            seqs,
+            protein_ids,
+            min_len=min_len,
+            max_len=max_len,
+            pre=pre,
+            not_post=not_post,
+            post=post,
+            digestion=digestion,
+            miscleavages=miscleavages,
+            methionine_cleavage=methionine_cleavage,
+            enzyme=enzyme,
+            backend=backend,
+        )
+
+    batch = []
+    for protein in proteins:
+        batch.append(protein)
+        if len(batch) >= batch_size:
+            yield record_batch(batch)
+            batch = []
+    if batch:
+        yield record_batch(batch)
+
+
+def write_parquet(
+    path: Union[str, os.PathLike],
+    proteins: Union[str, os.PathLike, Iterable[Tuple[str, str]]],
+    batch_size: int = 10000,
+    compression: str = "zstd",
+    **kwargs,
+) -> int:
+    """Digests a (gzipped) FASTA file or (protein_id, sequence) tuples into a
+    Parquet file, streaming batches of batch_size proteins such that memory
+    does not depend on the size of the proteome. Further keyword arguments
+    are passed to iter_record_batches. Returns the number of peptides."""
+    n_peptides = 0
+    with pq.ParquetWriter(path, SCHEMA, compression=compression) as writer:
+        for batch in iter_record_batches(proteins, batch_size, **kwargs):
+            writer.write_batch(batch)
+            n_peptides += batch.num_rows
+    return n_peptides
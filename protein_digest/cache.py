@@ -0,0 +1,360 @@
+"""Persistent on-disk cache for digested proteomes.
+
+Entries are keyed on a hash of the FASTA file content (or of the sequences)
+together with all digestion parameters and the backend, and stored as a
+single binary file per entry, which is memory-mapped on a cache hit such that
+loading does not depend on the number of peptides. The total size of the
+cache directory is bounded, least recently used entries are evicted first.
+
+Entry file layout (little endian), all arrays are 8-byte aligned:
+
+    magic         8 bytes   b"PDCACHE\\0"
+    version       uint32
+    reserved      uint32
+    n_proteins    uint64
+    n_peptides    uint64
+    n_residues    uint64
+    n_id_bytes    uint64
+    protein_offsets  uint64[n_proteins + 1]  peptides of protein i are
+                                             peptide_offsets[p[i]:p[i + 1]]
+    peptide_offsets  uint64[n_peptides + 1]  into residues
+    id_offsets       uint64[n_proteins + 1]  into ids
+    residues         uint8[n_residues]       concatenated peptides
+    ids              uint8[n_id_bytes]       concatenated UTF-8 protein ids
+"""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from . import digest, get_backend
+
+MAGIC = b"PDCACHE\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQ")
+SUFFIX = ".pdc"
+
+
+class CachedProteome:
+    """Digested proteome backed by a memory-mapped cache entry.
+
+    Behaves like a read-only list of (protein_id, peptides) tuples in the
+    order of the FASTA file, peptides are only decoded when accessed.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"Truncated cache entry: {path}")
+        magic, version, _, n_proteins, n_peptides, n_residues, n_id_bytes = (
+            HEADER.unpack(header)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"Not a digest cache entry: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported cache entry version {version}: {path}")
+
+        offset = HEADER.size
+        arrays = []
+        for dtype, size in [
+            (np.uint64, n_proteins + 1),
+            (np.uint64, n_peptides + 1),
+            (np.uint64, n_proteins + 1),
+            (np.uint8, n_residues),
+            (np.uint8, n_id_bytes),
+        ]:
+            if size == 0:
+                arrays.append(np.zeros(0, dtype=dtype))
+            else:
+                arrays.append(
+                    np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=size)
+                )
+            offset += size * np.dtype(dtype).itemsize
+        (
+            self.protein_offsets,
+            self.peptide_offsets,
+            id_offsets,
+            self.residues,
+            ids,
+        ) = arrays
+
+        # id offsets are byte offsets, ids are decoded one by one
+        ids = ids.tobytes()
+        id_offsets = id_offsets.tolist()
+        self.protein_ids = [
+            ids[start:end].decode() for start, end in zip(id_offsets, id_offsets[1:])
+        ]
+
+    def __len__(self) -> int:
+        return len(self.protein_ids)
+
+    def __getitem__(self, i: int) -> Tuple[str, List[str]]:
+        if i < 0:
+            i += len(self)
+        first, last = self.protein_offsets[i : i + 2].tolist()
+        return self.protein_ids[i], self._decode(first, last)
+
+    def __iter__(self) -> Iterator[Tuple[str, List[str]]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def peptides(self) -> List[str]:
+        """All peptides of all proteins as a flat list"""
+        return self._decode(0, len(self.peptide_offsets) - 1)
+
+    def _decode(self, first: int, last: int) -> List[str]:
+        offsets = self.peptide_offsets[first : last + 1]
+        if len(offsets) < 2:
+            return []
+        residues = self.residues[offsets[0] : offsets[-1]].tobytes().decode("ascii")
+        offsets = (offsets - offsets[0]).tolist()
+        return [residues[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
+def write_entry(
+    path: Union[str, os.PathLike], proteins: Iterable[Tuple[str, List[str]]]
+):
+    """Writes (protein_id, peptides) tuples to a cache entry file"""
+    protein_ids, residues = [], []
+    peptide_lengths, protein_counts = [], []
+    for protein_id, peptides in proteins:
+        protein_ids.append(protein_id)
+        residues.append("".join(peptides))
+        peptide_lengths.extend(len(peptide) for peptide in peptides)
+        protein_counts.append(len(peptides))
+
+    ids = [protein_id.encode() for protein_id in protein_ids]
+    residues = "".join(residues).encode("ascii")
+
+    def cumulative(lengths):
+        offsets = np.zeros(len(lengths) + 1, dtype="<u8")
+        np.cumsum(lengths, out=offsets[1:])
+        return offsets
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        0,
+        len(protein_ids),
+        len(peptide_lengths),
+        len(residues),
+        sum(len(protein_id) for protein_id in ids),
+    )
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(cumulative(protein_counts).tobytes())
+        f.write(cumulative(peptide_lengths).tobytes())
+        f.write(cumulative([len(protein_id) for protein_id in ids]).tobytes())
+        f.write(residues)
+        f.write(b"".join(ids))
+
+
+class DigestCache:
+    """Size-bounded on-disk cache of digested proteomes.
+
+    The cache directory defaults to $PROTEIN_DIGEST_CACHE or
+    ~/.cache/protein_digest. Entries are written atomically, so the cache can
+    be shared by concurrent jobs.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Union[str, os.PathLike]] = None,
+        max_size: int = 2 * 2**30,
+    ):
+        if cache_dir is None:
+            cache_dir = os.environ.get(
+                "PROTEIN_DIGEST_CACHE",
+                os.path.join(os.path.expanduser("~"), ".cache", "protein_digest"),
+            )
+        self.cache_dir = os.fspath(cache_dir)
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def digest_fasta(
+        self,
+        fasta_file: Union[str, os.PathLike],
+        min_len: int = 6,
+        max_len: int = 50,
+        pre: List[str] = ["K", "R"],
+        not_post: List[str] = ["P"],
+        post: List[str] = [],
+        digestion: str = "full",
+        miscleavages: int = 0,
+        methionine_cleavage: bool = True,
+        enzyme=None,
+        backend: str = "auto",
+    ) -> CachedProteome:
+        """Digests all proteins of a (gzipped) FASTA file, or loads the result
+        of a previous digestion of the same file content with the same
+        parameters from the cache."""
+        content_hash = hashlib.sha256()
+        with open(fasta_file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                content_hash.update(block)
+
+        module = get_backend(backend)
+        params = (min_len, max_len, pre, not_post, post, digestion, miscleavages)
+        params += (methionine_cleavage, enzyme, module.__name__)
+        key = self.key(content_hash, *params)
+
+        def digest_proteins():
+            kwargs = dict(
+                min_len=min_len,
+                max_len=max_len,
+                pre=pre,
+                not_post=not_post,
+                post=post,
+                digestion=digestion,
+                miscleavages=miscleavages,
+                methionine_cleavage=methionine_cleavage,
+                enzyme=enzyme,
+            )
+            if hasattr(module, "digest_fasta"):
+                yield from module.digest_fasta(fasta_file, **kwargs)
+                return
+            for protein_id, seq in digest.read_fasta(fasta_file):
+                yield protein_id, list(module.get_digested_peptides(seq, **kwargs))
+
+        return self.get_or_create(key, digest_proteins)
+
+    def digest_sequences(
+        self,
+        seqs: List[str],
+        min_len: int = 6,
+        max_len: int = 50,
+        pre: List[str] = ["K", "R"],
+        not_post: List[str] = ["P"],
+        post: List[str] = [],
+        digestion: str = "full",
+        miscleavages: int = 0,
+        methionine_cleavage: bool = True,
+        enzyme=None,
+        backend: str = "auto",
+    ) -> CachedProteome:
+        """Like digest_fasta for a list of sequences, the protein ids are the
+        indices of the sequences as strings."""
+        content_hash = hashlib.sha256()
+        for seq in seqs:
+            content_hash.update(seq.encode())
+            content_hash.update(b"\n")
+
+        module = get_backend(backend)
+        params = (min_len, max_len, pre, not_post, post, digestion, miscleavages)
+        params += (methionine_cleavage, enzyme, module.__name__)
+        key = self.key(content_hash, *params)
+
+        def digest_proteins():
+            for i, seq in enumerate(seqs):
+                peptides = module.get_digested_peptides(
+                    seq,
+                    min_len=min_len,
+                    max_len=max_len,
+                    pre=pre,
+                    not_post=not_post,
+                    post=post,
+                    digestion=digestion,
+                    miscleavages=miscleavages,
+                    methionine_cleavage=methionine_cleavage,
+                    enzyme=enzyme,
+                )
+                yield str(i), list(peptides)
+
+        return self.get_or_create(key, digest_proteins)
+
+    @staticmethod
+    def key(
+        content_hash,
+        min_len,
+        max_len,
+        pre,
+        not_post,
+        post,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        enzyme,
+        backend,
+    ) -> str:
+        """Cache key of a content hash, the digestion parameters and the name
+        of the backend module, as the backends may differ in edge cases"""
+        if enzyme is not None:
+            pre, not_post, post = enzyme.pre, enzyme.not_post, enzyme.post
+        params = {
+            "min_len": min_len,
+            "max_len": max_len,
+            "pre": sorted("".join(pre)),
+            "not_post": sorted("".join(not_post)),
+            "post": sorted("".join(post)),
+            "digestion": digestion,
+            "miscleavages": miscleavages,
+            "methionine_cleavage": methionine_cleavage,
+            "backend": backend,
+        }
+        if enzyme is not None and len(enzyme.rules) > 1:
+            params["rules"] = [
+                [sorted(rule.pre), sorted(rule.not_post), sorted(rule.post)]
+                for rule in enzyme.rules
+            ]
+        key = content_hash.copy()
+        key.update(json.dumps(params, sort_keys=True).encode())
+        return key.hexdigest()
+
+    def get_or_create(self, key: str, digest_proteins) -> CachedProteome:
+        path = os.path.join(self.cache_dir, key + SUFFIX)
+        try:
+            proteome = CachedProteome(path)
+            # the modification time tracks the last access for the eviction
+            os.utime(path)
+            return proteome
+        except (FileNotFoundError, ValueError):
+            pass
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            write_entry(tmp_path, digest_proteins())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep=path)
+        return CachedProteome(path)
+
+    def entries(self) -> List[str]:
+        """Paths of all cache entries, least recently used first"""
+        paths = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(SUFFIX)
+        ]
+        return sorted(paths, key=os.path.getmtime)
+
+    def size(self) -> int:
+        return sum(os.path.getsize(path) for path in self.entries())
+
+    def evict(self, keep: Optional[str] = None):
+        """Removes least recently used entries until the cache fits into
+        max_size, the entry at keep is never removed"""
+        entries = [(path, os.path.getsize(path)) for path in self.entries()]
+        total_size = sum(size for _, size in entries)
+        for path, size in entries:
+            if total_size <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        for path in self.entries():
+            os.remove(path)
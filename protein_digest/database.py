@@ -0,0 +1,135 @@
+"""Reader for the binary peptide database written by
+digest_rs.write_peptide_database.
+
+The file is memory-mapped and all arrays are exposed as read-only NumPy views
+into the mapping, so opening a database is independent of its size and
+multiple processes reading the same database share a single copy in the page
+cache. See src/database.rs for the file format.
+"""
+
+import mmap
+import os
+import struct
+from typing import List, Optional, Union
+
+import numpy as np
+
+MAGIC = b"PEPTDB\0\0"
+VERSION = 1
+HAS_MASSES = 1
+HEADER = struct.Struct("<8sIIQQQQ")
+
+
+def padded(n_bytes: int) -> int:
+    return (n_bytes + 7) // 8 * 8
+
+
+class PeptideDatabase:
+    """Memory-mapped deduplicated peptide database.
+
+    Peptides are sorted, the proteins of the i-th peptide are
+    protein_indices[protein_offsets[i]:protein_offsets[i + 1]], the same
+    layout as digest_rs.build_peptide_index. masses is None if the database
+    was written without masses.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"Truncated peptide database: {path}")
+        magic, version, flags, n_peptides, n_residues, n_memberships, n_proteins = (
+            HEADER.unpack_from(self._mmap)
+        )
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not a peptide database: {path}")
+        if version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"Unsupported peptide database version {version}: {path}")
+
+        self.n_proteins = n_proteins
+        offset = HEADER.size
+
+        def view(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+            offset += padded(array.nbytes)
+            return array
+
+        self.peptide_offsets = view("<u8", n_peptides + 1)
+        self.protein_offsets = view("<u8", n_peptides + 1)
+        self.protein_indices = view("<u4", n_memberships)
+        self.masses: Optional[np.ndarray] = None
+        if flags & HAS_MASSES:
+            self.masses = view("<f8", n_peptides)
+        self._residues_offset = offset
+        self.residues = view(np.uint8, n_residues)
+
+    def __len__(self) -> int:
+        return len(self.peptide_offsets) - 1
+
+    def __contains__(self, peptide: str) -> bool:
+        return self.find(peptide) is not None
+
+    def __getitem__(self, peptide: str) -> np.ndarray:
+        """Indices of the proteins a peptide occurs in"""
+        i = self.find(peptide)
+        if i is None:
+            raise KeyError(peptide)
+        return self.proteins(i)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _peptide_bytes(self, i: int) -> bytes:
+        start = self._residues_offset + int(self.peptide_offsets[i])
+        end = self._residues_offset + int(self.peptide_offsets[i + 1])
+        return self._mmap[start:end]
+
+    def peptide(self, i: int) -> str:
+        if not 0 <= i < len(self):
+            raise IndexError(f"Peptide index {i} out of range")
+        return self._peptide_bytes(i).decode("ascii")
+
+    def proteins(self, i: int) -> np.ndarray:
+        start, end = self.protein_offsets[i : i + 2]
+        return self.protein_indices[start:end]
+
+    def find(self, peptide: str) -> Optional[int]:
+        """Position of a peptide in the database, found by binary search"""
+        target = peptide.encode("ascii", errors="replace")
+        low, high = 0, len(self)
+        while low < high:
+            mid = (low + high) // 2
+            current = self._peptide_bytes(mid)
+            if current < target:
+                low = mid + 1
+            elif current > target:
+                high = mid
+            else:
+                return mid
+        return None
+
+    def peptides(self) -> List[str]:
+        residues = self.residues.tobytes().decode("ascii")
+        offsets = self.peptide_offsets.tolist()
+        return [residues[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def close(self):
+        """Closes the memory map. If NumPy views obtained from the database are
+        still alive, the map is only released once the last of them has been
+        garbage collected, the views remain valid until then."""
+        self.peptide_offsets = self.protein_offsets = self.protein_indices = None
+        self.masses = self.residues = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # exported to live views, which keep the map alive and unmap it
+            # when they are freed
+            pass
+        self._mmap = None
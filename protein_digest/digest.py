@@ -1,4 +1,70 @@
-from typing import List
+import collections
+import concurrent.futures
+import gzip
+import os
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+# named enzymes as (pre, not_post, post)
+ENZYMES = {
+    "trypsin": (["K", "R"], ["P"], []),
+    "trypsin/p": (["K", "R"], [], []),
+    "lys-c": (["K"], ["P"], []),
+    "glu-c": (["E"], ["P"], []),
+    "asp-n": ([], [], ["D"]),
+    "chymotrypsin": (["F", "W", "Y"], ["P"], []),
+}
+
+
+class Enzyme:
+    """Cleavage rules compiled into sets for constant time residue lookups.
+
+    The enzyme cleaves between aa1 and aa2 if aa1 is in pre and aa2 is not in
+    not_post, or if aa2 is in post. Enzyme.union combines several enzymes
+    into one that cleaves wherever any of their rules does, in which case pre,
+    not_post and post are the residues of any rule.
+    """
+
+    def __init__(
+        self, pre: List[str] = [], not_post: List[str] = [], post: List[str] = []
+    ):
+        self.pre = frozenset("".join(pre))
+        self.not_post = frozenset("".join(not_post))
+        self.post = frozenset("".join(post))
+        self.rules = [self]
+
+    @staticmethod
+    def from_name(name: str) -> "Enzyme":
+        """Named enzyme, names joined by "+" (e.g. "trypsin+glu-c") give the
+        union of the named enzymes"""
+        enzymes = []
+        for enzyme_name in name.lower().split("+"):
+            if enzyme_name.strip() not in ENZYMES:
+                raise ValueError(f"Unknown enzyme: {name}")
+            enzymes.append(Enzyme(*ENZYMES[enzyme_name.strip()]))
+        return enzymes[0] if len(enzymes) == 1 else Enzyme.union(enzymes)
+
+    @staticmethod
+    def names() -> List[str]:
+        return list(ENZYMES)
+
+    @staticmethod
+    def union(enzymes: Sequence["Enzyme"]) -> "Enzyme":
+        """Enzyme cleaving wherever any of the given enzymes cleaves, e.g. for
+        multi-enzyme or sequential digestion"""
+        union = Enzyme()
+        union.rules = [rule for enzyme in enzymes for rule in enzyme.rules]
+        union.pre = frozenset().union(*(rule.pre for rule in union.rules))
+        union.not_post = frozenset().union(*(rule.not_post for rule in union.rules))
+        union.post = frozenset().union(*(rule.post for rule in union.rules))
+        return union
+
+    def __repr__(self):
+        if len(self.rules) != 1:
+            return f"Enzyme.union({self.rules})"
+        return (
+            f"Enzyme(pre={sorted(self.pre)}, not_post={sorted(self.not_post)}, "
+            f"post={sorted(self.post)})"
+        )
 
 
 def get_digested_peptides(
@@ -11,8 +77,32 @@ def get_digested_peptides(
     digestion: str = "full",
     miscleavages: int = 0,
     methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    unique: bool = False,
 ):
-    if digestion == "none":
+    rules = None
+    if enzyme is not None:
+        pre, not_post, post = enzyme.pre, enzyme.not_post, enzyme.post
+        rules = [(rule.pre, rule.not_post, rule.post) for rule in enzyme.rules]
+
+    if unique:
+        seen = set()
+        for peptide in get_digested_peptides(
+            seq,
+            min_len,
+            max_len,
+            pre,
+            not_post,
+            post,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+            enzyme,
+        ):
+            if peptide not in seen:
+                seen.add(peptide)
+                yield peptide
+    elif digestion == "none":
         yield from non_specific_digest(seq, min_len, max_len)
     elif digestion == "semi":
         yield from semi_specific_digest(
@@ -24,6 +114,7 @@ def get_digested_peptides(
             post,
             miscleavages,
             methionine_cleavage,
+            rules,
         )
     else:
         yield from full_digest(
@@ -35,9 +126,213 @@ def get_digested_peptides(
             post,
             miscleavages,
             methionine_cleavage,
+            rules,
         )
 
 
+def count_peptides(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+) -> Tuple[int, int]:
+    """Returns the number of peptides get_digested_peptides yields and their
+    total number of residues, computed from the cleavage sites without
+    creating the peptides."""
+    if not seq:
+        return 0, 0
+    if digestion == "none":
+        return count_non_specific(len(seq), min_len, max_len)
+
+    rules = [(pre, not_post, post)]
+    if enzyme is not None:
+        rules = [(rule.pre, rule.not_post, rule.post) for rule in enzyme.rules]
+    if digestion == "semi":
+        return count_semi_specific(
+            seq, min_len, max_len, miscleavages, methionine_cleavage, rules
+        )
+
+    # same windows of starts as full_digest
+    n_peptides = n_residues = 0
+    methionine_cleavage = methionine_cleavage and seq[0] == "M"
+    starts = [0]
+    cleavage_sites = [0] if methionine_cleavage else []
+    cleavage_sites.extend(get_cleavage_sites(seq, rules))
+    if cleavage_sites[-1:] != [len(seq) - 1]:
+        cleavage_sites.append(len(seq) - 1)
+    for i in cleavage_sites:
+        for start in starts:
+            if min_len <= i - start + 1 <= max_len:
+                n_peptides += 1
+                n_residues += i - start + 1
+        starts.append(i + 1)
+        methionine_cleaved = int(starts[0] == 0 and methionine_cleavage)
+        if len(starts) > miscleavages + 1 + methionine_cleaved:
+            starts = starts[1 + methionine_cleaved :]
+    return n_peptides, n_residues
+
+
+def count_non_specific(seq_len: int, min_len: int, max_len: int) -> Tuple[int, int]:
+    """Number of non-specific peptides and residues, seq_len + 1 - length
+    peptides of every accepted length"""
+    low, high = min_len, min(max_len, seq_len)
+    if high < low:
+        return 0, 0
+    n_lengths = high - low + 1
+    length_sum = (low + high) * n_lengths // 2
+    square_sum = high * (high + 1) * (2 * high + 1) - (low - 1) * low * (2 * low - 1)
+    square_sum //= 6
+    n_peptides = n_lengths * (seq_len + 1) - length_sum
+    return n_peptides, (seq_len + 1) * length_sum - square_sum
+
+
+def count_semi_specific(
+    seq: str,
+    min_len: int,
+    max_len: int,
+    miscleavages: int,
+    methionine_cleavage: bool,
+    rules: List[tuple],
+) -> Tuple[int, int]:
+    """Counts the peptides of semi_specific_digest window by window"""
+    seq_len = len(seq)
+    methionine_cleavage = methionine_cleavage and seq[0] == "M"
+    cuts = [0, 1] if methionine_cleavage else [0]
+    cuts.extend(i + 1 for i in get_cleavage_sites(seq, rules))
+    cuts.append(seq_len)
+    cuts = sorted(set(cuts))
+    prefix_sums = [0]
+    for cut in cuts:
+        prefix_sums.append(prefix_sums[-1] + cut)
+
+    n_peptides = n_residues = 0
+    low = high = 0
+    for k in range(1, len(cuts)):
+        first = max(k - miscleavages - 1, 0)
+        if methionine_cleavage and first == 1:
+            first = 0
+
+        for end in range(cuts[k - 1] + 1, cuts[k]):
+            while low < k and cuts[low] + max_len < end:
+                low += 1
+            while high < k and cuts[high] + min_len <= end:
+                high += 1
+            n = max(high - max(first, low), 0)
+            n_peptides += n
+            n_residues += n * end - (prefix_sums[high] - prefix_sums[high - n])
+
+        end = cuts[k]
+        start = max(cuts[first], end - max_len)
+        n = max(min(end - 1, end - min_len + 1) - start, 0)
+        n_peptides += n
+        # sum of the lengths end - start, ..., end - start - n + 1
+        n_residues += n * (end - start) - n * (n - 1) // 2
+    return n_peptides, n_residues
+
+
+def digest_proteome(
+    seqs: Sequence[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    workers: Optional[int] = None,
+) -> Iterator[List[str]]:
+    """Digests proteins in parallel processes, yielding the list of peptides of
+    each protein in the order of seqs.
+
+    Proteins are split into consecutive chunks of roughly equal total length,
+    several per worker, which are sent to and returned from the workers as
+    single newline separated strings to minimize pickling overhead. Only a
+    limited number of chunks is in flight at any time, such that results are
+    streamed back instead of being collected in memory. workers defaults to
+    the number of CPUs, with workers=1 the proteins are digested in-process.
+    """
+    params = (min_len, max_len, pre, not_post, post)
+    params += (digestion, miscleavages, methionine_cleavage, enzyme)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for seq in seqs:
+            yield list(get_digested_peptides(seq, *params))
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for chunk in balanced_chunks(seqs, 4 * workers):
+            if len(pending) >= 2 * workers:
+                yield from unpack_peptides(*pending.popleft().result())
+            pending.append(executor.submit(digest_chunk, "\n".join(chunk), params))
+        while pending:
+            yield from unpack_peptides(*pending.popleft().result())
+
+
+def balanced_chunks(seqs: Sequence[str], n_chunks: int) -> Iterator[List[str]]:
+    """Splits seqs into consecutive chunks of roughly equal total length"""
+    chunk_residues = sum(len(seq) for seq in seqs) / n_chunks
+    chunk, residues = [], 0
+    for seq in seqs:
+        chunk.append(seq)
+        residues += len(seq)
+        if residues >= chunk_residues:
+            yield chunk
+            chunk, residues = [], 0
+    if chunk:
+        yield chunk
+
+
+def digest_chunk(seqs: str, params: tuple) -> Tuple[str, List[int]]:
+    """Digests newline separated proteins, returning all peptides as a single
+    newline separated string and the number of peptides per protein"""
+    peptides, counts = [], []
+    for seq in seqs.split("\n"):
+        protein_peptides = list(get_digested_peptides(seq, *params))
+        peptides.extend(protein_peptides)
+        counts.append(len(protein_peptides))
+    return "\n".join(peptides), counts
+
+
+def unpack_peptides(peptides: str, counts: List[int]) -> Iterator[List[str]]:
+    peptides = peptides.split("\n") if peptides else []
+    offset = 0
+    for count in counts:
+        yield peptides[offset : offset + count]
+        offset += count
+
+
+def read_fasta(fasta_file: Union[str, os.PathLike]) -> Iterator[Tuple[str, str]]:
+    """Reads (protein_id, sequence) records from a (gzipped) FASTA file.
+
+    The protein id is the part of the header up to the first whitespace,
+    sequence lines are concatenated with all whitespace removed.
+    """
+    with open(fasta_file, "rb") as f:
+        is_gzipped = f.read(2) == b"\x1f\x8b"
+    opener = gzip.open if is_gzipped else open
+    with opener(fasta_file, "rt", encoding="utf-8") as f:
+        protein_id, seq = None, []
+        for line in f:
+            if line.startswith(">"):
+                if protein_id is not None:
+                    yield protein_id, "".join(seq)
+                protein_id, seq = (line[1:].split() or [""])[0], []
+            elif protein_id is not None:
+                seq.append("".join(line.split()))
+        if protein_id is not None:
+            yield protein_id, "".join(seq)
+
+
 def non_specific_digest(seq, min_len, max_len):
     seq_len = len(seq)
     for i in range(seq_len + 1):
@@ -55,36 +350,49 @@ def semi_specific_digest(
     post: List[str],
     miscleavages: int,
     methionine_cleavage: bool,
+    rules: Optional[List[tuple]] = None,
 ):
-    seq_len, starts = len(seq), [0]
+    """Semi-specific digestion, enumerating the peptides by their end.
+
+    Peptides with a non-enzymatic C-terminus start at one of the cuts within
+    the miscleavage window, peptides with an enzymatic C-terminus at any
+    position within the window. The cuts within the length bounds are tracked
+    with two pointers, such that each peptide is produced exactly once and the
+    running time is linear in the number of peptides. If given, rules is a
+    list of (pre, not_post, post) rule sets which replaces pre, not_post and
+    post, peptides are enzymatic if any of the rules cleaves.
+    """
+    if not seq:
+        return
+    seq_len = len(seq)
     methionine_cleavage = methionine_cleavage and seq[0] == "M"
-    length_accepted = lambda x: x >= min_len and x <= max_len
+    cuts = [0, 1] if methionine_cleavage else [0]
+    sites = get_cleavage_sites(seq, rules or [(pre, not_post, post)])
+    cuts.extend(i + 1 for i in sites)
+    cuts.append(seq_len)
+    cuts = sorted(set(cuts))
 
-    for i in range(seq_len):
-        is_cleavage_site = is_enzymatic(
-            seq[i],
-            seq[min([seq_len - 1, i + 1])],
-            pre,
-            not_post,
-            post,
-        )
-        is_methionine_cleavage_site = i == 0 and methionine_cleavage
-        if i == seq_len - 1 or is_cleavage_site or is_methionine_cleavage_site:
-            # peptides with enzymatic C-terminal (both enzymatic and non-enzymatic N-terminal)
-            start = starts[0]
-            for j in range(start, i + 1):
-                pep_len = i - j + 1
-                if length_accepted(pep_len):
-                    yield (seq[j : i + 1])
-            starts.append(i + 1)
-            methionine_cleaved = int(starts[0] == 0 and methionine_cleavage)
-            if len(starts) > miscleavages + 1 + methionine_cleaved or i == seq_len - 1:
-                starts = starts[1 + methionine_cleaved :]
-        else:  # peptides with non enzymatic C-terminal
-            for start in starts:
-                pep_len = i - start + 1
-                if length_accepted(pep_len) and i + 1 not in starts:
-                    yield (seq[start : i + 1])
+    # cuts[low:high] are the starts with an accepted peptide length
+    low = high = 0
+    for k in range(1, len(cuts)):
+        first = max(k - miscleavages - 1, 0)
+        if methionine_cleavage and first == 1:
+            first = 0
+
+        # non-enzymatic C-terminus, enzymatic N-terminus within the window
+        for end in range(cuts[k - 1] + 1, cuts[k]):
+            while low < k and cuts[low] + max_len < end:
+                low += 1
+            while high < k and cuts[high] + min_len <= end:
+                high += 1
+            for start in cuts[max(first, low) : high]:
+                yield seq[start:end]
+
+        # enzymatic C-terminus, any N-terminus within the window
+        end = cuts[k]
+        stop = min(end - 1, end - min_len + 1)
+        for start in range(max(cuts[first], end - max_len), stop):
+            yield seq[start:end]
 
 
 def full_digest(
@@ -96,28 +404,18 @@ def full_digest(
     post: List[str],
     miscleavages: int,
     methionine_cleavage: bool,
+    rules: Optional[List[tuple]] = None,
 ):
+    if not seq:
+        return
     seq_len, starts = len(seq), [0]
     methionine_cleavage = methionine_cleavage and seq[0] == "M"
 
-    check_pre = len(pre) > 0
-    check_post = len(post) > 0
-
     cleavage_sites = [0] if methionine_cleavage else []
-    # HACK: inline if statement instead of using is_enzymatic because it is ~20% faster
-    cleavage_sites.extend(
-        [
-            i
-            for i in range(seq_len - 1)
-            if (
-                check_pre
-                and seq[i] in pre
-                and not seq[min([seq_len - 1, i + 1])] in not_post
-            )
-            or (check_post and seq[min([seq_len - 1, i + 1])] in post)
-        ]
-    )
-    cleavage_sites.append(seq_len - 1)
+    cleavage_sites.extend(get_cleavage_sites(seq, rules or [(pre, not_post, post)]))
+    # the methionine cleavage of "M" is also its C-terminus
+    if cleavage_sites[-1:] != [seq_len - 1]:
+        cleavage_sites.append(seq_len - 1)
     for i in cleavage_sites:
         for start in starts:
             pep_len = i - start + 1
@@ -129,5 +427,27 @@ def full_digest(
             starts = starts[1 + methionine_cleaved :]
 
 
+def get_cleavage_sites(seq: str, rules: List[tuple]) -> List[int]:
+    """Positions i at which any of the (pre, not_post, post) rules cleaves
+    between seq[i] and seq[i + 1]"""
+    seq_len = len(seq)
+    sites = []
+    for pre, not_post, post in rules:
+        check_pre = len(pre) > 0
+        check_post = len(post) > 0
+        # HACK: inline if statement instead of using is_enzymatic, ~20% faster
+        sites.append(
+            [
+                i
+                for i in range(seq_len - 1)
+                if (check_pre and seq[i] in pre and not seq[i + 1] in not_post)
+                or (check_post and seq[i + 1] in post)
+            ]
+        )
+    if len(sites) == 1:
+        return sites[0]
+    return sorted(set().union(*sites))
+
+
 def is_enzymatic(aa1, aa2, pre, not_post, post):
     return (aa1 in pre and aa2 not in not_post) or (aa2 in post)
\ No newline at end of file
@@ -0,0 +1,390 @@
+"""NumPy fallback for platforms without the compiled extension.
+
+Sequences are converted to uint8 arrays, cleavage sites are found with
+vectorized table lookups and the (start, end) positions of all peptides are
+enumerated in bulk. Only the final peptide strings are created in Python.
+Results are identical to the Rust backend in digest_rs.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .digest import Enzyme, count_non_specific
+
+
+def get_digested_peptides(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    unique: bool = False,
+) -> List[str]:
+    starts, ends = get_digested_offsets(
+        seq,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+    peptides = [seq[start:end] for start, end in zip(starts.tolist(), ends.tolist())]
+    if unique:
+        return list(dict.fromkeys(peptides))
+    return peptides
+
+
+def get_digested_offsets(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Digests a sequence without creating the peptide strings.
+
+    Returns the start and (exclusive) end positions of the peptides as two
+    uint32 arrays, such that seq[starts[i]:ends[i]] is the i-th peptide
+    returned by get_digested_peptides.
+    """
+    rules = [(pre, not_post, post)]
+    if enzyme is not None:
+        rules = [(rule.pre, rule.not_post, rule.post) for rule in enzyme.rules]
+
+    residues = to_array(seq)
+    if len(residues) == 0:
+        starts = ends = np.zeros(0, dtype=np.int64)
+    elif digestion == "none":
+        starts, ends = non_specific_spans(len(residues), min_len, max_len)
+    elif digestion == "semi":
+        starts, ends = semi_specific_spans(
+            residues,
+            min_len,
+            max_len,
+            cleavage_sites(residues, rules),
+            miscleavages,
+            methionine_cleavage,
+        )
+    else:
+        starts, ends = full_spans(
+            residues,
+            min_len,
+            max_len,
+            cleavage_sites(residues, rules),
+            miscleavages,
+            methionine_cleavage,
+        )
+    return starts.astype(np.uint32), ends.astype(np.uint32)
+
+
+def get_digested_metadata(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+) -> Dict[str, np.ndarray]:
+    """Digests a sequence into columnar peptide metadata, see
+    digest_rs.get_digested_metadata"""
+    starts, ends = get_digested_offsets(
+        seq,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+    rules = [(pre, not_post, post)]
+    if enzyme is not None:
+        rules = [(rule.pre, rule.not_post, rule.post) for rule in enzyme.rules]
+
+    residues = to_array(seq)
+    sites = cleavage_sites(residues, rules)
+    # sites between seq[start] and seq[end - 1]
+    last = np.maximum(starts.astype(np.int64) + 1, ends) - 1
+    missed_cleavages = np.searchsorted(sites, last) - np.searchsorted(sites, starts)
+    flanked = np.concatenate([[ord("-")], residues, [ord("-")]]).astype(np.uint8)
+    methionine_cleaved = methionine_cleavage and seq[:1] == "M"
+    return {
+        "start": starts,
+        "end": ends,
+        "missed_cleavages": missed_cleavages.astype(np.uint32),
+        "preceding": flanked[starts].view("S1"),
+        "following": flanked[ends.astype(np.int64) + 1].view("S1"),
+        "protein_n_term": (starts == 0) | (methionine_cleaved & (starts == 1)),
+        "protein_c_term": ends == len(residues),
+    }
+
+
+def count_peptides(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+) -> Tuple[int, int]:
+    """Returns the number of peptides of a sequence and their total number of
+    residues, computed per window of starts from the cleavage sites without
+    enumerating the peptides."""
+    residues = to_array(seq)
+    if len(residues) == 0:
+        return 0, 0
+    if digestion == "none":
+        return count_non_specific(len(residues), min_len, max_len)
+
+    rules = [(pre, not_post, post)]
+    if enzyme is not None:
+        rules = [(rule.pre, rule.not_post, rule.post) for rule in enzyme.rules]
+    sites = cleavage_sites(residues, rules)
+    methionine_cleavage = methionine_cleavage and residues[0] == ord("M")
+    cuts = get_cuts(residues, sites, methionine_cleavage)
+    prefix_sums = np.concatenate([[0], np.cumsum(cuts)])
+
+    def count_cut_starts(ends, first, k):
+        # enzymatic starts cuts[first:k] with an accepted length
+        low = np.maximum(np.searchsorted(cuts, ends - max_len), first)
+        high = np.minimum(np.searchsorted(cuts, ends - min_len, side="right"), k)
+        counts = np.maximum(high - low, 0)
+        sums = prefix_sums[np.maximum(high, low)] - prefix_sums[low]
+        return int(counts.sum()), int((counts * ends - sums).sum())
+
+    def window_first(k):
+        first = np.maximum(k - miscleavages - 1, 0)
+        if methionine_cleavage:
+            first[first == 1] = 0
+        return first
+
+    if digestion != "semi":
+        k = np.arange(1, len(cuts))
+        return count_cut_starts(cuts[k], window_first(k), k)
+
+    ends = np.arange(1, len(residues) + 1)
+    k = np.searchsorted(cuts, ends - 1, side="right")
+    is_enzymatic_end = np.isin(ends, cuts)
+    k_semi = k[~is_enzymatic_end]
+    n_peptides, n_residues = count_cut_starts(
+        ends[~is_enzymatic_end], window_first(k_semi), k_semi
+    )
+
+    # enzymatic C-terminus: any start after the beginning of the window
+    enzymatic_ends = ends[is_enzymatic_end]
+    lower = np.maximum(
+        cuts[window_first(k[is_enzymatic_end])], enzymatic_ends - max_len
+    )
+    upper = np.minimum(enzymatic_ends - 1, enzymatic_ends - min_len + 1)
+    counts = np.maximum(upper - lower, 0)
+    lengths = counts * (enzymatic_ends - lower) - counts * (counts - 1) // 2
+    return n_peptides + int(counts.sum()), n_residues + int(lengths.sum())
+
+
+def non_specific_digest(seq, min_len, max_len):
+    return get_digested_peptides(seq, min_len, max_len, digestion="none")
+
+
+def semi_specific_digest(
+    seq: str,
+    min_len: int,
+    max_len: int,
+    pre: List[str],
+    not_post: List[str],
+    post: List[str],
+    miscleavages: int,
+    methionine_cleavage: bool,
+):
+    return get_digested_peptides(
+        seq,
+        min_len,
+        max_len,
+        pre,
+        not_post,
+        post,
+        "semi",
+        miscleavages,
+        methionine_cleavage,
+    )
+
+
+def full_digest(
+    seq: str,
+    min_len: int,
+    max_len: int,
+    pre: List[str],
+    not_post: List[str],
+    post: List[str],
+    miscleavages: int,
+    methionine_cleavage: bool,
+):
+    return get_digested_peptides(
+        seq,
+        min_len,
+        max_len,
+        pre,
+        not_post,
+        post,
+        "full",
+        miscleavages,
+        methionine_cleavage,
+    )
+
+
+def to_array(seq: str) -> np.ndarray:
+    try:
+        return np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        raise ValueError("Sequence contains non-ASCII characters") from None
+
+
+def residue_table(residues) -> np.ndarray:
+    """Boolean lookup table indexed by ASCII code"""
+    table = np.zeros(256, dtype=bool)
+    codes = [ord(aa) for aa in "".join(residues) if ord(aa) < 128]
+    table[codes] = True
+    return table
+
+
+def cleavage_sites(residues: np.ndarray, rules) -> np.ndarray:
+    """Positions i at which any of the (pre, not_post, post) rules cleaves
+    between seq[i] and seq[i + 1]"""
+    aa1, aa2 = residues[:-1], residues[1:]
+    is_site = np.zeros(len(aa1), dtype=bool)
+    for pre, not_post, post in rules:
+        is_site |= residue_table(pre)[aa1] & ~residue_table(not_post)[aa2]
+        is_site |= residue_table(post)[aa2]
+    return np.flatnonzero(is_site)
+
+
+def get_cuts(
+    residues: np.ndarray, sites: np.ndarray, methionine_cleavage: bool
+) -> np.ndarray:
+    """Positions at which enzymatic peptides can start or end"""
+    head = [0, 1] if methionine_cleavage else [0]
+    cuts = np.concatenate([head, sites + 1, [len(residues)]])
+    # a cleavage site directly after the methionine or at the end of the
+    # sequence coincides with one of the added cuts
+    return np.unique(cuts)
+
+
+def window_starts(
+    cuts: np.ndarray, k: np.ndarray, miscleavages: int, methionine_cleavage: bool
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Cuts cuts[first:k] within the miscleavage window before the k-th cut.
+
+    Returns the starts together with the index of the window they belong to,
+    ordered by window and then by start. The methionine cleavage is not
+    counted as a miscleavage, i.e. if the window starts directly after the
+    methionine, the start of the protein is included as well.
+    """
+    columns = np.arange(-miscleavages - 1, 0)
+    cut_indices = k[:, None] + columns[None, :]
+    if methionine_cleavage:
+        first = k - miscleavages - 1
+        met_column = np.where(first == 1, 0, -1)
+        cut_indices = np.hstack([met_column[:, None], cut_indices])
+    windows = np.broadcast_to(np.arange(len(k))[:, None], cut_indices.shape)
+    valid = cut_indices >= 0
+    return cuts[cut_indices[valid]], windows[valid]
+
+
+def filter_length(
+    starts: np.ndarray, ends: np.ndarray, min_len: int, max_len: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = ends - starts
+    accepted = (lengths >= min_len) & (lengths <= max_len)
+    return starts[accepted], ends[accepted]
+
+
+def full_spans(
+    residues: np.ndarray,
+    min_len: int,
+    max_len: int,
+    sites: np.ndarray,
+    miscleavages: int,
+    methionine_cleavage: bool,
+) -> Tuple[np.ndarray, np.ndarray]:
+    methionine_cleavage = methionine_cleavage and residues[0] == ord("M")
+    cuts = get_cuts(residues, sites, methionine_cleavage)
+    k = np.arange(1, len(cuts))
+    starts, windows = window_starts(cuts, k, miscleavages, methionine_cleavage)
+    return filter_length(starts, cuts[k][windows], min_len, max_len)
+
+
+def semi_specific_spans(
+    residues: np.ndarray,
+    min_len: int,
+    max_len: int,
+    sites: np.ndarray,
+    miscleavages: int,
+    methionine_cleavage: bool,
+) -> Tuple[np.ndarray, np.ndarray]:
+    seq_len = len(residues)
+    methionine_cleavage = methionine_cleavage and residues[0] == ord("M")
+    cuts = get_cuts(residues, sites, methionine_cleavage)
+
+    ends = np.arange(1, seq_len + 1)
+    # number of cuts before each end, i.e. the window of enzymatic starts
+    k = np.searchsorted(cuts, ends - 1, side="right")
+    is_enzymatic_end = np.isin(ends, cuts)
+
+    # non-enzymatic C-terminus: enzymatic starts within the miscleavage window
+    starts, windows = window_starts(
+        cuts, k[~is_enzymatic_end], miscleavages, methionine_cleavage
+    )
+    starts, semi_ends = filter_length(
+        starts, ends[~is_enzymatic_end][windows], min_len, max_len
+    )
+
+    # enzymatic C-terminus: any start after the beginning of the window
+    enzymatic_ends = ends[is_enzymatic_end]
+    first = np.maximum(k[is_enzymatic_end] - miscleavages - 1, 0)
+    if methionine_cleavage:
+        first[first == 1] = 0
+    lower = np.maximum(cuts[first], enzymatic_ends - max_len)
+    upper = np.minimum(enzymatic_ends - 1, enzymatic_ends - min_len + 1)
+    counts = np.maximum(upper - lower, 0)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    starts = np.concatenate([starts, np.repeat(lower, counts) + offsets])
+    ends = np.concatenate([semi_ends, np.repeat(enzymatic_ends, counts)])
+    order = np.lexsort((starts, ends))
+    return starts[order], ends[order]
+
+
+def non_specific_spans(
+    seq_len: int, min_len: int, max_len: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = np.arange(min_len, min(max_len, seq_len) + 1)
+    starts = np.broadcast_to(
+        np.arange(seq_len + 1)[:, None], (seq_len + 1, len(lengths))
+    )
+    ends = starts + lengths[None, :]
+    valid = ends <= seq_len
+    return starts[valid], ends[valid]
@@ -1,7 +1,13 @@
-from typing import List
+import os
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 from . import protein_digest
 
+# Cleavage rules compiled into a lookup table, e.g. Enzyme.from_name("trypsin")
+# or Enzyme(pre=["K", "R"], not_post=["P"]). If an enzyme is passed to the
+# digest functions it takes precedence over pre, not_post and post.
+Enzyme = protein_digest.Enzyme
+
 
 def get_digested_peptides(
     seq: str,
@@ -13,8 +19,426 @@ def get_digested_peptides(
     digestion: str = "full",
     miscleavages: int = 0,
     methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    fixed_mods: Optional[Dict[str, float]] = None,
+    min_mass: Optional[float] = None,
+    max_mass: Optional[float] = None,
+    return_masses: bool = False,
+    unique: bool = False,
 ):
-    return protein_digest.get_digested_peptides(
+    """Digests a sequence into a list of peptides.
+
+    With unique=True peptides occurring multiple times in the sequence are
+    only returned once, at their first occurrence.
+
+    If min_mass or max_mass is given, only peptides with a monoisotopic mass
+    within these bounds are returned. Masses are computed during digestion
+    including the fixed modifications, given as {residue: mass shift}, e.g.
+    {"C": 57.021464} for carbamidomethylation. With return_masses=True a
+    (peptides, masses) tuple is returned, where masses is a float64 NumPy
+    array; peptides with residues of unknown mass get a NaN mass.
+    """
+    if not return_masses and min_mass is None and max_mass is None:
+        return protein_digest.get_digested_peptides(
+            seq=seq,
+            min_len=min_len,
+            max_len=max_len,
+            pre=pre,
+            not_post=not_post,
+            post=post,
+            digestion=digestion,
+            miscleavages=miscleavages,
+            methionine_cleavage=methionine_cleavage,
+            enzyme=enzyme,
+            unique=unique,
+        )
+
+    peptides, masses = protein_digest.get_digested_peptides_with_masses(
+        seq=seq,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        fixed_mods=fixed_mods,
+        min_mass=min_mass,
+        max_mass=max_mass,
+        enzyme=enzyme,
+    )
+    if unique:
+        first = {}
+        for i, peptide in enumerate(peptides):
+            first.setdefault(peptide, i)
+        keep = list(first.values())
+        peptides, masses = [peptides[i] for i in keep], masses[keep]
+    if return_masses:
+        return peptides, masses
+    return peptides
+
+
+def get_digested_offsets(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    fixed_mods: Optional[Dict[str, float]] = None,
+    min_mass: Optional[float] = None,
+    max_mass: Optional[float] = None,
+    return_masses: bool = False,
+):
+    """Digests a sequence without creating the peptide strings.
+
+    Returns the start and (exclusive) end positions of the peptides as two
+    uint32 NumPy arrays, such that seq[starts[i]:ends[i]] is the i-th peptide
+    returned by get_digested_peptides. Mass filtering works as in
+    get_digested_peptides, with return_masses=True a float64 array with the
+    peptide masses is returned as third element.
+    """
+    if not return_masses and min_mass is None and max_mass is None:
+        return protein_digest.get_digested_offsets(
+            seq=seq,
+            min_len=min_len,
+            max_len=max_len,
+            pre=pre,
+            not_post=not_post,
+            post=post,
+            digestion=digestion,
+            miscleavages=miscleavages,
+            methionine_cleavage=methionine_cleavage,
+            enzyme=enzyme,
+        )
+
+    starts, ends, masses = protein_digest.get_digested_offsets_with_masses(
+        seq=seq,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        fixed_mods=fixed_mods,
+        min_mass=min_mass,
+        max_mass=max_mass,
+        enzyme=enzyme,
+    )
+    if return_masses:
+        return starts, ends, masses
+    return starts, ends
+
+
+def get_digested_metadata(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+) -> Dict[str, "numpy.ndarray"]:
+    """Digests a sequence into columnar peptide metadata.
+
+    Returns a dict of NumPy arrays with one entry per peptide, in the order of
+    get_digested_peptides: "start" and (exclusive) "end" positions,
+    "missed_cleavages", the "preceding" and "following" residues as bytes
+    ("-" at the protein termini) and the "protein_n_term" and "protein_c_term"
+    flags. A peptide starting directly after a cleaved initial methionine is
+    at the protein N-terminus.
+    """
+    columns = protein_digest.get_digested_metadata(
+        seq=seq,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+    start, end, missed_cleavages, preceding, following, n_term, c_term = columns
+    return {
+        "start": start,
+        "end": end,
+        "missed_cleavages": missed_cleavages,
+        "preceding": preceding.view("S1"),
+        "following": following.view("S1"),
+        "protein_n_term": n_term,
+        "protein_c_term": c_term,
+    }
+
+
+def digest_many(
+    seqs: List[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+) -> List[List[str]]:
+    """Digests a list of sequences in parallel on all cores.
+
+    Returns a list with the peptides of each sequence, in the same order as
+    the input sequences.
+    """
+    return protein_digest.digest_many(
+        seqs=list(seqs),
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+
+
+def digest_many_columnar(
+    seqs: List[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+):
+    """Digests a list of sequences in parallel into peptide columns.
+
+    Returns (protein_indices, starts, ends, offsets, residues) NumPy arrays,
+    where the i-th peptide is residues[offsets[i]:offsets[i + 1]], the buffer
+    layout of an Arrow large string array. See protein_digest.arrow.
+    """
+    return protein_digest.digest_many_columnar(
+        seqs=list(seqs),
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+
+
+def count_peptides(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+) -> Tuple[int, int]:
+    """Returns the number of peptides of a sequence and their total number of
+    residues, computed from the cleavage sites without digesting it."""
+    return protein_digest.count_peptides(
+        seq=seq,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+
+
+def count_peptides_many(
+    seqs: List[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+):
+    """Counts the peptides and residues of a list of sequences in parallel.
+
+    Returns two uint64 NumPy arrays with the number of peptides and residues
+    of every sequence, e.g. to preallocate buffers or to balance shards.
+    """
+    return protein_digest.count_peptides_many(
+        seqs=list(seqs),
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+
+
+def get_digested_peptides_with_decoys(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    decoy: str = "pseudo-reverse",
+):
+    """Digests a sequence into its target and decoy peptides.
+
+    Returns a (peptides, is_decoy) tuple, where is_decoy is a boolean NumPy
+    array. With decoy="pseudo-reverse" each target peptide is directly
+    followed by its decoy, the peptide reversed except for the C-terminal
+    residue. With decoy="reverse" the target peptides are followed by the
+    peptides of the reversed protein, an initial methionine is kept at its
+    N-terminus.
+    """
+    return protein_digest.get_digested_peptides_with_decoys(
+        seq=seq,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        decoy=decoy,
+        enzyme=enzyme,
+    )
+
+
+def digest_many_with_decoys(
+    seqs: List[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    decoy: str = "pseudo-reverse",
+) -> List[tuple]:
+    """Like get_digested_peptides_with_decoys for a list of sequences,
+    digested in parallel on all cores like digest_many."""
+    return protein_digest.digest_many_with_decoys(
+        seqs=list(seqs),
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        decoy=decoy,
+        enzyme=enzyme,
+    )
+
+
+def iter_digested_peptides(
+    seq: str,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    chunk_size: Optional[int] = None,
+) -> Iterator[Union[str, List[str]]]:
+    """Lazily digests a sequence, yielding the peptides of get_digested_peptides
+    one at a time without building the full list first.
+
+    If chunk_size is given, lists of up to chunk_size peptides are yielded
+    instead, which avoids the per-peptide call overhead while still keeping
+    memory bounded, e.g. for semi- or non-specific digestion of titin.
+    """
+    return protein_digest.PeptideIterator(
+        seq=seq,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        chunk_size=chunk_size,
+        enzyme=enzyme,
+    )
+
+
+def iter_modified_peptides(
+    seq: str,
+    variable_mods: Union[Dict[str, float], List[Tuple[str, float]]],
+    max_mods: int = 2,
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    fixed_mods: Optional[Dict[str, float]] = None,
+    chunk_size: Optional[int] = None,
+) -> "protein_digest.ModifiedPeptideIterator":
+    """Lazily digests a sequence and expands each peptide into its variably
+    modified forms, yielding (modified peptide, mass) tuples.
+
+    Variable modifications are given as {sites: mass shift}, or as a list of
+    (sites, mass shift) tuples to have several modifications on the same
+    sites. Sites are residues, "[" for the peptide N-terminus and "]" for the
+    peptide C-terminus, e.g. {"M": 15.994915, "STY": 79.966331, "[": 42.010565}.
+    Each peptide is yielded unmodified first and then with up to max_mods
+    variable modifications, in ProForma notation, e.g. "[+42.010565]-M[+15.994915]K".
+    Masses include the fixed modifications, which are not part of the notation.
+
+    If chunk_size is given, (modified peptides, masses) tuples of up to
+    chunk_size forms are yielded instead, with masses as a float64 array.
+    """
+    if isinstance(variable_mods, dict):
+        variable_mods = list(variable_mods.items())
+    return protein_digest.ModifiedPeptideIterator(
         seq=seq,
         min_len=min_len,
         max_len=max_len,
@@ -24,6 +448,159 @@ def get_digested_peptides(
         digestion=digestion,
         miscleavages=miscleavages,
         methionine_cleavage=methionine_cleavage,
+        variable_mods=variable_mods,
+        max_mods=max_mods,
+        fixed_mods=fixed_mods,
+        chunk_size=chunk_size,
+        enzyme=enzyme,
+    )
+
+
+def build_peptide_index(
+    seqs: List[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+) -> "protein_digest.PeptideIndex":
+    """Digests a list of sequences into a deduplicated peptide index.
+
+    The index maps each distinct peptide to the (sorted) indices of the
+    sequences it occurs in, e.g. index["PEPTIDEK"] == [0, 3]. Peptides are
+    stored in sorted order and can be retrieved with index.peptide(i) or
+    index.peptides(), protein memberships are available in CSR format through
+    index.protein_offsets and index.protein_indices. Identical proteins and
+    prefixes or suffixes shared between proteins, e.g. between isoforms, are
+    digested only once.
+    """
+    return protein_digest.PeptideIndex(
+        seqs=list(seqs),
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+    )
+
+
+def build_mass_index(
+    seqs: List[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    fixed_mods: Optional[Dict[str, float]] = None,
+) -> "protein_digest.MassIndex":
+    """Digests a list of sequences into an index of the distinct peptides
+    sorted by monoisotopic mass.
+
+    index.query(precursor_masses, tolerance, unit="ppm") returns the indices
+    of the peptides within the tolerance window ("ppm" or "da") of each
+    precursor mass in CSR format as (offsets, indices) arrays, the matches of
+    the i-th precursor are indices[offsets[i]:offsets[i + 1]]. Peptides are
+    looked up with index.peptide(i), index.proteins(i) and index.masses[i].
+    Peptides with residues of unknown mass never match.
+    """
+    return protein_digest.MassIndex(
+        seqs=list(seqs),
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        fixed_mods=fixed_mods,
+        enzyme=enzyme,
+    )
+
+
+def write_peptide_database(
+    path: Union[str, os.PathLike],
+    seqs: List[str],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    with_masses: bool = False,
+    fixed_mods: Optional[Dict[str, float]] = None,
+):
+    """Digests a list of sequences into a binary peptide database file.
+
+    The database contains the deduplicated peptides of build_peptide_index
+    together with the indices of the sequences they occur in and optionally
+    their monoisotopic masses (including fixed_mods). It is opened with
+    protein_digest.database.PeptideDatabase.
+    """
+    protein_digest.write_peptide_database(
+        path=path,
+        seqs=list(seqs),
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        with_masses=with_masses,
+        fixed_mods=fixed_mods,
+        enzyme=enzyme,
+    )
+
+
+def digest_fasta(
+    fasta_file: Union[str, os.PathLike],
+    min_len: int = 6,
+    max_len: int = 50,
+    pre: List[str] = ["K", "R"],
+    not_post: List[str] = ["P"],
+    post: List[str] = [],
+    digestion: str = "full",
+    miscleavages: int = 0,
+    methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
+    batch_size: int = 1000,
+) -> Iterator[Tuple[str, List[str]]]:
+    """Streams the digested proteins of a (gzipped) FASTA file.
+
+    Yields (protein_id, peptides) tuples in the order of the FASTA file, where
+    protein_id is the header up to the first whitespace. Proteins are read and
+    digested in parallel in batches of batch_size proteins, so neither the
+    FASTA file nor all peptides are held in memory at once.
+    """
+    return protein_digest.FastaDigestIterator(
+        fasta_file=fasta_file,
+        min_len=min_len,
+        max_len=max_len,
+        pre=pre,
+        not_post=not_post,
+        post=post,
+        digestion=digestion,
+        miscleavages=miscleavages,
+        methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
+        batch_size=batch_size,
     )
 
 
@@ -37,6 +614,7 @@ def non_specific_digest(
     digestion: str = "full",
     miscleavages: int = 0,
     methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
 ):
     return protein_digest.get_digested_peptides(
         seq=seq,
@@ -48,6 +626,7 @@ def non_specific_digest(
         digestion="none",
         miscleavages=miscleavages,
         methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
     )
 
 
@@ -60,6 +639,7 @@ def semi_specific_digest(
     post: List[str] = [],
     miscleavages: int = 0,
     methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
 ):
     return protein_digest.get_digested_peptides(
         seq=seq,
@@ -71,6 +651,7 @@ def semi_specific_digest(
         digestion="semi",
         miscleavages=miscleavages,
         methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
     )
 
 
@@ -83,6 +664,7 @@ def full_digest(
     post: List[str] = [],
     miscleavages: int = 0,
     methionine_cleavage: bool = True,
+    enzyme: Optional[Enzyme] = None,
 ):
     return protein_digest.get_digested_peptides(
         seq=seq,
@@ -94,4 +676,5 @@ def full_digest(
         digestion="full",
         miscleavages=miscleavages,
         methionine_cleavage=methionine_cleavage,
+        enzyme=enzyme,
     )
@@ -0,0 +1,186 @@
+"""In-memory memoization of digestion results.
+
+DigestMemo sits in front of a digestion backend and keeps the peptides of the
+most recently digested sequences, keyed on a hash of the sequence together
+with all digestion parameters. Results are stored as tuples, and mass arrays
+as read-only NumPy arrays, such that a cached result is handed out to every
+caller without copying. The number of entries and their total size are
+bounded, least recently used entries are evicted first.
+"""
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+from . import get_backend
+
+
+class MemoStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    n_bytes: int
+
+
+def freeze(result):
+    """Immutable version of a digestion result and its approximate size"""
+    if isinstance(result, tuple) and hasattr(result[-1], "flags"):
+        # (peptides, masses) with return_masses=True
+        peptides, n_bytes = freeze(result[0])
+        masses = result[1]
+        masses.flags.writeable = False
+        return (peptides, masses), n_bytes + sys.getsizeof(masses)
+    peptides = tuple(result)
+    n_bytes = sys.getsizeof(peptides) + sum(map(sys.getsizeof, peptides))
+    return peptides, n_bytes
+
+
+class DigestMemo:
+    """Thread-safe LRU memoization of get_digested_peptides.
+
+    get_digested_peptides takes the arguments of the backend's
+    get_digested_peptides and returns the peptides as a tuple. Concurrent
+    misses on the same key may both digest the sequence, the result stored
+    last is kept.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: Optional[int] = None,
+        backend: str = "auto",
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.module = get_backend(backend)
+        self._entries = OrderedDict()
+        self._n_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get_digested_peptides(
+        self,
+        seq: str,
+        min_len: int = 6,
+        max_len: int = 50,
+        pre: List[str] = ["K", "R"],
+        not_post: List[str] = ["P"],
+        post: List[str] = [],
+        digestion: str = "full",
+        miscleavages: int = 0,
+        methionine_cleavage: bool = True,
+        enzyme=None,
+        **kwargs,
+    ):
+        """Digests a sequence into a tuple of peptides, or returns the cached
+        peptides of a previous call with the same arguments. Further keyword
+        arguments, e.g. unique or with the Rust backend fixed_mods and
+        return_masses, are passed to the backend and are part of the key."""
+        params = (min_len, max_len, pre, not_post, post, digestion, miscleavages)
+        params += (methionine_cleavage, enzyme)
+        key = self.key(seq, *params, **kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        result, n_bytes = freeze(
+            self.module.get_digested_peptides(
+                seq,
+                min_len=min_len,
+                max_len=max_len,
+                pre=pre,
+                not_post=not_post,
+                post=post,
+                digestion=digestion,
+                miscleavages=miscleavages,
+                methionine_cleavage=methionine_cleavage,
+                enzyme=enzyme,
+                **kwargs,
+            )
+        )
+        if self.max_bytes is not None and n_bytes > self.max_bytes:
+            return result
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._n_bytes -= previous[1]
+            self._entries[key] = (result, n_bytes)
+            self._n_bytes += n_bytes
+            self._evict()
+        return result
+
+    @staticmethod
+    def key(
+        seq,
+        min_len,
+        max_len,
+        pre,
+        not_post,
+        post,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        enzyme,
+        **kwargs,
+    ) -> tuple:
+        """Memoization key of a sequence and the digestion parameters"""
+        if enzyme is not None:
+            rules = [(rule.pre, rule.not_post, rule.post) for rule in enzyme.rules]
+        else:
+            rules = [(pre, not_post, post)]
+        rules = tuple(
+            tuple("".join(sorted("".join(residues))) for residues in rule)
+            for rule in rules
+        )
+        options = tuple(
+            (name, tuple(sorted(value.items())) if isinstance(value, dict) else value)
+            for name, value in sorted(kwargs.items())
+        )
+        return (
+            hashlib.blake2b(seq.encode(), digest_size=16).digest(),
+            min_len,
+            max_len,
+            rules,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+            options,
+        )
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self._n_bytes > self.max_bytes
+        ):
+            _, (_, n_bytes) = self._entries.popitem(last=False)
+            self._n_bytes -= n_bytes
+            self._evictions += 1
+
+    @property
+    def stats(self) -> MemoStats:
+        with self._lock:
+            return MemoStats(
+                self._hits,
+                self._misses,
+                self._evictions,
+                len(self._entries),
+                self._n_bytes,
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Removes all entries, the statistics are kept"""
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
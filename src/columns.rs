@@ -0,0 +1,78 @@
+use rayon::prelude::*;
+
+use crate::digest::digest_spans;
+use crate::enzyme::Enzyme;
+
+/// Peptides of a protein collection in columnar form, in protein order.
+///
+/// The buffers follow the Apache Arrow layout of a large string array, the
+/// i-th peptide is residues[offsets[i]..offsets[i + 1]], such that they can be
+/// wrapped into Arrow arrays without copying.
+pub struct PeptideColumns {
+    pub protein_indices: Vec<u32>,
+    pub starts: Vec<u32>,
+    /// Exclusive end positions
+    pub ends: Vec<u32>,
+    pub offsets: Vec<i64>,
+    pub residues: Vec<u8>,
+}
+
+impl PeptideColumns {
+    /// Digest all sequences in parallel into peptide columns
+    pub fn build(
+        seqs: &[String],
+        min_len: usize,
+        max_len: usize,
+        enzyme: &Enzyme,
+        digestion: &str,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+    ) -> Self {
+        // (start, end) spans and concatenated residues of every protein
+        let digested: Vec<(Vec<(u32, u32)>, Vec<u8>)> = seqs
+            .par_iter()
+            .map(|seq| {
+                let seq = seq.as_bytes();
+                let mut spans = Vec::new();
+                let mut residues = Vec::new();
+                digest_spans(
+                    seq,
+                    min_len,
+                    max_len,
+                    enzyme,
+                    digestion,
+                    miscleavages,
+                    methionine_cleavage,
+                    &mut |start, end| {
+                        spans.push((start as u32, end as u32));
+                        residues.extend_from_slice(&seq[start..end]);
+                    },
+                );
+                (spans, residues)
+            })
+            .collect();
+
+        let n_peptides = digested.iter().map(|(spans, _)| spans.len()).sum();
+        let n_residues = digested.iter().map(|(_, residues)| residues.len()).sum();
+        let mut columns = PeptideColumns {
+            protein_indices: Vec::with_capacity(n_peptides),
+            starts: Vec::with_capacity(n_peptides),
+            ends: Vec::with_capacity(n_peptides),
+            offsets: Vec::with_capacity(n_peptides + 1),
+            residues: Vec::with_capacity(n_residues),
+        };
+        columns.offsets.push(0);
+        for (protein, (spans, residues)) in digested.into_iter().enumerate() {
+            let mut offset = columns.residues.len() as i64;
+            for (start, end) in spans {
+                columns.protein_indices.push(protein as u32);
+                columns.starts.push(start);
+                columns.ends.push(end);
+                offset += i64::from(end - start);
+                columns.offsets.push(offset);
+            }
+            columns.residues.extend_from_slice(&residues);
+        }
+        columns
+    }
+}
@@ -0,0 +1,82 @@
+use std::fs::File;
+use std::io::{self, BufWriter, Write};
+use std::path::Path;
+
+use crate::index::PeptideIndex;
+
+pub const MAGIC: &[u8; 8] = b"PEPTDB\0\0";
+pub const VERSION: u32 = 1;
+/// Flag set in the header if the database contains peptide masses
+pub const HAS_MASSES: u32 = 1;
+
+/// Write a peptide index to a binary peptide database.
+///
+/// The file starts with a 48 byte little endian header
+///
+/// ```text
+/// magic          [u8; 8]  b"PEPTDB\0\0"
+/// version        u32
+/// flags          u32      HAS_MASSES
+/// n_peptides     u64
+/// n_residues     u64
+/// n_memberships  u64
+/// n_proteins     u64
+/// ```
+///
+/// followed by the sections, each padded to a multiple of 8 bytes such that
+/// they can be memory-mapped as aligned arrays:
+///
+/// ```text
+/// peptide_offsets  u64[n_peptides + 1]  into residues
+/// protein_offsets  u64[n_peptides + 1]  into protein_indices
+/// protein_indices  u32[n_memberships]
+/// masses           f64[n_peptides]      only if HAS_MASSES is set
+/// residues         u8[n_residues]       concatenated sorted peptides
+/// ```
+pub fn write_database<P: AsRef<Path>>(
+    path: P,
+    index: &PeptideIndex,
+    n_proteins: usize,
+    masses: Option<&[f64]>,
+) -> io::Result<()> {
+    let mut writer = BufWriter::with_capacity(1 << 20, File::create(path)?);
+
+    writer.write_all(MAGIC)?;
+    writer.write_all(&VERSION.to_le_bytes())?;
+    let flags = if masses.is_some() { HAS_MASSES } else { 0 };
+    writer.write_all(&flags.to_le_bytes())?;
+    for n in [
+        index.len(),
+        index.residues().len(),
+        index.protein_indices().len(),
+        n_proteins,
+    ] {
+        writer.write_all(&(n as u64).to_le_bytes())?;
+    }
+
+    let mut written = 0;
+    for &offset in index.peptide_offsets() {
+        writer.write_all(&offset.to_le_bytes())?;
+    }
+    for &offset in index.protein_offsets() {
+        writer.write_all(&offset.to_le_bytes())?;
+    }
+    for &protein in index.protein_indices() {
+        writer.write_all(&protein.to_le_bytes())?;
+        written += 4;
+    }
+    write_padding(&mut writer, written)?;
+    if let Some(masses) = masses {
+        for &mass in masses {
+            writer.write_all(&mass.to_le_bytes())?;
+        }
+    }
+    writer.write_all(index.residues())?;
+    write_padding(&mut writer, index.residues().len())?;
+    writer.flush()
+}
+
+/// Pad a section of `written` bytes to a multiple of 8 bytes
+fn write_padding<W: Write>(writer: &mut W, written: usize) -> io::Result<()> {
+    writer.write_all(&[0; 8][..(8 - written % 8) % 8])
+}
@@ -0,0 +1,88 @@
+//! Decoy peptides for target-decoy searches
+
+use crate::digest::digest_spans;
+use crate::enzyme::Enzyme;
+
+/// Ways of generating decoys from a target protein
+#[derive(Clone, Copy, PartialEq, Eq, Debug)]
+pub enum DecoyMethod {
+    /// Digest the reversed protein. An initial methionine stays at the
+    /// N-terminus, such that methionine cleavage applies to the decoy protein
+    /// as it does to its target.
+    Reverse,
+    /// Reverse each target peptide except for its C-terminal residue, such
+    /// that decoys keep the cleavage residue and the mass of their target
+    PseudoReverse,
+}
+
+impl DecoyMethod {
+    /// Decoy method by name, "reverse" or "pseudo-reverse"
+    pub fn from_name(name: &str) -> Option<Self> {
+        match name {
+            "reverse" => Some(DecoyMethod::Reverse),
+            "pseudo-reverse" => Some(DecoyMethod::PseudoReverse),
+            _ => None,
+        }
+    }
+}
+
+/// Reversed ASCII peptide, except for the C-terminal residue
+pub fn pseudo_reverse(peptide: &str) -> String {
+    let bytes = peptide.as_bytes();
+    let mut reversed = String::with_capacity(bytes.len());
+    if let Some((&last, rest)) = bytes.split_last() {
+        reversed.extend(rest.iter().rev().map(|&aa| aa as char));
+        reversed.push(last as char);
+    }
+    reversed
+}
+
+/// Digest a single ASCII sequence together with its decoy.
+///
+/// Returns the peptides and whether each of them is a decoy. Pseudo-reversed
+/// decoys directly follow their target peptide, decoys of the reversed
+/// protein follow all target peptides.
+pub fn digest_with_decoys(
+    seq: &str,
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    method: DecoyMethod,
+) -> (Vec<String>, Vec<bool>) {
+    let mut peptides = Vec::new();
+    let mut is_decoy = Vec::new();
+    let mut digest_into = |seq: &str, decoy: bool, pseudo_reversed: bool| {
+        digest_spans(
+            seq.as_bytes(),
+            min_len,
+            max_len,
+            enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+            &mut |start, end| {
+                let peptide = &seq[start..end];
+                peptides.push(peptide.to_string());
+                is_decoy.push(decoy);
+                if pseudo_reversed {
+                    peptides.push(pseudo_reverse(peptide));
+                    is_decoy.push(true);
+                }
+            },
+        )
+    };
+
+    match method {
+        DecoyMethod::PseudoReverse => digest_into(seq, false, true),
+        DecoyMethod::Reverse => {
+            digest_into(seq, false, false);
+            let (head, tail) = seq.split_at(usize::from(seq.starts_with('M')));
+            let reversed: String = head.chars().chain(tail.chars().rev()).collect();
+            digest_into(&reversed, true, false);
+        }
+    }
+    (peptides, is_decoy)
+}
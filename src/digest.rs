@@ -0,0 +1,788 @@
+use std::collections::HashSet;
+use std::ops::Range;
+
+use crate::enzyme::Enzyme;
+use crate::mass::MassTable;
+
+/// Positions i at which the enzyme cleaves between seq[i] and seq[i + 1].
+///
+/// The cleavage rules are a branch-free table lookup per residue pair, so the
+/// sequence is scanned in a single pass without any per-residue allocations.
+pub fn cleavage_sites(seq: &[u8], enzyme: &Enzyme) -> Vec<usize> {
+    let mut sites = Vec::with_capacity(seq.len() / 8);
+    for (i, pair) in seq.windows(2).enumerate() {
+        if enzyme.is_cleavage_site(pair[0], pair[1]) {
+            sites.push(i);
+        }
+    }
+    sites
+}
+
+/// Non-specific digestion
+pub fn non_specific_digest<F: FnMut(usize, usize)>(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    emit: &mut F,
+) {
+    let seq_len = seq.len();
+
+    for i in 0..=seq_len {
+        for j in (i + min_len)..=(usize::min(seq_len, i + max_len)) {
+            emit(i, j);
+        }
+    }
+}
+
+/// Positions at which enzymatic peptides can start or end: the start of the
+/// sequence, after the initial methionine, after every cleavage site and the
+/// end of the sequence, in ascending order without duplicates
+pub fn cuts(seq: &[u8], enzyme: &Enzyme, methionine_cleavage: bool) -> Vec<usize> {
+    let mut cuts = vec![0];
+    if methionine_cleavage {
+        cuts.push(1);
+    }
+    for site in cleavage_sites(seq, enzyme) {
+        if site + 1 > cuts[cuts.len() - 1] {
+            cuts.push(site + 1);
+        }
+    }
+    if cuts[cuts.len() - 1] < seq.len() {
+        cuts.push(seq.len());
+    }
+    cuts
+}
+
+/// First cut within the miscleavage window of the k-th cut, the methionine
+/// cleavage is not counted as a miscleavage
+#[inline]
+fn window_start(k: usize, miscleavages: usize, methionine_cleavage: bool) -> usize {
+    let first = k.saturating_sub(miscleavages + 1);
+    if methionine_cleavage && first == 1 {
+        0
+    } else {
+        first
+    }
+}
+
+/// Candidate starts of the semi-specific peptides ending at a position
+pub enum SemiStarts {
+    /// Any position, for peptides with an enzymatic C-terminus
+    Positions(Range<usize>),
+    /// Indices into the cuts, for peptides with a non-enzymatic C-terminus
+    Cuts(Range<usize>),
+}
+
+/// Enumerates the end positions of a sequence together with the starts of
+/// the semi-specific peptides ending there.
+///
+/// The starts within the length bounds are tracked with two pointers into the
+/// cuts, such that every end takes constant time besides its peptides and
+/// each (start, end) pair is produced exactly once.
+pub struct SemiWindows {
+    cuts: Vec<usize>,
+    min_len: usize,
+    max_len: usize,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    end: usize,
+    /// number of cuts before end
+    k: usize,
+    /// first cut with a peptide length of at most max_len
+    low: usize,
+    /// first cut with a peptide length below min_len
+    high: usize,
+}
+
+impl SemiWindows {
+    pub fn new(
+        seq: &[u8],
+        min_len: usize,
+        max_len: usize,
+        enzyme: &Enzyme,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+    ) -> Self {
+        let methionine_cleavage = methionine_cleavage && seq.first() == Some(&b'M');
+        SemiWindows {
+            cuts: cuts(seq, enzyme, methionine_cleavage),
+            min_len,
+            max_len,
+            miscleavages,
+            methionine_cleavage,
+            end: 0,
+            k: 0,
+            low: 0,
+            high: 0,
+        }
+    }
+
+    pub fn cuts(&self) -> &[usize] {
+        &self.cuts
+    }
+
+    /// The next end position and the starts of its peptides
+    pub fn next_end(&mut self) -> Option<(usize, SemiStarts)> {
+        let seq_len = self.cuts[self.cuts.len() - 1];
+        if self.end >= seq_len {
+            return None;
+        }
+        self.end += 1;
+        let end = self.end;
+        while self.cuts[self.k] < end {
+            self.k += 1;
+        }
+        let first = window_start(self.k, self.miscleavages, self.methionine_cleavage);
+
+        if self.cuts[self.k] == end {
+            // enzymatic C-terminus, any N-terminus within the window
+            let start = usize::max(self.cuts[first], end.saturating_sub(self.max_len));
+            let stop = usize::min(end - 1, (end + 1).saturating_sub(self.min_len));
+            return Some((end, SemiStarts::Positions(start..usize::max(start, stop))));
+        }
+
+        // non-enzymatic C-terminus, enzymatic N-terminus within the window
+        while self.low < self.k && self.cuts[self.low] + self.max_len < end {
+            self.low += 1;
+        }
+        while self.high < self.k && self.cuts[self.high] + self.min_len <= end {
+            self.high += 1;
+        }
+        let start = usize::max(first, self.low);
+        Some((end, SemiStarts::Cuts(start..usize::max(start, self.high))))
+    }
+}
+
+/// Semi-specific digestion, peptides are enumerated by end position in time
+/// proportional to the sequence length plus the number of peptides.
+///
+/// Same enumeration as SemiWindows, with the ends between two consecutive
+/// cuts processed in a single loop since they share the miscleavage window.
+pub fn semi_specific_digest<F: FnMut(usize, usize)>(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    emit: &mut F,
+) {
+    let methionine_cleavage = methionine_cleavage && seq[0] == b'M';
+    let cuts = cuts(seq, enzyme, methionine_cleavage);
+    // cuts[low..high] are the starts with an accepted peptide length
+    let (mut low, mut high) = (0, 0);
+
+    for k in 1..cuts.len() {
+        let first = window_start(k, miscleavages, methionine_cleavage);
+
+        // non-enzymatic C-terminus, enzymatic N-terminus within the window
+        for end in cuts[k - 1] + 1..cuts[k] {
+            while low < k && cuts[low] + max_len < end {
+                low += 1;
+            }
+            while high < k && cuts[high] + min_len <= end {
+                high += 1;
+            }
+            for &start in cuts.get(usize::max(first, low)..high).unwrap_or(&[]) {
+                emit(start, end);
+            }
+        }
+
+        // enzymatic C-terminus, any N-terminus within the window
+        let end = cuts[k];
+        let start = usize::max(cuts[first], end.saturating_sub(max_len));
+        let stop = usize::min(end - 1, (end + 1).saturating_sub(min_len));
+        for start in start..stop {
+            emit(start, end);
+        }
+    }
+}
+
+/// Full digestion
+pub fn full_digest<F: FnMut(usize, usize)>(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    emit: &mut F,
+) {
+    let methionine_cleavage = methionine_cleavage && seq[0] == b'M';
+    let cuts = cuts(seq, enzyme, methionine_cleavage);
+
+    for k in 1..cuts.len() {
+        let first = window_start(k, miscleavages, methionine_cleavage);
+        for &start in &cuts[first..k] {
+            let pep_len = cuts[k] - start;
+            if (min_len..=max_len).contains(&pep_len) {
+                emit(start, cuts[k]);
+            }
+        }
+    }
+}
+
+/// Enumerate the (start, end) positions of the peptides of a single sequence
+/// according to the digestion mode, end positions are exclusive.
+pub fn digest_spans<F: FnMut(usize, usize)>(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    emit: &mut F,
+) {
+    if seq.is_empty() {
+        return;
+    }
+    match digestion {
+        "none" => non_specific_digest(seq, min_len, max_len, emit),
+        "semi" => semi_specific_digest(
+            seq,
+            min_len,
+            max_len,
+            enzyme,
+            miscleavages,
+            methionine_cleavage,
+            emit,
+        ),
+        _ => full_digest(
+            seq,
+            min_len,
+            max_len,
+            enzyme,
+            miscleavages,
+            methionine_cleavage,
+            emit,
+        ),
+    }
+}
+
+/// Sum of the integers in start..stop
+fn range_sum(start: usize, stop: usize) -> u64 {
+    if stop <= start {
+        return 0;
+    }
+    (start + stop - 1) as u64 * (stop - start) as u64 / 2
+}
+
+/// Sum of the squares of the integers in 0..stop
+fn square_sum(stop: usize) -> u64 {
+    let n = stop as u64;
+    n.saturating_sub(1) * n * (2 * n).saturating_sub(1) / 6
+}
+
+/// Number of peptides starting at one of the given cuts and ending at end,
+/// together with their total length
+#[inline]
+fn count_cut_starts(end: usize, starts: Range<usize>, prefix_sums: &[u64]) -> (u64, u64) {
+    if starts.end <= starts.start {
+        return (0, 0);
+    }
+    let n = (starts.end - starts.start) as u64;
+    (
+        n,
+        n * end as u64 - (prefix_sums[starts.end] - prefix_sums[starts.start]),
+    )
+}
+
+/// Running sums of the cut positions, prefix_sums[i] is the sum of cuts[..i]
+fn prefix_sums(cuts: &[usize]) -> Vec<u64> {
+    let mut sums = Vec::with_capacity(cuts.len() + 1);
+    sums.push(0);
+    for &cut in cuts {
+        sums.push(sums[sums.len() - 1] + cut as u64);
+    }
+    sums
+}
+
+/// Count the peptides of a single sequence and their total number of
+/// residues without enumerating them.
+///
+/// Counts are computed from the cut positions: every window of starts of
+/// an end is counted at once, in time proportional to the number of cuts for
+/// full and the sequence length for semi-specific digestion, and in constant
+/// time for non-specific digestion.
+pub fn count_spans(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+) -> (u64, u64) {
+    if seq.is_empty() {
+        return (0, 0);
+    }
+    let seq_len = seq.len();
+    if digestion == "none" {
+        // seq_len + 1 - length peptides of every length
+        let stop = usize::min(max_len, seq_len) + 1;
+        if stop <= min_len {
+            return (0, 0);
+        }
+        let n_lengths = (stop - min_len) as u64;
+        let length_sum = range_sum(min_len, stop);
+        let n_peptides = n_lengths * (seq_len as u64 + 1) - length_sum;
+        let n_residues =
+            (seq_len as u64 + 1) * length_sum - (square_sum(stop) - square_sum(min_len));
+        return (n_peptides, n_residues);
+    }
+
+    let methionine_cleavage = methionine_cleavage && seq[0] == b'M';
+    let cuts = cuts(seq, enzyme, methionine_cleavage);
+    let prefix_sums = prefix_sums(&cuts);
+    let (mut n_peptides, mut n_residues) = (0, 0);
+    let mut add = |(n, residues): (u64, u64)| {
+        n_peptides += n;
+        n_residues += residues;
+    };
+
+    if digestion != "semi" {
+        for k in 1..cuts.len() {
+            let first = window_start(k, miscleavages, methionine_cleavage);
+            let end = cuts[k];
+            let window = &cuts[first..k];
+            let low = first + window.partition_point(|&start| start + max_len < end);
+            let high = first + window.partition_point(|&start| start + min_len <= end);
+            add(count_cut_starts(end, low..high, &prefix_sums));
+        }
+        return (n_peptides, n_residues);
+    }
+
+    // same windows as semi_specific_digest
+    let (mut low, mut high) = (0, 0);
+    for k in 1..cuts.len() {
+        let first = window_start(k, miscleavages, methionine_cleavage);
+        for end in cuts[k - 1] + 1..cuts[k] {
+            while low < k && cuts[low] + max_len < end {
+                low += 1;
+            }
+            while high < k && cuts[high] + min_len <= end {
+                high += 1;
+            }
+            add(count_cut_starts(
+                end,
+                usize::max(first, low)..high,
+                &prefix_sums,
+            ));
+        }
+
+        let end = cuts[k];
+        let start = usize::max(cuts[first], end.saturating_sub(max_len));
+        let stop = usize::min(end - 1, (end + 1).saturating_sub(min_len));
+        let n = stop.saturating_sub(start) as u64;
+        add((n, n * end as u64 - range_sum(start, stop)));
+    }
+    (n_peptides, n_residues)
+}
+
+/// Digest a single ASCII sequence according to the digestion mode
+pub fn digest(
+    seq: &str,
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+) -> Vec<String> {
+    let mut peptides = Vec::new();
+    digest_spans(
+        seq.as_bytes(),
+        min_len,
+        max_len,
+        enzyme,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        &mut |start, end| peptides.push(seq[start..end].to_string()),
+    );
+    peptides
+}
+
+/// Digest a single ASCII sequence into its distinct peptides, in the order of
+/// their first occurrence
+pub fn digest_unique(
+    seq: &str,
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+) -> Vec<String> {
+    let mut seen = HashSet::new();
+    let mut peptides = Vec::new();
+    digest_spans(
+        seq.as_bytes(),
+        min_len,
+        max_len,
+        enzyme,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        &mut |start, end| {
+            if seen.insert(&seq.as_bytes()[start..end]) {
+                peptides.push(seq[start..end].to_string());
+            }
+        },
+    );
+    peptides
+}
+
+/// Digest a single sequence into the start and (exclusive) end positions of
+/// its peptides, without allocating the peptide sequences
+pub fn digest_offsets(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+) -> (Vec<u32>, Vec<u32>) {
+    let mut starts = Vec::new();
+    let mut ends = Vec::new();
+    digest_spans(
+        seq,
+        min_len,
+        max_len,
+        enzyme,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        &mut |start, end| {
+            starts.push(start as u32);
+            ends.push(end as u32);
+        },
+    );
+    (starts, ends)
+}
+
+/// Columnar metadata of the peptides of a single sequence
+#[derive(Default)]
+pub struct PeptideMetadata {
+    pub starts: Vec<u32>,
+    /// Exclusive end positions
+    pub ends: Vec<u32>,
+    /// Number of cleavage sites within the peptide
+    pub missed_cleavages: Vec<u32>,
+    /// Residue before the peptide, '-' at the protein N-terminus
+    pub preceding: Vec<u8>,
+    /// Residue after the peptide, '-' at the protein C-terminus
+    pub following: Vec<u8>,
+    /// Whether the peptide starts at the protein N-terminus, or directly
+    /// after the initial methionine if it is cleaved
+    pub protein_n_term: Vec<bool>,
+    /// Whether the peptide ends at the protein C-terminus
+    pub protein_c_term: Vec<bool>,
+}
+
+/// Digest a single sequence into the positions, missed cleavages, flanking
+/// residues and terminal flags of its peptides, computed while enumerating
+/// the peptides such that they never have to be located in the protein
+pub fn digest_metadata(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+) -> PeptideMetadata {
+    // number of cleavage sites before each position
+    let mut n_sites = vec![0u32; seq.len() + 1];
+    for site in cleavage_sites(seq, enzyme) {
+        n_sites[site + 1] = 1;
+    }
+    for i in 1..n_sites.len() {
+        n_sites[i] += n_sites[i - 1];
+    }
+    let methionine_cleaved = methionine_cleavage && seq.first() == Some(&b'M');
+
+    let mut metadata = PeptideMetadata::default();
+    digest_spans(
+        seq,
+        min_len,
+        max_len,
+        enzyme,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        &mut |start, end| {
+            metadata.starts.push(start as u32);
+            metadata.ends.push(end as u32);
+            // sites between seq[start] and seq[end - 1]
+            let last = usize::max(start + 1, end) - 1;
+            metadata
+                .missed_cleavages
+                .push(n_sites[last] - n_sites[start]);
+            metadata
+                .preceding
+                .push(if start > 0 { seq[start - 1] } else { b'-' });
+            metadata.following.push(*seq.get(end).unwrap_or(&b'-'));
+            metadata
+                .protein_n_term
+                .push(start == 0 || (methionine_cleaved && start == 1));
+            metadata.protein_c_term.push(end == seq.len());
+        },
+    );
+    metadata
+}
+
+/// Enumerate the peptides of a single sequence together with their
+/// monoisotopic masses, computed from prefix sums of the residue masses.
+///
+/// Peptides outside of [min_mass, max_mass] are skipped before they are
+/// emitted, peptides with unknown residues have a NaN mass and are only
+/// emitted if no mass bounds are given.
+pub fn digest_spans_with_masses<F: FnMut(usize, usize, f64)>(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    mass_table: &MassTable,
+    min_mass: Option<f64>,
+    max_mass: Option<f64>,
+    emit: &mut F,
+) {
+    let prefix_masses = mass_table.prefix_masses(seq);
+    digest_spans(
+        seq,
+        min_len,
+        max_len,
+        enzyme,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        &mut |start, end| {
+            let mass = prefix_masses.peptide_mass(start, end);
+            if min_mass.map_or(true, |min_mass| mass >= min_mass)
+                && max_mass.map_or(true, |max_mass| mass <= max_mass)
+            {
+                emit(start, end, mass);
+            }
+        },
+    );
+}
+
+/// Digest a single ASCII sequence into peptides and their masses
+pub fn digest_with_masses(
+    seq: &str,
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    mass_table: &MassTable,
+    min_mass: Option<f64>,
+    max_mass: Option<f64>,
+) -> (Vec<String>, Vec<f64>) {
+    let mut peptides = Vec::new();
+    let mut masses = Vec::new();
+    digest_spans_with_masses(
+        seq.as_bytes(),
+        min_len,
+        max_len,
+        enzyme,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        mass_table,
+        min_mass,
+        max_mass,
+        &mut |start, end, mass| {
+            peptides.push(seq[start..end].to_string());
+            masses.push(mass);
+        },
+    );
+    (peptides, masses)
+}
+
+/// Digest a single sequence into the start and (exclusive) end positions and
+/// the masses of its peptides
+pub fn digest_offsets_with_masses(
+    seq: &[u8],
+    min_len: usize,
+    max_len: usize,
+    enzyme: &Enzyme,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    mass_table: &MassTable,
+    min_mass: Option<f64>,
+    max_mass: Option<f64>,
+) -> (Vec<u32>, Vec<u32>, Vec<f64>) {
+    let mut starts = Vec::new();
+    let mut ends = Vec::new();
+    let mut masses = Vec::new();
+    digest_spans_with_masses(
+        seq,
+        min_len,
+        max_len,
+        enzyme,
+        digestion,
+        miscleavages,
+        methionine_cleavage,
+        mass_table,
+        min_mass,
+        max_mass,
+        &mut |start, end, mass| {
+            starts.push(start as u32);
+            ends.push(end as u32);
+            masses.push(mass);
+        },
+    );
+    (starts, ends, masses)
+}
+
+/// Lazy counterpart of digest_spans, yielding the (start, end) positions of
+/// the peptides in the same order without materializing them.
+///
+/// The iterator owns all of its state, i.e. the cleavage positions of the
+/// sequence, such that it can be kept alive across calls from Python.
+pub enum SpanIterator {
+    Empty,
+    NonSpecific {
+        seq_len: usize,
+        min_len: usize,
+        max_len: usize,
+        start: usize,
+        end: usize,
+    },
+    SemiSpecific {
+        windows: SemiWindows,
+        end: usize,
+        starts: SemiStarts,
+    },
+    Full {
+        min_len: usize,
+        max_len: usize,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+        cuts: Vec<usize>,
+        k: usize,
+        start: usize,
+    },
+}
+
+impl SpanIterator {
+    pub fn new(
+        seq: &[u8],
+        min_len: usize,
+        max_len: usize,
+        enzyme: &Enzyme,
+        digestion: &str,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+    ) -> Self {
+        if seq.is_empty() {
+            return SpanIterator::Empty;
+        }
+        match digestion {
+            "none" => SpanIterator::NonSpecific {
+                seq_len: seq.len(),
+                min_len,
+                max_len,
+                start: 0,
+                end: min_len,
+            },
+            "semi" => SpanIterator::SemiSpecific {
+                windows: SemiWindows::new(
+                    seq,
+                    min_len,
+                    max_len,
+                    enzyme,
+                    miscleavages,
+                    methionine_cleavage,
+                ),
+                end: 0,
+                starts: SemiStarts::Positions(0..0),
+            },
+            _ => {
+                let methionine_cleavage = methionine_cleavage && seq[0] == b'M';
+                SpanIterator::Full {
+                    min_len,
+                    max_len,
+                    miscleavages,
+                    methionine_cleavage,
+                    cuts: cuts(seq, enzyme, methionine_cleavage),
+                    k: 1,
+                    start: window_start(1, miscleavages, methionine_cleavage),
+                }
+            }
+        }
+    }
+}
+
+impl Iterator for SpanIterator {
+    type Item = (usize, usize);
+
+    fn next(&mut self) -> Option<(usize, usize)> {
+        match self {
+            SpanIterator::Empty => None,
+            SpanIterator::NonSpecific {
+                seq_len,
+                min_len,
+                max_len,
+                start,
+                end,
+            } => loop {
+                if *start > *seq_len {
+                    return None;
+                }
+                if *end <= usize::min(*seq_len, *start + *max_len) {
+                    *end += 1;
+                    return Some((*start, *end - 1));
+                }
+                *start += 1;
+                *end = *start + *min_len;
+            },
+            SpanIterator::SemiSpecific {
+                windows,
+                end,
+                starts,
+            } => loop {
+                let start = match starts {
+                    SemiStarts::Positions(starts) => starts.next(),
+                    SemiStarts::Cuts(starts) => starts.next().map(|c| windows.cuts()[c]),
+                };
+                if let Some(start) = start {
+                    return Some((start, *end));
+                }
+                (*end, *starts) = windows.next_end()?;
+            },
+            SpanIterator::Full {
+                min_len,
+                max_len,
+                miscleavages,
+                methionine_cleavage,
+                cuts,
+                k,
+                start,
+            } => loop {
+                if *k >= cuts.len() {
+                    return None;
+                }
+                if *start < *k {
+                    let (peptide_start, end) = (cuts[*start], cuts[*k]);
+                    *start += 1;
+                    if (*min_len..=*max_len).contains(&(end - peptide_start)) {
+                        return Some((peptide_start, end));
+                    }
+                    continue;
+                }
+                *k += 1;
+                *start = window_start(*k, *miscleavages, *methionine_cleavage);
+            },
+        }
+    }
+}
@@ -0,0 +1,138 @@
+/// Named enzymes as (name, pre, not_post, post)
+pub const PRESETS: [(&str, &str, &str, &str); 6] = [
+    ("trypsin", "KR", "P", ""),
+    ("trypsin/p", "KR", "", ""),
+    ("lys-c", "K", "P", ""),
+    ("glu-c", "E", "P", ""),
+    ("asp-n", "", "", "D"),
+    ("chymotrypsin", "FWY", "P", ""),
+];
+
+/// Maximum number of cleavage rules combined into one enzyme
+pub const MAX_RULES: usize = 32;
+
+/// Cleavage rules compiled into lookup tables indexed by residue.
+///
+/// An enzyme cleaves between aa1 and aa2 if aa1 is in `pre` and aa2 is not in
+/// `not_post`, or if aa2 is in `post`. Several such rules, e.g. of the
+/// proteases of a multi-enzyme digestion, can be combined into one enzyme
+/// that cleaves wherever any of its rules does. Bit r of the tables belongs
+/// to the r-th rule, so all rules are checked with the same three lookups.
+#[derive(Clone)]
+pub struct Enzyme {
+    pre: [u32; 256],
+    not_post: [u32; 256],
+    post: [u32; 256],
+    n_rules: usize,
+}
+
+impl Enzyme {
+    /// Compile a single cleavage rule, non-ASCII residues cannot be stored
+    /// in the lookup tables and are ignored, the Python bindings reject them
+    pub fn new(pre: &[char], not_post: &[char], post: &[char]) -> Self {
+        let table = |residues: &[char]| {
+            let mut table = [0; 256];
+            for &aa in residues.iter().filter(|aa| aa.is_ascii()) {
+                table[aa as usize] = 1;
+            }
+            table
+        };
+        Enzyme {
+            pre: table(pre),
+            not_post: table(not_post),
+            post: table(post),
+            n_rules: 1,
+        }
+    }
+
+    /// Enzyme cleaving wherever any of the given enzymes cleaves, None if
+    /// they have more than MAX_RULES rules in total
+    pub fn union(enzymes: &[Enzyme]) -> Option<Self> {
+        if enzymes.iter().map(|enzyme| enzyme.n_rules).sum::<usize>() > MAX_RULES {
+            return None;
+        }
+        let mut union = Enzyme {
+            pre: [0; 256],
+            not_post: [0; 256],
+            post: [0; 256],
+            n_rules: 0,
+        };
+        for enzyme in enzymes.iter().filter(|enzyme| enzyme.n_rules > 0) {
+            for aa in 0..256 {
+                union.pre[aa] |= enzyme.pre[aa] << union.n_rules;
+                union.not_post[aa] |= enzyme.not_post[aa] << union.n_rules;
+                union.post[aa] |= enzyme.post[aa] << union.n_rules;
+            }
+            union.n_rules += enzyme.n_rules;
+        }
+        Some(union)
+    }
+
+    /// Look up a named enzyme, names are case-insensitive. Names joined by
+    /// '+', e.g. "trypsin+glu-c", give the union of the named enzymes.
+    pub fn from_name(name: &str) -> Option<Self> {
+        let enzymes = name
+            .to_lowercase()
+            .split('+')
+            .map(|name| {
+                PRESETS
+                    .iter()
+                    .find(|(preset, ..)| *preset == name.trim())
+                    .map(|(_, pre, not_post, post)| {
+                        Enzyme::new(
+                            &pre.chars().collect::<Vec<char>>(),
+                            &not_post.chars().collect::<Vec<char>>(),
+                            &post.chars().collect::<Vec<char>>(),
+                        )
+                    })
+            })
+            .collect::<Option<Vec<Enzyme>>>()?;
+        match enzymes.len() {
+            1 => enzymes.into_iter().next(),
+            _ => Enzyme::union(&enzymes),
+        }
+    }
+
+    /// Check if the enzyme cleaves between aa1 and aa2
+    #[inline]
+    pub fn is_cleavage_site(&self, aa1: u8, aa2: u8) -> bool {
+        (self.pre[aa1 as usize] & !self.not_post[aa2 as usize]) | self.post[aa2 as usize] != 0
+    }
+
+    /// The individual cleavage rules, each as a single-rule enzyme
+    pub fn rules(&self) -> Vec<Enzyme> {
+        (0..self.n_rules)
+            .map(|r| {
+                let bit = |table: &[u32; 256]| table.map(|flags| (flags >> r) & 1);
+                Enzyme {
+                    pre: bit(&self.pre),
+                    not_post: bit(&self.not_post),
+                    post: bit(&self.post),
+                    n_rules: 1,
+                }
+            })
+            .collect()
+    }
+
+    fn residues(table: &[u32; 256]) -> Vec<char> {
+        (0..128u8)
+            .filter(|&aa| table[aa as usize] != 0)
+            .map(char::from)
+            .collect()
+    }
+
+    /// Residues in `pre` of any rule
+    pub fn pre(&self) -> Vec<char> {
+        Enzyme::residues(&self.pre)
+    }
+
+    /// Residues in `not_post` of any rule
+    pub fn not_post(&self) -> Vec<char> {
+        Enzyme::residues(&self.not_post)
+    }
+
+    /// Residues in `post` of any rule
+    pub fn post(&self) -> Vec<char> {
+        Enzyme::residues(&self.post)
+    }
+}
@@ -0,0 +1,93 @@
+use std::fs::File;
+use std::io::{self, BufRead, BufReader};
+use std::path::Path;
+
+use flate2::read::MultiGzDecoder;
+
+const GZIP_MAGIC: [u8; 2] = [0x1f, 0x8b];
+const BUFFER_SIZE: usize = 1 << 16;
+
+/// Streaming reader for (multi-line) FASTA records
+pub struct FastaReader<R: BufRead> {
+    reader: R,
+    line: Vec<u8>,
+    header: Option<Vec<u8>>,
+}
+
+impl<R: BufRead> FastaReader<R> {
+    pub fn new(reader: R) -> Self {
+        FastaReader {
+            reader,
+            line: Vec::new(),
+            header: None,
+        }
+    }
+
+    /// Read the next record as (protein_id, sequence)
+    ///
+    /// The protein id is the part of the header up to the first whitespace,
+    /// sequence lines are concatenated with all whitespace removed.
+    pub fn next_record(&mut self) -> io::Result<Option<(String, String)>> {
+        let mut seq = Vec::new();
+        loop {
+            self.line.clear();
+            if self.reader.read_until(b'\n', &mut self.line)? == 0 {
+                return Ok(self.header.take().map(|header| to_record(&header, seq)));
+            }
+            if self.line.first() == Some(&b'>') {
+                let header = self.line[1..].to_vec();
+                if let Some(previous) = self.header.replace(header) {
+                    return Ok(Some(to_record(&previous, seq)));
+                }
+            } else if self.header.is_some() {
+                seq.extend(self.line.iter().filter(|c| !c.is_ascii_whitespace()));
+            }
+        }
+    }
+}
+
+impl<R: BufRead> Iterator for FastaReader<R> {
+    type Item = io::Result<(String, String)>;
+
+    fn next(&mut self) -> Option<Self::Item> {
+        self.next_record().transpose()
+    }
+}
+
+fn to_record(header: &[u8], seq: Vec<u8>) -> (String, String) {
+    let header = String::from_utf8_lossy(header);
+    let protein_id = header.split_whitespace().next().unwrap_or("").to_string();
+    (protein_id, String::from_utf8_lossy(&seq).into_owned())
+}
+
+/// Open a plain or gzip compressed FASTA file, gzip is detected by its magic bytes
+pub fn open_fasta<P: AsRef<Path>>(
+    path: P,
+) -> io::Result<FastaReader<Box<dyn BufRead + Send>>> {
+    let mut file = BufReader::with_capacity(BUFFER_SIZE, File::open(path)?);
+    let is_gzip = file.fill_buf()?.starts_with(&GZIP_MAGIC);
+    let reader: Box<dyn BufRead + Send> = if is_gzip {
+        Box::new(BufReader::with_capacity(
+            BUFFER_SIZE,
+            MultiGzDecoder::new(file),
+        ))
+    } else {
+        Box::new(file)
+    };
+    Ok(FastaReader::new(reader))
+}
+
+/// Read up to `batch_size` records
+pub fn read_batch<R: BufRead>(
+    reader: &mut FastaReader<R>,
+    batch_size: usize,
+) -> io::Result<Vec<(String, String)>> {
+    let mut batch = Vec::with_capacity(batch_size);
+    while batch.len() < batch_size {
+        match reader.next_record()? {
+            Some(record) => batch.push(record),
+            None => break,
+        }
+    }
+    Ok(batch)
+}
@@ -0,0 +1,159 @@
+use rayon::prelude::*;
+
+use crate::digest::digest_spans;
+use crate::enzyme::Enzyme;
+use crate::redundancy::SharedRegions;
+
+/// Deduplicated peptides of a protein collection with the proteins they occur in.
+///
+/// Peptides are sorted and stored as concatenated residues with an offset
+/// array, the proteins of the i-th peptide are stored in CSR format as
+/// protein_indices[protein_offsets[i]..protein_offsets[i + 1]].
+pub struct PeptideIndex {
+    residues: Vec<u8>,
+    peptide_offsets: Vec<u64>,
+    protein_offsets: Vec<u64>,
+    protein_indices: Vec<u32>,
+}
+
+impl PeptideIndex {
+    /// Digest all sequences in parallel and index the resulting peptides.
+    ///
+    /// Regions shared between proteins, e.g. between isoforms, are digested
+    /// only once and their peptides are attributed to all proteins sharing
+    /// them.
+    pub fn build(
+        seqs: &[String],
+        min_len: usize,
+        max_len: usize,
+        enzyme: &Enzyme,
+        digestion: &str,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+    ) -> Self {
+        let shared = SharedRegions::find(seqs);
+
+        // (protein, start, end) of every peptide occurrence outside of the
+        // regions shared with other proteins
+        let mut occurrences: Vec<(u32, u32, u32)> = seqs
+            .par_iter()
+            .enumerate()
+            .flat_map_iter(|(protein, seq)| {
+                let mut spans = Vec::new();
+                digest_spans(
+                    seq.as_bytes(),
+                    min_len,
+                    max_len,
+                    enzyme,
+                    digestion,
+                    miscleavages,
+                    methionine_cleavage,
+                    &mut |start, end| {
+                        if !shared.is_shared(protein as u32, start, end) {
+                            spans.push((protein as u32, start as u32, end as u32))
+                        }
+                    },
+                );
+                spans
+            })
+            .collect();
+
+        let peptide = |&(protein, start, end): &(u32, u32, u32)| {
+            &seqs[protein as usize].as_bytes()[start as usize..end as usize]
+        };
+        occurrences.par_sort_unstable_by(|a, b| {
+            peptide(a).cmp(peptide(b)).then(a.0.cmp(&b.0))
+        });
+
+        let mut index = PeptideIndex {
+            residues: Vec::new(),
+            peptide_offsets: vec![0],
+            protein_offsets: vec![0],
+            protein_indices: Vec::new(),
+        };
+        for (i, occurrence) in occurrences.iter().enumerate() {
+            if i == 0 || peptide(&occurrences[i - 1]) != peptide(occurrence) {
+                if i > 0 {
+                    index.close_peptide();
+                }
+                index.residues.extend_from_slice(peptide(occurrence));
+            }
+            let (protein, start, end) = *occurrence;
+            index.protein_indices.push(protein);
+            shared.for_each_sharing(protein, start as usize, end as usize, &mut |other| {
+                index.protein_indices.push(other)
+            });
+        }
+        if !occurrences.is_empty() {
+            index.close_peptide();
+        }
+        index
+    }
+
+    fn close_peptide(&mut self) {
+        // sorted and deduplicated proteins of the peptide
+        let first = self.protein_offsets[self.protein_offsets.len() - 1] as usize;
+        self.protein_indices[first..].sort_unstable();
+        let mut n = first;
+        for i in first..self.protein_indices.len() {
+            if n == first || self.protein_indices[i] != self.protein_indices[n - 1] {
+                self.protein_indices[n] = self.protein_indices[i];
+                n += 1;
+            }
+        }
+        self.protein_indices.truncate(n);
+        self.peptide_offsets.push(self.residues.len() as u64);
+        self.protein_offsets.push(self.protein_indices.len() as u64);
+    }
+
+    /// Number of distinct peptides
+    pub fn len(&self) -> usize {
+        self.peptide_offsets.len() - 1
+    }
+
+    /// Sequence of the i-th peptide
+    pub fn peptide(&self, i: usize) -> &str {
+        let start = self.peptide_offsets[i] as usize;
+        let end = self.peptide_offsets[i + 1] as usize;
+        // peptides are slices of the input strings at ASCII boundaries
+        std::str::from_utf8(&self.residues[start..end]).unwrap_or("")
+    }
+
+    /// Indices of the proteins the i-th peptide occurs in
+    pub fn proteins(&self, i: usize) -> &[u32] {
+        let start = self.protein_offsets[i] as usize;
+        let end = self.protein_offsets[i + 1] as usize;
+        &self.protein_indices[start..end]
+    }
+
+    /// Position of a peptide in the index, found by binary search
+    pub fn find(&self, peptide: &str) -> Option<usize> {
+        let (mut low, mut high) = (0, self.len());
+        while low < high {
+            let mid = low + (high - low) / 2;
+            match self.peptide(mid).cmp(peptide) {
+                std::cmp::Ordering::Less => low = mid + 1,
+                std::cmp::Ordering::Greater => high = mid,
+                std::cmp::Ordering::Equal => return Some(mid),
+            }
+        }
+        None
+    }
+
+    /// Concatenated residues of all peptides
+    pub fn residues(&self) -> &[u8] {
+        &self.residues
+    }
+
+    pub fn peptide_offsets(&self) -> &[u64] {
+        &self.peptide_offsets
+    }
+
+    pub fn protein_offsets(&self) -> &[u64] {
+        &self.protein_offsets
+    }
+
+    pub fn protein_indices(&self) -> &[u32] {
+        &self.protein_indices
+    }
+}
@@ -1,141 +1,307 @@
+use std::collections::HashMap;
+use std::io::BufRead;
+use std::sync::Mutex;
+
+use numpy::{AllowTypeChange, IntoPyArray, PyArray1, PyArrayLike1};
+use pyo3::exceptions::{PyIndexError, PyKeyError, PyValueError};
 use pyo3::prelude::*;
-use pyo3::types::PyList;
+use pyo3::types::{PyList, PyTuple};
+use rayon::prelude::*;
+
+pub mod columns;
+pub mod database;
+pub mod decoy;
+pub mod digest;
+pub mod enzyme;
+pub mod fasta;
+pub mod index;
+pub mod mass;
+pub mod mass_index;
+pub mod modification;
+pub mod redundancy;
+
+use columns::PeptideColumns;
+use decoy::{digest_with_decoys, DecoyMethod};
+use digest::{
+    count_spans, digest, digest_metadata, digest_offsets, digest_offsets_with_masses, digest_unique,
+    digest_with_masses, SpanIterator,
+};
+use enzyme::Enzyme;
+use fasta::FastaReader;
+use mass::{MassTable, PrefixMasses};
+use mass_index::{MassIndex, Tolerance};
+use modification::{ModifiedForms, VariableMods};
 
-/// Check if a cleavage site is enzymatic
-fn is_enzymatic(aa1: char, aa2: char, pre: &[char], not_post: &[char], post: &[char]) -> bool {
-    (pre.contains(&aa1) && !not_post.contains(&aa2)) || post.contains(&aa2)
+/// Convert amino acid strings into a list of chars, cleavage rules only
+/// support ASCII residues
+fn residue_chars(residues: Vec<String>) -> PyResult<Vec<char>> {
+    let chars: Vec<char> = residues.concat().chars().collect();
+    match chars.iter().find(|aa| !aa.is_ascii()) {
+        Some(aa) => Err(PyValueError::new_err(format!(
+            "Cleavage rules contain the non-ASCII residue {:?}",
+            aa
+        ))),
+        None => Ok(chars),
+    }
 }
 
-/// Non-specific digestion
-fn non_specific_digest(seq: &str, min_len: usize, max_len: usize) -> Vec<String> {
-    let mut peptides = Vec::new();
-    let seq_len = seq.len();
+/// Convert a Python list of amino acids into a list of chars
+fn extract_residues(residues: &Bound<'_, PyList>) -> PyResult<Vec<char>> {
+    residue_chars(residues.extract()?)
+}
 
-    for i in 0..=seq_len {
-        for j in (i + min_len)..=(usize::min(seq_len, i + max_len)) {
-            if j <= seq_len {
-                peptides.push(seq[i..j].to_string());
-            }
+/// Python-exposed enzyme, cleavage rules compiled once into a lookup table.
+///
+/// The enzyme cleaves between aa1 and aa2 if aa1 is in `pre` and aa2 is not
+/// in `not_post`, or if aa2 is in `post`.
+#[pyclass(name = "Enzyme", frozen)]
+struct PyEnzyme {
+    enzyme: Enzyme,
+}
+
+#[pymethods]
+impl PyEnzyme {
+    #[new]
+    #[pyo3(signature = (pre=Vec::new(), not_post=Vec::new(), post=Vec::new()))]
+    fn new(pre: Vec<String>, not_post: Vec<String>, post: Vec<String>) -> PyResult<Self> {
+        Ok(PyEnzyme {
+            enzyme: Enzyme::new(
+                &residue_chars(pre)?,
+                &residue_chars(not_post)?,
+                &residue_chars(post)?,
+            ),
+        })
+    }
+
+    /// Named enzyme, one of the names returned by Enzyme.names()
+    #[staticmethod]
+    fn from_name(name: &str) -> PyResult<Self> {
+        match Enzyme::from_name(name) {
+            Some(enzyme) => Ok(PyEnzyme { enzyme }),
+            None => Err(PyValueError::new_err(format!("Unknown enzyme: {}", name))),
         }
     }
-    peptides
+
+    #[staticmethod]
+    fn names() -> Vec<&'static str> {
+        enzyme::PRESETS.iter().map(|(name, ..)| *name).collect()
+    }
+
+    /// Enzyme cleaving wherever any of the given enzymes cleaves, e.g. for
+    /// multi-enzyme or sequential digestion. The cleavage sites of all rules
+    /// are found in a single pass over the sequence.
+    #[staticmethod]
+    fn union(enzymes: Vec<PyRef<'_, PyEnzyme>>) -> PyResult<Self> {
+        let enzymes: Vec<Enzyme> = enzymes.iter().map(|e| e.enzyme.clone()).collect();
+        match Enzyme::union(&enzymes) {
+            Some(enzyme) => Ok(PyEnzyme { enzyme }),
+            None => Err(PyValueError::new_err(format!(
+                "Enzymes can combine at most {} cleavage rules",
+                enzyme::MAX_RULES
+            ))),
+        }
+    }
+
+    /// The individual cleavage rules of the enzyme, each as an Enzyme
+    #[getter]
+    fn rules(&self) -> Vec<PyEnzyme> {
+        self.enzyme
+            .rules()
+            .into_iter()
+            .map(|enzyme| PyEnzyme { enzyme })
+            .collect()
+    }
+
+    #[getter]
+    fn pre(&self) -> Vec<String> {
+        self.enzyme.pre().iter().map(char::to_string).collect()
+    }
+
+    #[getter]
+    fn not_post(&self) -> Vec<String> {
+        self.enzyme.not_post().iter().map(char::to_string).collect()
+    }
+
+    #[getter]
+    fn post(&self) -> Vec<String> {
+        self.enzyme.post().iter().map(char::to_string).collect()
+    }
+
+    fn __repr__(&self) -> String {
+        let rules = self.rules();
+        if rules.len() != 1 {
+            let rules: Vec<String> = rules.iter().map(PyEnzyme::__repr__).collect();
+            return format!("Enzyme.union([{}])", rules.join(", "));
+        }
+        format!(
+            "Enzyme(pre={:?}, not_post={:?}, post={:?})",
+            self.pre(),
+            self.not_post(),
+            self.post()
+        )
+    }
+}
+
+/// Check that a sequence is ASCII, such that residues can be indexed as bytes
+fn check_ascii(seq: &str) -> PyResult<()> {
+    if seq.is_ascii() {
+        Ok(())
+    } else {
+        Err(PyValueError::new_err(
+            "Sequence contains non-ASCII characters",
+        ))
+    }
+}
+
+/// Use the compiled enzyme if given, otherwise compile the pre, not_post and
+/// post rules
+fn resolve_enzyme(
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+) -> PyResult<Enzyme> {
+    match enzyme {
+        Some(enzyme) => Ok(enzyme.enzyme.clone()),
+        None => Ok(Enzyme::new(
+            &extract_residues(pre)?,
+            &extract_residues(not_post)?,
+            &extract_residues(post)?,
+        )),
+    }
+}
+
+/// Residue mass table with fixed modifications given as {residue: mass shift}
+fn mass_table(fixed_mods: Option<HashMap<char, f64>>) -> MassTable {
+    let fixed_mods: Vec<(char, f64)> = fixed_mods.unwrap_or_default().into_iter().collect();
+    MassTable::new(&fixed_mods)
 }
 
-/// Semi-specific digestion
-fn semi_specific_digest(
+/// Python-exposed function, the GIL is released while digesting such that
+/// sequences can be digested concurrently from several Python threads
+#[pyfunction]
+#[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, enzyme=None, unique=false))]
+fn get_digested_peptides(
+    py: Python<'_>,
     seq: &str,
     min_len: usize,
     max_len: usize,
-    pre: &[char],
-    not_post: &[char],
-    post: &[char],
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
     miscleavages: usize,
     methionine_cleavage: bool,
-) -> Vec<String> {
-    let seq_chars: Vec<char> = seq.chars().collect();
-    let seq_len = seq_chars.len();
-    let mut peptides = Vec::new();
-    let mut starts = vec![0];
-    let methionine_cleavage = methionine_cleavage && seq_chars[0] == 'M';
-
-    for i in 0..=seq_len-1 {
-        let is_cleavage_site = i == seq_len-1
-            || is_enzymatic(
-                seq_chars[usize::min(seq_len - 1, i)],
-                seq_chars[usize::min(seq_len - 1, i + 1)],
-                pre,
-                not_post,
-                post,
-            )
-            || (i == 0 && methionine_cleavage);
-
-        if is_cleavage_site {
-            let start = starts[0];
-            for j in start..std::cmp::min(i, seq_len - 1) {
-                let pep_len = std::cmp::min(i, seq_len - 1) - j + 1;
-                if (min_len..=max_len).contains(&pep_len) {
-                    // assuming you're collecting peptides in a Vec
-                    peptides.push(seq[j..=i].to_string()); // inclusive range like Python's [j:i+1]
-                }
-            }
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+    unique: bool,
+) -> PyResult<Vec<String>> {
+    check_ascii(seq)?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
 
-            starts.push(i + 1);
+    let digest_fn = if unique { digest_unique } else { digest };
+    Ok(py.allow_threads(|| {
+        digest_fn(
+            seq,
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+        )
+    }))
+}
 
-            let methionine_cleaved = if starts[0] == 0 && methionine_cleavage {
-                1
-            } else {
-                0
-            };
+/// Python-exposed function returning the start and (exclusive) end positions
+/// of the peptides as two uint32 NumPy arrays instead of peptide strings
+#[pyfunction]
+#[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, enzyme=None))]
+fn get_digested_offsets<'py>(
+    py: Python<'py>,
+    seq: &str,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<(Bound<'py, PyArray1<u32>>, Bound<'py, PyArray1<u32>>)> {
+    check_ascii(seq)?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
 
-            if starts.len() > miscleavages + 1 + methionine_cleaved || i == seq_len {
-                starts.drain(0..1 + methionine_cleaved); // removes from front
-            }
-        } else {
-            for &start in &starts {
-                let pep_len = i - start + 1;
-                if (min_len..=max_len).contains(&pep_len) && !starts.contains(&(i + 1)) {
-                    peptides.push(seq[start..=i].to_string());
-                }
-            }
-        }
-    }
+    let (starts, ends) = py.allow_threads(|| {
+        digest_offsets(
+            seq.as_bytes(),
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+        )
+    });
 
-    peptides
+    Ok((starts.into_pyarray(py), ends.into_pyarray(py)))
 }
 
-/// Full digestion
-fn full_digest(
+/// Python-exposed function returning the columnar metadata of the peptides
+/// as NumPy arrays: start and end positions (uint32), missed cleavages
+/// (uint32), preceding and following residues (uint8 ASCII codes) and the
+/// protein N- and C-terminus flags (bool)
+#[pyfunction]
+#[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, enzyme=None))]
+fn get_digested_metadata<'py>(
+    py: Python<'py>,
     seq: &str,
     min_len: usize,
     max_len: usize,
-    pre: &[char],
-    not_post: &[char],
-    post: &[char],
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
     miscleavages: usize,
     methionine_cleavage: bool,
-) -> Vec<String> {
-    let seq_chars: Vec<char> = seq.chars().collect();
-    let seq_len = seq_chars.len();
-    let mut peptides = Vec::new();
-    let mut starts = vec![0];
-    let methionine_cleavage = methionine_cleavage && seq_chars[0] == 'M';
-
-    let check_pre = !pre.is_empty();
-    let check_post = !post.is_empty();
-
-    let mut cleavage_sites: Vec<usize> = if methionine_cleavage { vec![0] } else { vec![] };
-
-    for i in 0..=seq_len-1 {
-        if (check_pre
-            && pre.contains(&seq_chars[i])
-            && !not_post.contains(&seq_chars[usize::min(seq_len - 1, i + 1)]))
-            || (check_post && post.contains(&seq_chars[usize::min(seq_len - 1, i + 1)]))
-        {
-            cleavage_sites.push(i);
-        }
-    }
-    cleavage_sites.push(seq_len - 1);
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<Bound<'py, PyTuple>> {
+    check_ascii(seq)?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
 
-    for &i in &cleavage_sites {
-        for &start in &starts {
-            let pep_len = 1 + i - start;
-            if (min_len..=max_len).contains(&pep_len) {
-                peptides.push(seq[start..=i].to_string());
-            }
-        }
-        starts.push(i + 1);
-        let methionine_cleaved = usize::from(starts[0] == 0 && methionine_cleavage);
-        if starts.len() > miscleavages + 1 + methionine_cleaved {
-            starts = starts.split_off(1 + methionine_cleaved);
-        }
-    }
+    let metadata = py.allow_threads(|| {
+        digest_metadata(
+            seq.as_bytes(),
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+        )
+    });
 
-    peptides
+    PyTuple::new(
+        py,
+        [
+            metadata.starts.into_pyarray(py).into_any(),
+            metadata.ends.into_pyarray(py).into_any(),
+            metadata.missed_cleavages.into_pyarray(py).into_any(),
+            metadata.preceding.into_pyarray(py).into_any(),
+            metadata.following.into_pyarray(py).into_any(),
+            metadata.protein_n_term.into_pyarray(py).into_any(),
+            metadata.protein_c_term.into_pyarray(py).into_any(),
+        ],
+    )
 }
 
-/// Python-exposed function
+/// Python-exposed function returning the peptides and their monoisotopic
+/// masses as a float64 NumPy array, peptides outside of [min_mass, max_mass]
+/// are filtered out before their strings are created
 #[pyfunction]
-fn get_digested_peptides(
+#[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, fixed_mods=None, min_mass=None, max_mass=None, enzyme=None))]
+fn get_digested_peptides_with_masses<'py>(
+    py: Python<'py>,
     seq: &str,
     min_len: usize,
     max_len: usize,
@@ -145,52 +311,884 @@ fn get_digested_peptides(
     digestion: &str,
     miscleavages: usize,
     methionine_cleavage: bool,
-) -> PyResult<Vec<String>> {
-    let pre: Vec<char> = pre
-        .extract::<Vec<String>>()?
-        .into_iter()
-        .flat_map(|s| s.chars().collect::<Vec<char>>())
-        .collect();
-    let not_post: Vec<char> = not_post
-        .extract::<Vec<String>>()?
-        .into_iter()
-        .flat_map(|s| s.chars().collect::<Vec<char>>())
-        .collect();
-    let post: Vec<char> = post
-        .extract::<Vec<String>>()?
+    fixed_mods: Option<HashMap<char, f64>>,
+    min_mass: Option<f64>,
+    max_mass: Option<f64>,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<(Vec<String>, Bound<'py, PyArray1<f64>>)> {
+    check_ascii(seq)?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+    let mass_table = mass_table(fixed_mods);
+    let (peptides, masses) = py.allow_threads(|| {
+        digest_with_masses(
+            seq,
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+            &mass_table,
+            min_mass,
+            max_mass,
+        )
+    });
+
+    Ok((peptides, masses.into_pyarray(py)))
+}
+
+/// Python-exposed function returning the start and (exclusive) end positions
+/// and the monoisotopic masses of the peptides as NumPy arrays
+#[pyfunction]
+#[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, fixed_mods=None, min_mass=None, max_mass=None, enzyme=None))]
+fn get_digested_offsets_with_masses<'py>(
+    py: Python<'py>,
+    seq: &str,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    fixed_mods: Option<HashMap<char, f64>>,
+    min_mass: Option<f64>,
+    max_mass: Option<f64>,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<(
+    Bound<'py, PyArray1<u32>>,
+    Bound<'py, PyArray1<u32>>,
+    Bound<'py, PyArray1<f64>>,
+)> {
+    check_ascii(seq)?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+    let mass_table = mass_table(fixed_mods);
+    let (starts, ends, masses) = py.allow_threads(|| {
+        digest_offsets_with_masses(
+            seq.as_bytes(),
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+            &mass_table,
+            min_mass,
+            max_mass,
+        )
+    });
+
+    Ok((
+        starts.into_pyarray(py),
+        ends.into_pyarray(py),
+        masses.into_pyarray(py),
+    ))
+}
+
+/// Python-exposed function to digest a list of sequences in parallel.
+///
+/// The GIL is released while digesting, the peptides of each sequence are
+/// returned in the order of the input sequences.
+#[pyfunction]
+#[pyo3(signature = (seqs, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, enzyme=None))]
+fn digest_many(
+    py: Python<'_>,
+    seqs: Vec<String>,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<Vec<Vec<String>>> {
+    seqs.iter().try_for_each(|seq| check_ascii(seq))?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+    let peptides = py.allow_threads(|| {
+        seqs.par_iter()
+            .map(|seq| {
+                digest(
+                    seq,
+                    min_len,
+                    max_len,
+                    &enzyme,
+                    digestion,
+                    miscleavages,
+                    methionine_cleavage,
+                )
+            })
+            .collect()
+    });
+
+    Ok(peptides)
+}
+
+/// Python-exposed function to digest a list of sequences in parallel into
+/// peptide columns, for zero-copy conversion to Apache Arrow.
+///
+/// Returns the protein indices, start and (exclusive) end positions of the
+/// peptides as uint32 arrays together with the int64 offsets into the uint8
+/// array of concatenated peptide residues, the layout of an Arrow large
+/// string array.
+#[pyfunction]
+#[pyo3(signature = (seqs, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, enzyme=None))]
+fn digest_many_columnar<'py>(
+    py: Python<'py>,
+    seqs: Vec<String>,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<Bound<'py, PyTuple>> {
+    seqs.iter().try_for_each(|seq| check_ascii(seq))?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+    let columns = py.allow_threads(|| {
+        PeptideColumns::build(
+            &seqs,
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+        )
+    });
+
+    PyTuple::new(
+        py,
+        [
+            columns.protein_indices.into_pyarray(py).into_any(),
+            columns.starts.into_pyarray(py).into_any(),
+            columns.ends.into_pyarray(py).into_any(),
+            columns.offsets.into_pyarray(py).into_any(),
+            columns.residues.into_pyarray(py).into_any(),
+        ],
+    )
+}
+
+/// Python-exposed function returning the number of peptides of a sequence
+/// and their total number of residues, computed without digesting it
+#[pyfunction]
+#[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, enzyme=None))]
+fn count_peptides(
+    py: Python<'_>,
+    seq: &str,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<(u64, u64)> {
+    check_ascii(seq)?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+    Ok(py.allow_threads(|| {
+        count_spans(
+            seq.as_bytes(),
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+        )
+    }))
+}
+
+/// Python-exposed function counting the peptides and residues of many
+/// sequences in parallel, returned as two uint64 arrays with one entry per
+/// sequence
+#[pyfunction]
+#[pyo3(signature = (seqs, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, enzyme=None))]
+fn count_peptides_many<'py>(
+    py: Python<'py>,
+    seqs: Vec<String>,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<(Bound<'py, PyArray1<u64>>, Bound<'py, PyArray1<u64>>)> {
+    seqs.iter().try_for_each(|seq| check_ascii(seq))?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+    let (n_peptides, n_residues): (Vec<u64>, Vec<u64>) = py.allow_threads(|| {
+        seqs.par_iter()
+            .map(|seq| {
+                count_spans(
+                    seq.as_bytes(),
+                    min_len,
+                    max_len,
+                    &enzyme,
+                    digestion,
+                    miscleavages,
+                    methionine_cleavage,
+                )
+            })
+            .unzip()
+    });
+    Ok((n_peptides.into_pyarray(py), n_residues.into_pyarray(py)))
+}
+
+/// Parse the name of a decoy method
+fn decoy_method(name: &str) -> PyResult<DecoyMethod> {
+    DecoyMethod::from_name(name)
+        .ok_or_else(|| PyValueError::new_err(format!("Unknown decoy method: {}", name)))
+}
+
+/// Python-exposed function returning the target and decoy peptides of a
+/// sequence, together with a boolean NumPy array flagging the decoys
+#[pyfunction]
+#[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, decoy="pseudo-reverse", enzyme=None))]
+fn get_digested_peptides_with_decoys<'py>(
+    py: Python<'py>,
+    seq: &str,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    decoy: &str,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<(Vec<String>, Bound<'py, PyArray1<bool>>)> {
+    check_ascii(seq)?;
+    let method = decoy_method(decoy)?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+    let (peptides, is_decoy) = py.allow_threads(|| {
+        digest_with_decoys(
+            seq,
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+            method,
+        )
+    });
+
+    Ok((peptides, is_decoy.into_pyarray(py)))
+}
+
+/// Python-exposed function to digest a list of sequences together with their
+/// decoys in parallel, like digest_many.
+///
+/// Returns a (peptides, is_decoy) tuple per sequence in the order of the
+/// input sequences.
+#[pyfunction]
+#[pyo3(signature = (seqs, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, decoy="pseudo-reverse", enzyme=None))]
+fn digest_many_with_decoys<'py>(
+    py: Python<'py>,
+    seqs: Vec<String>,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    decoy: &str,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<Vec<(Vec<String>, Bound<'py, PyArray1<bool>>)>> {
+    seqs.iter().try_for_each(|seq| check_ascii(seq))?;
+    let method = decoy_method(decoy)?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+    let digested: Vec<(Vec<String>, Vec<bool>)> = py.allow_threads(|| {
+        seqs.par_iter()
+            .map(|seq| {
+                digest_with_decoys(
+                    seq,
+                    min_len,
+                    max_len,
+                    &enzyme,
+                    digestion,
+                    miscleavages,
+                    methionine_cleavage,
+                    method,
+                )
+            })
+            .collect()
+    });
+
+    Ok(digested
         .into_iter()
-        .flat_map(|s| s.chars().collect::<Vec<char>>())
-        .collect();
+        .map(|(peptides, is_decoy)| (peptides, is_decoy.into_pyarray(py)))
+        .collect())
+}
+
+/// Python-exposed lazy iterator over the peptides of a single sequence.
+///
+/// Peptides are created one at a time, or in lists of `chunk_size` peptides,
+/// in the same order as returned by get_digested_peptides, such that memory
+/// stays bounded for long proteins and consumers can stop early.
+#[pyclass]
+struct PeptideIterator {
+    seq: String,
+    spans: SpanIterator,
+    chunk_size: Option<usize>,
+}
 
-    let peptides = match digestion {
-        "none" => non_specific_digest(seq, min_len, max_len),
-        "semi" => semi_specific_digest(
+#[pymethods]
+impl PeptideIterator {
+    #[new]
+    #[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, chunk_size=None, enzyme=None))]
+    fn new(
+        seq: String,
+        min_len: usize,
+        max_len: usize,
+        pre: &Bound<'_, PyList>,
+        not_post: &Bound<'_, PyList>,
+        post: &Bound<'_, PyList>,
+        digestion: &str,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+        chunk_size: Option<usize>,
+        enzyme: Option<PyRef<'_, PyEnzyme>>,
+    ) -> PyResult<Self> {
+        check_ascii(&seq)?;
+        let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+        let spans = SpanIterator::new(
+            seq.as_bytes(),
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+        );
+        Ok(PeptideIterator {
             seq,
+            spans,
+            chunk_size: chunk_size.map(|chunk_size| usize::max(chunk_size, 1)),
+        })
+    }
+
+    fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
+    }
+
+    fn __next__<'py>(
+        mut slf: PyRefMut<'py, Self>,
+        py: Python<'py>,
+    ) -> PyResult<Option<Bound<'py, PyAny>>> {
+        let this = &mut *slf;
+        match this.chunk_size {
+            None => match this.spans.next() {
+                Some((start, end)) => Ok(Some(
+                    this.seq[start..end].into_pyobject(py)?.into_any(),
+                )),
+                None => Ok(None),
+            },
+            Some(chunk_size) => {
+                let seq = &this.seq;
+                let peptides: Vec<&str> = this
+                    .spans
+                    .by_ref()
+                    .take(chunk_size)
+                    .map(|(start, end)| &seq[start..end])
+                    .collect();
+                if peptides.is_empty() {
+                    Ok(None)
+                } else {
+                    Ok(Some(PyList::new(py, peptides)?.into_any()))
+                }
+            }
+        }
+    }
+}
+
+/// Python-exposed lazy iterator over the variably modified forms of the
+/// peptides of a single sequence.
+///
+/// Digestion and modification expansion are fused, peptides are never
+/// created as intermediate strings. Yields (modified peptide, mass) tuples
+/// with the modified peptides in ProForma notation, or (modified peptides,
+/// masses) tuples of `chunk_size` forms with the masses as a float64 array.
+/// The forms of each peptide start with the unmodified peptide, followed by
+/// the forms with increasing number of modifications, up to `max_mods`.
+#[pyclass]
+struct ModifiedPeptideIterator {
+    seq: String,
+    spans: SpanIterator,
+    masses: PrefixMasses,
+    mods: VariableMods,
+    forms: Option<(usize, usize, ModifiedForms)>,
+    chunk_size: Option<usize>,
+}
+
+impl ModifiedPeptideIterator {
+    fn next_form(&mut self) -> Option<(String, f64)> {
+        loop {
+            if let Some((start, end, forms)) = &mut self.forms {
+                if let Some(form) = forms.next_form() {
+                    let peptide = &self.seq.as_bytes()[*start..*end];
+                    let mass = self.masses.peptide_mass(*start, *end);
+                    return Some((
+                        self.mods.encode(peptide, form),
+                        mass + self.mods.mass_shift(form),
+                    ));
+                }
+            }
+            let (start, end) = self.spans.next()?;
+            let forms = self.mods.forms(&self.seq.as_bytes()[start..end]);
+            self.forms = Some((start, end, forms));
+        }
+    }
+}
+
+#[pymethods]
+impl ModifiedPeptideIterator {
+    #[new]
+    #[pyo3(signature = (seq, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, variable_mods, max_mods=2, fixed_mods=None, chunk_size=None, enzyme=None))]
+    fn new(
+        seq: String,
+        min_len: usize,
+        max_len: usize,
+        pre: &Bound<'_, PyList>,
+        not_post: &Bound<'_, PyList>,
+        post: &Bound<'_, PyList>,
+        digestion: &str,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+        variable_mods: Vec<(String, f64)>,
+        max_mods: usize,
+        fixed_mods: Option<HashMap<char, f64>>,
+        chunk_size: Option<usize>,
+        enzyme: Option<PyRef<'_, PyEnzyme>>,
+    ) -> PyResult<Self> {
+        check_ascii(&seq)?;
+        let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+        let spans = SpanIterator::new(
+            seq.as_bytes(),
             min_len,
             max_len,
-            &pre,
-            &not_post,
-            &post,
+            &enzyme,
+            digestion,
             miscleavages,
             methionine_cleavage,
-        ),
-        _ => full_digest(
+        );
+        let masses = mass_table(fixed_mods).prefix_masses(seq.as_bytes());
+        Ok(ModifiedPeptideIterator {
             seq,
+            spans,
+            masses,
+            mods: VariableMods::new(&variable_mods, max_mods),
+            forms: None,
+            chunk_size: chunk_size.map(|chunk_size| usize::max(chunk_size, 1)),
+        })
+    }
+
+    fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
+    }
+
+    fn __next__<'py>(
+        mut slf: PyRefMut<'py, Self>,
+        py: Python<'py>,
+    ) -> PyResult<Option<Bound<'py, PyAny>>> {
+        let this = &mut *slf;
+        match this.chunk_size {
+            None => match this.next_form() {
+                Some(form) => Ok(Some(form.into_pyobject(py)?.into_any())),
+                None => Ok(None),
+            },
+            Some(chunk_size) => {
+                let (peptides, masses): (Vec<String>, Vec<f64>) =
+                    std::iter::from_fn(|| this.next_form())
+                        .take(chunk_size)
+                        .unzip();
+                if peptides.is_empty() {
+                    Ok(None)
+                } else {
+                    Ok(Some(
+                        (peptides, masses.into_pyarray(py))
+                            .into_pyobject(py)?
+                            .into_any(),
+                    ))
+                }
+            }
+        }
+    }
+}
+
+/// Python-exposed iterator over the digested proteins of a FASTA file.
+///
+/// Records are read and digested in parallel in batches of `batch_size`
+/// proteins, such that only a single batch is kept in memory. Yields
+/// (protein_id, peptides) tuples in the order of the FASTA file.
+#[pyclass]
+struct FastaDigestIterator {
+    reader: Mutex<FastaReader<Box<dyn BufRead + Send>>>,
+    digested: std::vec::IntoIter<(String, Vec<String>)>,
+    batch_size: usize,
+    min_len: usize,
+    max_len: usize,
+    enzyme: Enzyme,
+    digestion: String,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+}
+
+impl FastaDigestIterator {
+    fn digest_next_batch(&mut self) -> PyResult<()> {
+        let reader = self.reader.get_mut().unwrap_or_else(|err| err.into_inner());
+        let batch = fasta::read_batch(reader, self.batch_size)?;
+        if let Some((protein_id, _)) = batch.iter().find(|(_, seq)| !seq.is_ascii()) {
+            return Err(PyValueError::new_err(format!(
+                "Sequence of {} contains non-ASCII characters",
+                protein_id
+            )));
+        }
+        self.digested = batch
+            .into_par_iter()
+            .map(|(protein_id, seq)| {
+                let peptides = digest(
+                    &seq,
+                    self.min_len,
+                    self.max_len,
+                    &self.enzyme,
+                    &self.digestion,
+                    self.miscleavages,
+                    self.methionine_cleavage,
+                );
+                (protein_id, peptides)
+            })
+            .collect::<Vec<_>>()
+            .into_iter();
+        Ok(())
+    }
+}
+
+#[pymethods]
+impl FastaDigestIterator {
+    #[new]
+    #[pyo3(signature = (fasta_file, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, batch_size, enzyme=None))]
+    fn new(
+        fasta_file: std::path::PathBuf,
+        min_len: usize,
+        max_len: usize,
+        pre: &Bound<'_, PyList>,
+        not_post: &Bound<'_, PyList>,
+        post: &Bound<'_, PyList>,
+        digestion: &str,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+        batch_size: usize,
+        enzyme: Option<PyRef<'_, PyEnzyme>>,
+    ) -> PyResult<Self> {
+        Ok(FastaDigestIterator {
+            reader: Mutex::new(fasta::open_fasta(fasta_file)?),
+            digested: Vec::new().into_iter(),
+            batch_size: usize::max(batch_size, 1),
             min_len,
             max_len,
-            &pre,
-            &not_post,
-            &post,
+            enzyme: resolve_enzyme(enzyme, pre, not_post, post)?,
+            digestion: digestion.to_string(),
             miscleavages,
             methionine_cleavage,
-        ),
-    };
+        })
+    }
 
-    Ok(peptides)
+    fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
+    }
+
+    fn __next__(mut slf: PyRefMut<'_, Self>) -> PyResult<Option<(String, Vec<String>)>> {
+        if let Some(protein) = slf.digested.next() {
+            return Ok(Some(protein));
+        }
+        let py = slf.py();
+        let this = &mut *slf;
+        py.allow_threads(|| this.digest_next_batch())?;
+        Ok(slf.digested.next())
+    }
+}
+
+/// Python-exposed deduplicated peptide index with peptide to protein lookup.
+///
+/// Peptides are sorted and deduplicated, the indices of the proteins a
+/// peptide occurs in are stored in CSR format: the proteins of the i-th
+/// peptide are protein_indices[protein_offsets[i]:protein_offsets[i + 1]].
+#[pyclass(name = "PeptideIndex", frozen)]
+struct PyPeptideIndex {
+    index: index::PeptideIndex,
+}
+
+#[pymethods]
+impl PyPeptideIndex {
+    #[new]
+    #[pyo3(signature = (seqs, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, enzyme=None))]
+    fn new(
+        py: Python<'_>,
+        seqs: Vec<String>,
+        min_len: usize,
+        max_len: usize,
+        pre: &Bound<'_, PyList>,
+        not_post: &Bound<'_, PyList>,
+        post: &Bound<'_, PyList>,
+        digestion: &str,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+        enzyme: Option<PyRef<'_, PyEnzyme>>,
+    ) -> PyResult<Self> {
+        seqs.iter().try_for_each(|seq| check_ascii(seq))?;
+        let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+
+        let index = py.allow_threads(|| {
+            index::PeptideIndex::build(
+                &seqs,
+                min_len,
+                max_len,
+                &enzyme,
+                digestion,
+                miscleavages,
+                methionine_cleavage,
+            )
+        });
+        Ok(PyPeptideIndex { index })
+    }
+
+    fn __len__(&self) -> usize {
+        self.index.len()
+    }
+
+    fn __contains__(&self, peptide: &str) -> bool {
+        self.index.find(peptide).is_some()
+    }
+
+    /// Indices of the proteins containing the peptide
+    fn __getitem__(&self, peptide: &str) -> PyResult<Vec<u32>> {
+        match self.index.find(peptide) {
+            Some(i) => Ok(self.index.proteins(i).to_vec()),
+            None => Err(PyKeyError::new_err(peptide.to_string())),
+        }
+    }
+
+    /// Position of the peptide in the index, None if it is not in the index
+    fn find(&self, peptide: &str) -> Option<usize> {
+        self.index.find(peptide)
+    }
+
+    /// Sequence of the i-th peptide
+    fn peptide(&self, i: usize) -> PyResult<&str> {
+        if i >= self.index.len() {
+            return Err(PyIndexError::new_err("peptide index out of range"));
+        }
+        Ok(self.index.peptide(i))
+    }
+
+    /// All peptides in sorted order
+    fn peptides(&self) -> Vec<&str> {
+        (0..self.index.len()).map(|i| self.index.peptide(i)).collect()
+    }
+
+    #[getter]
+    fn protein_offsets<'py>(&self, py: Python<'py>) -> Bound<'py, PyArray1<u64>> {
+        PyArray1::from_slice(py, self.index.protein_offsets())
+    }
+
+    #[getter]
+    fn protein_indices<'py>(&self, py: Python<'py>) -> Bound<'py, PyArray1<u32>> {
+        PyArray1::from_slice(py, self.index.protein_indices())
+    }
+}
+
+/// Python-exposed index of the deduplicated peptides sorted by mass for
+/// batched precursor mass range queries.
+///
+/// Peptide indices refer to the peptides in sequence order, as in
+/// PeptideIndex, such that peptide(i) and proteins(i) can be looked up.
+#[pyclass(name = "MassIndex", frozen)]
+struct PyMassIndex {
+    index: MassIndex,
+}
+
+#[pymethods]
+impl PyMassIndex {
+    #[new]
+    #[pyo3(signature = (seqs, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, fixed_mods=None, enzyme=None))]
+    fn new(
+        py: Python<'_>,
+        seqs: Vec<String>,
+        min_len: usize,
+        max_len: usize,
+        pre: &Bound<'_, PyList>,
+        not_post: &Bound<'_, PyList>,
+        post: &Bound<'_, PyList>,
+        digestion: &str,
+        miscleavages: usize,
+        methionine_cleavage: bool,
+        fixed_mods: Option<HashMap<char, f64>>,
+        enzyme: Option<PyRef<'_, PyEnzyme>>,
+    ) -> PyResult<Self> {
+        seqs.iter().try_for_each(|seq| check_ascii(seq))?;
+        let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+        let mass_table = mass_table(fixed_mods);
+
+        let index = py.allow_threads(|| {
+            let index = index::PeptideIndex::build(
+                &seqs,
+                min_len,
+                max_len,
+                &enzyme,
+                digestion,
+                miscleavages,
+                methionine_cleavage,
+            );
+            MassIndex::new(index, &mass_table)
+        });
+        Ok(PyMassIndex { index })
+    }
+
+    fn __len__(&self) -> usize {
+        self.index.index().len()
+    }
+
+    /// Matching peptide indices of each precursor mass in CSR format, the
+    /// matches of the i-th precursor are indices[offsets[i]:offsets[i + 1]].
+    /// precursor_masses can be any sequence of numbers or a NumPy array, also
+    /// a non-contiguous one. The masses are copied before the GIL is released,
+    /// such that other threads can modify the array during the query.
+    #[pyo3(signature = (precursor_masses, tolerance, unit="ppm"))]
+    fn query<'py>(
+        &self,
+        py: Python<'py>,
+        precursor_masses: PyArrayLike1<'py, f64, AllowTypeChange>,
+        tolerance: f64,
+        unit: &str,
+    ) -> PyResult<(Bound<'py, PyArray1<u64>>, Bound<'py, PyArray1<u32>>)> {
+        let tolerance = match unit.to_lowercase().as_str() {
+            "ppm" => Tolerance::Ppm(tolerance),
+            "da" => Tolerance::Da(tolerance),
+            _ => {
+                return Err(PyValueError::new_err(format!(
+                    "Unknown tolerance unit: {}",
+                    unit
+                )))
+            }
+        };
+        let precursor_masses = precursor_masses.as_array().to_vec();
+        let (offsets, indices) =
+            py.allow_threads(|| self.index.query(&precursor_masses, tolerance));
+        Ok((offsets.into_pyarray(py), indices.into_pyarray(py)))
+    }
+
+    /// Peptide indices with a mass in [low, high], in mass order
+    fn range<'py>(&self, py: Python<'py>, low: f64, high: f64) -> Bound<'py, PyArray1<u32>> {
+        PyArray1::from_slice(py, self.index.range(low, high))
+    }
+
+    fn peptide(&self, i: usize) -> PyResult<&str> {
+        if i >= self.index.index().len() {
+            return Err(PyIndexError::new_err("peptide index out of range"));
+        }
+        Ok(self.index.index().peptide(i))
+    }
+
+    fn proteins(&self, i: usize) -> PyResult<Vec<u32>> {
+        self.peptide(i)?;
+        Ok(self.index.index().proteins(i).to_vec())
+    }
+
+    /// Masses of all peptides by peptide index, NaN for unknown residues
+    #[getter]
+    fn masses<'py>(&self, py: Python<'py>) -> Bound<'py, PyArray1<f64>> {
+        PyArray1::from_slice(py, self.index.masses())
+    }
+}
+
+/// Python-exposed function digesting the sequences into a deduplicated
+/// binary peptide database file, see database::write_database for the format
+#[pyfunction]
+#[pyo3(signature = (path, seqs, min_len, max_len, pre, not_post, post, digestion, miscleavages, methionine_cleavage, with_masses=false, fixed_mods=None, enzyme=None))]
+fn write_peptide_database(
+    py: Python<'_>,
+    path: std::path::PathBuf,
+    seqs: Vec<String>,
+    min_len: usize,
+    max_len: usize,
+    pre: &Bound<'_, PyList>,
+    not_post: &Bound<'_, PyList>,
+    post: &Bound<'_, PyList>,
+    digestion: &str,
+    miscleavages: usize,
+    methionine_cleavage: bool,
+    with_masses: bool,
+    fixed_mods: Option<HashMap<char, f64>>,
+    enzyme: Option<PyRef<'_, PyEnzyme>>,
+) -> PyResult<()> {
+    seqs.iter().try_for_each(|seq| check_ascii(seq))?;
+    let enzyme = resolve_enzyme(enzyme, pre, not_post, post)?;
+    let mass_table = mass_table(fixed_mods);
+
+    py.allow_threads(|| {
+        let index = index::PeptideIndex::build(
+            &seqs,
+            min_len,
+            max_len,
+            &enzyme,
+            digestion,
+            miscleavages,
+            methionine_cleavage,
+        );
+        let masses: Option<Vec<f64>> = with_masses.then(|| {
+            (0..index.len())
+                .into_par_iter()
+                .map(|i| mass_table.peptide_mass(index.peptide(i).as_bytes()))
+                .collect()
+        });
+        database::write_database(path, &index, seqs.len(), masses.as_deref())
+    })?;
+    Ok(())
 }
 
-#[pymodule]
+// The extension keeps no global state and its classes are Sync, so it can run
+// without the GIL on free-threaded Python builds
+#[pymodule(gil_used = false)]
 fn protein_digest(_py: Python, m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(get_digested_peptides, m)?)?;
+    m.add_function(wrap_pyfunction!(get_digested_offsets, m)?)?;
+    m.add_function(wrap_pyfunction!(get_digested_metadata, m)?)?;
+    m.add_function(wrap_pyfunction!(get_digested_peptides_with_masses, m)?)?;
+    m.add_function(wrap_pyfunction!(get_digested_offsets_with_masses, m)?)?;
+    m.add_function(wrap_pyfunction!(digest_many, m)?)?;
+    m.add_function(wrap_pyfunction!(digest_many_columnar, m)?)?;
+    m.add_function(wrap_pyfunction!(count_peptides, m)?)?;
+    m.add_function(wrap_pyfunction!(count_peptides_many, m)?)?;
+    m.add_function(wrap_pyfunction!(get_digested_peptides_with_decoys, m)?)?;
+    m.add_function(wrap_pyfunction!(digest_many_with_decoys, m)?)?;
+    m.add_function(wrap_pyfunction!(write_peptide_database, m)?)?;
+    m.add_class::<PyEnzyme>()?;
+    m.add_class::<PeptideIterator>()?;
+    m.add_class::<ModifiedPeptideIterator>()?;
+    m.add_class::<FastaDigestIterator>()?;
+    m.add_class::<PyPeptideIndex>()?;
+    m.add_class::<PyMassIndex>()?;
     Ok(())
 }
@@ -0,0 +1,96 @@
+/// Monoisotopic mass of water, added once per peptide
+pub const WATER: f64 = 18.0105646837;
+
+/// Monoisotopic residue masses
+const RESIDUE_MASSES: [(u8, f64); 22] = [
+    (b'G', 57.02146372),
+    (b'A', 71.03711379),
+    (b'S', 87.03202841),
+    (b'P', 97.05276385),
+    (b'V', 99.06841391),
+    (b'T', 101.04767846),
+    (b'C', 103.00918478),
+    (b'L', 113.08406398),
+    (b'I', 113.08406398),
+    (b'N', 114.04292744),
+    (b'D', 115.02694303),
+    (b'Q', 128.05857751),
+    (b'K', 128.09496302),
+    (b'E', 129.04259309),
+    (b'M', 131.04048491),
+    (b'H', 137.05891186),
+    (b'F', 147.06841391),
+    (b'R', 156.10111103),
+    (b'Y', 163.06332853),
+    (b'W', 186.07931295),
+    (b'U', 150.95363559),
+    (b'O', 237.14772677),
+];
+
+/// Residue masses indexed by ASCII code, including fixed modifications
+#[derive(Clone)]
+pub struct MassTable {
+    masses: [f64; 256],
+    known: [bool; 256],
+}
+
+impl MassTable {
+    /// Residue masses with the fixed modification mass shifts added, e.g.
+    /// ('C', 57.021464) for carbamidomethylation of cysteine
+    pub fn new(fixed_mods: &[(char, f64)]) -> Self {
+        let mut masses = [0.0; 256];
+        let mut known = [false; 256];
+        for &(aa, mass) in &RESIDUE_MASSES {
+            masses[aa as usize] = mass;
+            known[aa as usize] = true;
+        }
+        for &(aa, shift) in fixed_mods.iter().filter(|(aa, _)| aa.is_ascii()) {
+            masses[aa as usize] += shift;
+        }
+        MassTable { masses, known }
+    }
+
+    /// Monoisotopic mass of a peptide, NaN if it contains residues without a
+    /// known mass
+    pub fn peptide_mass(&self, peptide: &[u8]) -> f64 {
+        if peptide.iter().any(|&aa| !self.known[aa as usize]) {
+            return f64::NAN;
+        }
+        peptide.iter().map(|&aa| self.masses[aa as usize]).sum::<f64>() + WATER
+    }
+
+    /// Cumulative residue masses of a sequence, such that peptide masses can
+    /// be computed in constant time
+    pub fn prefix_masses(&self, seq: &[u8]) -> PrefixMasses {
+        let mut masses = Vec::with_capacity(seq.len() + 1);
+        let mut unknown = Vec::with_capacity(seq.len() + 1);
+        let (mut mass, mut n_unknown) = (0.0, 0);
+        masses.push(mass);
+        unknown.push(n_unknown);
+        for &aa in seq {
+            mass += self.masses[aa as usize];
+            n_unknown += u32::from(!self.known[aa as usize]);
+            masses.push(mass);
+            unknown.push(n_unknown);
+        }
+        PrefixMasses { masses, unknown }
+    }
+}
+
+/// Prefix sums of residue masses and of the number of unknown residues
+pub struct PrefixMasses {
+    masses: Vec<f64>,
+    unknown: Vec<u32>,
+}
+
+impl PrefixMasses {
+    /// Monoisotopic mass of seq[start..end], NaN if it contains residues
+    /// without a known mass (e.g. X or B)
+    #[inline]
+    pub fn peptide_mass(&self, start: usize, end: usize) -> f64 {
+        if self.unknown[end] != self.unknown[start] {
+            return f64::NAN;
+        }
+        self.masses[end] - self.masses[start] + WATER
+    }
+}
@@ -0,0 +1,95 @@
+use rayon::prelude::*;
+
+use crate::index::PeptideIndex;
+use crate::mass::MassTable;
+
+/// Precursor mass tolerance
+#[derive(Clone, Copy)]
+pub enum Tolerance {
+    Ppm(f64),
+    Da(f64),
+}
+
+impl Tolerance {
+    /// Mass window [low, high] around a precursor mass
+    #[inline]
+    pub fn window(&self, mass: f64) -> (f64, f64) {
+        let delta = match *self {
+            Tolerance::Ppm(ppm) => mass * ppm * 1e-6,
+            Tolerance::Da(da) => da,
+        };
+        (mass - delta, mass + delta)
+    }
+}
+
+/// Deduplicated peptides of a protein collection sorted by mass.
+///
+/// Peptide indices refer to the underlying (sequence sorted) PeptideIndex,
+/// peptides with residues of unknown mass are not part of the mass order.
+pub struct MassIndex {
+    index: PeptideIndex,
+    masses: Vec<f64>,
+    sorted_masses: Vec<f64>,
+    order: Vec<u32>,
+}
+
+impl MassIndex {
+    pub fn new(index: PeptideIndex, mass_table: &MassTable) -> Self {
+        let masses: Vec<f64> = (0..index.len())
+            .into_par_iter()
+            .map(|i| mass_table.peptide_mass(index.peptide(i).as_bytes()))
+            .collect();
+        let mut order: Vec<u32> = (0..index.len() as u32)
+            .filter(|&i| !masses[i as usize].is_nan())
+            .collect();
+        order.par_sort_unstable_by(|&a, &b| {
+            masses[a as usize]
+                .total_cmp(&masses[b as usize])
+                .then(a.cmp(&b))
+        });
+        let sorted_masses = order.iter().map(|&i| masses[i as usize]).collect();
+        MassIndex {
+            index,
+            masses,
+            sorted_masses,
+            order,
+        }
+    }
+
+    /// Indices of the peptides with a mass in [low, high], in mass order
+    pub fn range(&self, low: f64, high: f64) -> &[u32] {
+        let start = self.sorted_masses.partition_point(|&mass| mass < low);
+        let end = self.sorted_masses.partition_point(|&mass| mass <= high);
+        &self.order[start..usize::max(start, end)]
+    }
+
+    /// Peptides within the tolerance window of each precursor mass, in CSR
+    /// format: the matches of the i-th precursor are
+    /// indices[offsets[i]..offsets[i + 1]]
+    pub fn query(&self, precursor_masses: &[f64], tolerance: Tolerance) -> (Vec<u64>, Vec<u32>) {
+        let ranges: Vec<&[u32]> = precursor_masses
+            .par_iter()
+            .map(|&mass| {
+                let (low, high) = tolerance.window(mass);
+                self.range(low, high)
+            })
+            .collect();
+        let mut offsets = Vec::with_capacity(ranges.len() + 1);
+        offsets.push(0);
+        let mut indices = Vec::with_capacity(ranges.iter().map(|range| range.len()).sum());
+        for range in ranges {
+            indices.extend_from_slice(range);
+            offsets.push(indices.len() as u64);
+        }
+        (offsets, indices)
+    }
+
+    pub fn index(&self) -> &PeptideIndex {
+        &self.index
+    }
+
+    /// Masses of all peptides by peptide index, NaN for unknown residues
+    pub fn masses(&self) -> &[f64] {
+        &self.masses
+    }
+}
@@ -0,0 +1,189 @@
+//! Expansion of peptides into their variably modified forms.
+//!
+//! Modified forms are encoded in ProForma notation with mass shifts, e.g.
+//! `[+42.010565]-PEPM[+15.994915]TIDE`. Fixed modifications are not written
+//! into the encoding, they only enter the masses through the mass table.
+
+use std::fmt::Write;
+
+/// Site of a variable modification on the peptide N-terminus
+pub const N_TERM: char = '[';
+/// Site of a variable modification on the peptide C-terminus
+pub const C_TERM: char = ']';
+
+/// Variable modifications and the maximum number of them on a single peptide
+#[derive(Clone)]
+pub struct VariableMods {
+    /// Modification indices per residue, indexed by ASCII code
+    residue_mods: Vec<Vec<usize>>,
+    n_term_mods: Vec<usize>,
+    c_term_mods: Vec<usize>,
+    mass_shifts: Vec<f64>,
+    labels: Vec<String>,
+    max_mods: usize,
+}
+
+impl VariableMods {
+    /// Variable modifications given as (sites, mass shift), where the sites
+    /// are the modified residues together with '[' and ']' for the peptide
+    /// N- and C-terminus, e.g. ("STY", 79.966331) for phosphorylation or
+    /// ("[", 42.010565) for N-terminal acetylation
+    pub fn new(mods: &[(String, f64)], max_mods: usize) -> Self {
+        let mut residue_mods = vec![Vec::new(); 256];
+        let mut n_term_mods = Vec::new();
+        let mut c_term_mods = Vec::new();
+        for (i, (sites, _)) in mods.iter().enumerate() {
+            for site in sites.chars() {
+                let site_mods = match site {
+                    N_TERM => &mut n_term_mods,
+                    C_TERM => &mut c_term_mods,
+                    aa if aa.is_ascii() => &mut residue_mods[aa as usize],
+                    _ => continue,
+                };
+                if !site_mods.contains(&i) {
+                    site_mods.push(i);
+                }
+            }
+        }
+        VariableMods {
+            residue_mods,
+            n_term_mods,
+            c_term_mods,
+            mass_shifts: mods.iter().map(|&(_, shift)| shift).collect(),
+            labels: mods
+                .iter()
+                .map(|&(_, shift)| format!("[{:+}]", shift))
+                .collect(),
+            max_mods,
+        }
+    }
+
+    /// Lazy enumeration of the modified forms of a peptide
+    pub fn forms(&self, peptide: &[u8]) -> ModifiedForms {
+        let mut slots = Vec::new();
+        let mut candidates = Vec::new();
+        let mut add_slot = |site: usize, mods: &[usize]| {
+            if !mods.is_empty() {
+                slots.push((site, candidates.len(), candidates.len() + mods.len()));
+                candidates.extend_from_slice(mods);
+            }
+        };
+        add_slot(0, &self.n_term_mods);
+        for (i, &aa) in peptide.iter().enumerate() {
+            add_slot(i + 1, &self.residue_mods[aa as usize]);
+        }
+        add_slot(peptide.len() + 1, &self.c_term_mods);
+
+        ModifiedForms {
+            slots,
+            candidates,
+            max_mods: self.max_mods,
+            chosen: Vec::new(),
+            choices: Vec::new(),
+            form: Vec::new(),
+            started: false,
+        }
+    }
+
+    /// Total mass shift of a modified form
+    pub fn mass_shift(&self, form: &[(usize, usize)]) -> f64 {
+        form.iter().map(|&(_, m)| self.mass_shifts[m]).sum()
+    }
+
+    /// ProForma encoding of a modified form of a peptide
+    pub fn encode(&self, peptide: &[u8], form: &[(usize, usize)]) -> String {
+        let mut encoded = String::with_capacity(peptide.len() + 12 * form.len());
+        let mut form = form.iter().peekable();
+        if let Some(&(_, m)) = form.next_if(|&&(site, _)| site == 0) {
+            let _ = write!(encoded, "{}-", self.labels[m]);
+        }
+        for (i, &aa) in peptide.iter().enumerate() {
+            encoded.push(aa as char);
+            if let Some(&(_, m)) = form.next_if(|&&(site, _)| site == i + 1) {
+                encoded.push_str(&self.labels[m]);
+            }
+        }
+        if let Some(&(_, m)) = form.next() {
+            let _ = write!(encoded, "-{}", self.labels[m]);
+        }
+        encoded
+    }
+}
+
+/// Modified forms of a single peptide.
+///
+/// Forms are enumerated by increasing number of modifications, starting with
+/// the unmodified peptide, by choosing combinations of modifiable sites and
+/// then one of the modifications of each chosen site. Only the current form
+/// is kept in memory, such that the number of forms does not matter.
+pub struct ModifiedForms {
+    /// Modifiable sites as (site, candidates start, candidates end), where
+    /// site 0 is the N-terminus, site i the i-th residue and site
+    /// len + 1 the C-terminus
+    slots: Vec<(usize, usize, usize)>,
+    candidates: Vec<usize>,
+    max_mods: usize,
+    /// Increasing indices of the chosen slots
+    chosen: Vec<usize>,
+    /// Index into the candidates of each chosen slot
+    choices: Vec<usize>,
+    form: Vec<(usize, usize)>,
+    started: bool,
+}
+
+impl ModifiedForms {
+    /// The next modified form as (site, modification index) pairs ordered by
+    /// site, None after the last form
+    pub fn next_form(&mut self) -> Option<&[(usize, usize)]> {
+        if !self.started {
+            self.started = true;
+        } else if !self.advance() {
+            return None;
+        }
+        self.form.clear();
+        for (&slot, &choice) in self.chosen.iter().zip(&self.choices) {
+            self.form
+                .push((self.slots[slot].0, self.candidates[choice]));
+        }
+        Some(&self.form)
+    }
+
+    fn advance(&mut self) -> bool {
+        // next modification of the chosen sites
+        for i in (0..self.chosen.len()).rev() {
+            let (_, start, end) = self.slots[self.chosen[i]];
+            if self.choices[i] + 1 < end {
+                self.choices[i] += 1;
+                return true;
+            }
+            self.choices[i] = start;
+        }
+
+        // next combination of the same number of sites
+        let (k, n) = (self.chosen.len(), self.slots.len());
+        for i in (0..k).rev() {
+            if self.chosen[i] < n - k + i {
+                self.chosen[i] += 1;
+                for j in i + 1..k {
+                    self.chosen[j] = self.chosen[j - 1] + 1;
+                }
+                self.reset_choices();
+                return true;
+            }
+        }
+
+        // one more modified site
+        if k < usize::min(self.max_mods, n) {
+            self.chosen = (0..=k).collect();
+            self.reset_choices();
+            return true;
+        }
+        false
+    }
+
+    fn reset_choices(&mut self) {
+        self.choices.clear();
+        self.choices
+            .extend(self.chosen.iter().map(|&slot| self.slots[slot].1));
+    }
+}
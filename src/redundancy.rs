@@ -0,0 +1,146 @@
+//! Detection of sequence regions shared between the proteins of a proteome.
+//!
+//! Isoforms and redundant entries share long prefixes and suffixes with
+//! other proteins, and their peptides within these regions are the same. A
+//! peptide of a protein is shared with a parent protein if its cleavage sites
+//! and the cleavage sites in its miscleavage window only depend on residues
+//! of the common region, such that the parent has the same peptide. Shared
+//! peptides are only digested in the parent and attributed to its children
+//! afterwards.
+//!
+//! Proteins sorted by sequence share the longest prefix with their
+//! predecessor, which becomes their prefix parent. The suffix parent is the
+//! neighbour in the order of the reversed sequences with the longer common
+//! suffix among those preceding the protein in sequence order. Parents
+//! therefore always precede their children in sequence order and every shared
+//! peptide is attributed along a tree rooted at the protein digesting it.
+
+use rayon::prelude::*;
+
+pub struct SharedRegions {
+    lengths: Vec<usize>,
+    /// (parent, length of the common prefix) of every protein
+    prefix_parents: Vec<Option<(u32, usize)>>,
+    /// (parent, length of the common suffix) of every protein
+    suffix_parents: Vec<Option<(u32, usize)>>,
+    prefix_children: Vec<Vec<u32>>,
+    suffix_children: Vec<Vec<u32>>,
+}
+
+impl SharedRegions {
+    /// Find the prefix and suffix parents of all sequences
+    pub fn find(seqs: &[String]) -> Self {
+        let n = seqs.len();
+        let seq = |i: u32| seqs[i as usize].as_bytes();
+        let mut regions = SharedRegions {
+            lengths: seqs.iter().map(|seq| seq.len()).collect(),
+            prefix_parents: vec![None; n],
+            suffix_parents: vec![None; n],
+            prefix_children: vec![Vec::new(); n],
+            suffix_children: vec![Vec::new(); n],
+        };
+
+        let mut order: Vec<u32> = (0..n as u32).collect();
+        order.par_sort_unstable_by(|&a, &b| seq(a).cmp(seq(b)).then(a.cmp(&b)));
+        let mut rank = vec![0; n];
+        for (i, &protein) in order.iter().enumerate() {
+            rank[protein as usize] = i;
+        }
+        for pair in order.windows(2) {
+            let length = common_length(seq(pair[0]).iter(), seq(pair[1]).iter());
+            if length > 0 {
+                regions.prefix_parents[pair[1] as usize] = Some((pair[0], length));
+                regions.prefix_children[pair[0] as usize].push(pair[1]);
+            }
+        }
+
+        let mut reversed_order: Vec<u32> = (0..n as u32).collect();
+        reversed_order.par_sort_unstable_by(|&a, &b| {
+            seq(a).iter().rev().cmp(seq(b).iter().rev()).then(a.cmp(&b))
+        });
+        for (i, &protein) in reversed_order.iter().enumerate() {
+            let neighbours = [i.checked_sub(1), Some(i + 1).filter(|&j| j < n)];
+            let parent = neighbours
+                .into_iter()
+                .flatten()
+                .map(|j| reversed_order[j])
+                .filter(|&other| rank[other as usize] < rank[protein as usize])
+                .map(|other| {
+                    let length = common_length(seq(other).iter().rev(), seq(protein).iter().rev());
+                    (other, length)
+                })
+                .max_by_key(|&(_, length)| length);
+            if let Some((parent, length)) = parent.filter(|&(_, length)| length > 0) {
+                regions.suffix_parents[protein as usize] = Some((parent, length));
+                regions.suffix_children[parent as usize].push(protein);
+            }
+        }
+        regions
+    }
+
+    /// Check if the peptide is shared with the prefix parent, i.e. if it ends
+    /// before the last residue of the common prefix. Proteins with identical
+    /// sequences share all peptides.
+    fn prefix_shared(&self, protein: u32, end: usize) -> bool {
+        self.prefix_parents[protein as usize].is_some_and(|(parent, length)| {
+            end < length
+                || (length == self.lengths[protein as usize]
+                    && length == self.lengths[parent as usize])
+        })
+    }
+
+    /// Check if the peptide is shared with the suffix parent, i.e. if it starts
+    /// after the first residue of the common suffix. Peptides starting at the
+    /// protein N-terminus or the methionine cleavage are never shared.
+    fn suffix_shared(&self, protein: u32, start: usize) -> bool {
+        self.suffix_parents[protein as usize].is_some_and(|(parent, length)| {
+            let protein_length = self.lengths[protein as usize];
+            start > protein_length - length
+                && start >= 2
+                && start + self.lengths[parent as usize] >= protein_length + 2
+        })
+    }
+
+    /// Check if a peptide of a protein is shared with one of its parents, in
+    /// which case it is attributed to the protein by for_each_sharing
+    pub fn is_shared(&self, protein: u32, start: usize, end: usize) -> bool {
+        self.prefix_shared(protein, end) || self.suffix_shared(protein, start)
+    }
+
+    /// Call f with every other protein the peptide is shared with
+    pub fn for_each_sharing<F: FnMut(u32)>(
+        &self,
+        protein: u32,
+        start: usize,
+        end: usize,
+        f: &mut F,
+    ) {
+        let mut stack = vec![(protein, start, end)];
+        while let Some((parent, start, end)) = stack.pop() {
+            for &child in &self.prefix_children[parent as usize] {
+                if self.prefix_shared(child, end) {
+                    f(child);
+                    stack.push((child, start, end));
+                }
+            }
+            let parent_length = self.lengths[parent as usize];
+            for &child in &self.suffix_children[parent as usize] {
+                // position of the peptide in the child
+                let Some(start) = (start + self.lengths[child as usize]).checked_sub(parent_length)
+                else {
+                    continue;
+                };
+                let end = end + self.lengths[child as usize] - parent_length;
+                if !self.prefix_shared(child, end) && self.suffix_shared(child, start) {
+                    f(child);
+                    stack.push((child, start, end));
+                }
+            }
+        }
+    }
+}
+
+/// Length of the common prefix of two residue sequences
+fn common_length<'a>(a: impl Iterator<Item = &'a u8>, b: impl Iterator<Item = &'a u8>) -> usize {
+    a.zip(b).take_while(|(a, b)| a == b).count()
+}
@@ -1,27 +1,80 @@
+import asyncio
+import gzip
+import os
+
+import numpy as np
+import pytest
+
 # from protein_digest import digest
+from protein_digest import digest as digest_py
+from protein_digest import digest_np, get_backend
+from protein_digest.aio import AsyncDigester, adigest, adigest_proteome
+from protein_digest.cache import CachedProteome, DigestCache
+from protein_digest.database import PeptideDatabase
+from protein_digest.memo import DigestMemo
 from protein_digest import digest_rs as digest
 
 
+@pytest.fixture(params=[digest, digest_np], ids=["rust", "numpy"])
+def backend(request):
+    return request.param
+
+
+def reference_semi_specific_digest(
+    seq, min_len, max_len, pre, not_post, post, miscleavages, methionine_cleavage
+):
+    """The previous quadratic semi-specific enumeration, kept as an oracle.
+
+    The only change is that peptides of length 1 ending at a cleavage site
+    are excluded, as they are in all backends.
+    """
+    seq_len, starts = len(seq), [0]
+    methionine_cleavage = methionine_cleavage and seq[0] == "M"
+
+    def length_accepted(pep_len):
+        return min_len <= pep_len <= max_len
+
+    for i in range(seq_len):
+        is_cleavage_site = digest_py.is_enzymatic(
+            seq[i], seq[min([seq_len - 1, i + 1])], pre, not_post, post
+        )
+        is_methionine_cleavage_site = i == 0 and methionine_cleavage
+        if i == seq_len - 1 or is_cleavage_site or is_methionine_cleavage_site:
+            # enzymatic C-terminus, enzymatic or non-enzymatic N-terminus
+            for j in range(starts[0], i):
+                if length_accepted(i - j + 1):
+                    yield seq[j : i + 1]
+            starts.append(i + 1)
+            methionine_cleaved = int(starts[0] == 0 and methionine_cleavage)
+            if len(starts) > miscleavages + 1 + methionine_cleaved or i == seq_len - 1:
+                starts = starts[1 + methionine_cleaved :]
+        else:
+            # non-enzymatic C-terminus
+            for start in starts:
+                if length_accepted(i - start + 1) and i + 1 not in starts:
+                    yield seq[start : i + 1]
+
+
 class TestNonSpecificDigest:
-    def test_non_specific_digest(self):
+    def test_non_specific_digest(self, backend):
         seq = "ABCDEFGH"
         min_len = 6
         max_len = 30
-        assert set(digest.non_specific_digest(seq, min_len, max_len)) == set(
+        assert set(backend.non_specific_digest(seq, min_len, max_len)) == set(
             ["ABCDEF", "BCDEFG", "CDEFGH", "ABCDEFG", "BCDEFGH", "ABCDEFGH"]
         )
 
-    def test_non_specific_digest_max_len(self):
+    def test_non_specific_digest_max_len(self, backend):
         seq = "ABCDEFGH"
         min_len = 6
         max_len = 7
-        assert set(digest.non_specific_digest(seq, min_len, max_len)) == set(
+        assert set(backend.non_specific_digest(seq, min_len, max_len)) == set(
             ["ABCDEF", "BCDEFG", "CDEFGH", "ABCDEFG", "BCDEFGH"]
         )
 
 
 class TestSemiSpecificDigest:
-    def test_semi_specific_digest_no_cleavage_site(self):
+    def test_semi_specific_digest_no_cleavage_site(self, backend):
         seq = "ABCDEFGH"
         min_len = 6
         max_len = 30
@@ -31,7 +84,7 @@ class TestSemiSpecificDigest:
         miscleavages = 2
         methionineCleavage = True
         assert set(
-            digest.semi_specific_digest(
+            backend.semi_specific_digest(
                 seq,
                 min_len,
                 max_len,
@@ -43,7 +96,7 @@ class TestSemiSpecificDigest:
             )
         ) == set(["ABCDEF", "ABCDEFG", "ABCDEFGH", "BCDEFGH", "CDEFGH"])
 
-    def test_semi_specific_digest_methionine_cleavage(self):
+    def test_semi_specific_digest_methionine_cleavage(self, backend):
         seq = "MABCDEFGH"
         min_len = 6
         max_len = 30
@@ -53,7 +106,7 @@ class TestSemiSpecificDigest:
         miscleavages = 2
         methionineCleavage = True
         assert set(
-            digest.semi_specific_digest(
+            backend.semi_specific_digest(
                 seq,
                 min_len,
                 max_len,
@@ -78,7 +131,9 @@ class TestSemiSpecificDigest:
         )
 
     # make sure that the methionine cleavage is not counted as a miscleavage
-    def test_semi_specific_digest_methionine_cleavage_plus_one_miscleavage(self):
+    def test_semi_specific_digest_methionine_cleavage_plus_one_miscleavage(
+        self, backend
+    ):
         seq = "MABCDEFKKK"
         min_len = 6
         max_len = 30
@@ -88,7 +143,7 @@ class TestSemiSpecificDigest:
         miscleavages = 1
         methionineCleavage = True
         assert set(
-            digest.semi_specific_digest(
+            backend.semi_specific_digest(
                 seq,
                 min_len,
                 max_len,
@@ -113,7 +168,7 @@ class TestSemiSpecificDigest:
             ]
         )
 
-    def test_semi_specific_digest_no_cleavage_site_max_len(self):
+    def test_semi_specific_digest_no_cleavage_site_max_len(self, backend):
         seq = "ABCDEFGH"
         min_len = 6
         max_len = 7
@@ -123,7 +178,7 @@ class TestSemiSpecificDigest:
         miscleavages = 2
         methionineCleavage = True
         assert set(
-            digest.semi_specific_digest(
+            backend.semi_specific_digest(
                 seq,
                 min_len,
                 max_len,
@@ -135,7 +190,7 @@ class TestSemiSpecificDigest:
             )
         ) == set(["ABCDEF", "ABCDEFG", "BCDEFGH", "CDEFGH"])
 
-    def test_semi_specific_digest_no_miscleavage(self):
+    def test_semi_specific_digest_no_miscleavage(self, backend):
         seq = "ABCDEFGKX"
         min_len = 6
         max_len = 30
@@ -145,7 +200,7 @@ class TestSemiSpecificDigest:
         miscleavages = 0
         methionineCleavage = True
         assert set(
-            digest.semi_specific_digest(
+            backend.semi_specific_digest(
                 seq,
                 min_len,
                 max_len,
@@ -157,7 +212,7 @@ class TestSemiSpecificDigest:
             )
         ) == set(["ABCDEF", "ABCDEFG", "ABCDEFGK", "BCDEFGK", "CDEFGK"])
 
-    def test_semi_specific_digest_one_miscleavage(self):
+    def test_semi_specific_digest_one_miscleavage(self, backend):
         seq = "ABCDEFGKX"
         min_len = 6
         max_len = 30
@@ -167,7 +222,7 @@ class TestSemiSpecificDigest:
         miscleavages = 1
         methionineCleavage = True
         assert set(
-            digest.semi_specific_digest(
+            backend.semi_specific_digest(
                 seq,
                 min_len,
                 max_len,
@@ -191,7 +246,7 @@ class TestSemiSpecificDigest:
             ]
         )
 
-    def test_semi_specific_digest_not_post(self):
+    def test_semi_specific_digest_not_post(self, backend):
         seq = "ABCDEFKPX"
         min_len = 6
         max_len = 30
@@ -201,7 +256,7 @@ class TestSemiSpecificDigest:
         miscleavages = 0
         methionineCleavage = True
         assert set(
-            digest.semi_specific_digest(
+            backend.semi_specific_digest(
                 seq,
                 min_len,
                 max_len,
@@ -223,9 +278,43 @@ class TestSemiSpecificDigest:
             ]
         )
 
+    def test_semi_specific_digest_random(self, backend):
+        rng = np.random.default_rng(15)
+        for _ in range(500):
+            seq = "".join(rng.choice(list("MKRPAGDE"), size=rng.integers(1, 60)))
+            min_len = int(rng.integers(1, 8))
+            max_len = min_len + int(rng.integers(0, 25))
+            miscleavages = int(rng.integers(0, 4))
+            args = (seq, min_len, max_len, ["K", "R"], ["P"], [], miscleavages, True)
+            assert list(backend.semi_specific_digest(*args)) == list(
+                digest_py.semi_specific_digest(*args)
+            )
+
+            assert sorted(backend.semi_specific_digest(*args)) == sorted(
+                reference_semi_specific_digest(*args)
+            )
+
+            # every (start, end) is produced exactly once
+            starts, ends = backend.get_digested_offsets(
+                seq, min_len, max_len, digestion="semi", miscleavages=miscleavages
+            )
+            assert len(set(zip(starts.tolist(), ends.tolist()))) == len(starts)
+
+    def test_semi_specific_digest_reference_python(self):
+        rng = np.random.default_rng(16)
+        for _ in range(500):
+            seq = "".join(rng.choice(list("MKRPAGDE"), size=rng.integers(1, 60)))
+            min_len = int(rng.integers(1, 8))
+            max_len = min_len + int(rng.integers(0, 25))
+            miscleavages = int(rng.integers(0, 4))
+            args = (seq, min_len, max_len, ["K", "R"], ["P"], [], miscleavages, True)
+            assert sorted(digest_py.semi_specific_digest(*args)) == sorted(
+                reference_semi_specific_digest(*args)
+            )
+
 
 class TestFullDigest:
-    def test_full_digest_no_cleavage_site(self):
+    def test_full_digest_no_cleavage_site(self, backend):
         seq = "ABCDEFGH"
         min_len = 6
         max_len = 30
@@ -235,7 +324,7 @@ class TestFullDigest:
         miscleavages = 2
         methionineCleavage = True
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -247,7 +336,7 @@ class TestFullDigest:
             )
         ) == set(["ABCDEFGH"])
 
-    def test_full_digest_methionine_cleavage(self):
+    def test_full_digest_methionine_cleavage(self, backend):
         seq = "MABCDEFGH"
         min_len = 6
         max_len = 30
@@ -257,7 +346,7 @@ class TestFullDigest:
         miscleavages = 2
         methionineCleavage = True
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -270,7 +359,7 @@ class TestFullDigest:
         ) == set(["MABCDEFGH", "ABCDEFGH"])
 
     # make sure that the methionine cleavage is not counted as a miscleavage
-    def test_full_digest_methionine_cleavage_one_miscleavage(self):
+    def test_full_digest_methionine_cleavage_one_miscleavage(self, backend):
         seq = "MABCDEFGHKKK"
         min_len = 6
         max_len = 30
@@ -280,7 +369,7 @@ class TestFullDigest:
         miscleavages = 1
         methionineCleavage = True
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -292,7 +381,20 @@ class TestFullDigest:
             )
         ) == set(["MABCDEFGHK", "MABCDEFGHKK", "ABCDEFGHK", "ABCDEFGHKK"])
 
-    def test_full_digest_no_cleavage_site_max_len(self):
+    def test_short_methionine_sequences(self, backend):
+        # the methionine cleavage of "M" coincides with its C-terminus
+        assert list(backend.get_digested_peptides("M", min_len=1)) == ["M"]
+        assert list(digest_py.get_digested_peptides("M", min_len=1)) == ["M"]
+        assert digest_py.count_peptides("M", min_len=1) == (1, 1)
+        for seq in ["M", "MK", "MA", "MM", "MKP", "MAK", "MKR"]:
+            for min_len in range(len(seq) - 1, 4):
+                for digestion in ["full", "semi", "none"]:
+                    kwargs = dict(min_len=min_len, digestion=digestion, miscleavages=1)
+                    assert list(backend.get_digested_peptides(seq, **kwargs)) == list(
+                        digest_py.get_digested_peptides(seq, **kwargs)
+                    )
+
+    def test_full_digest_no_cleavage_site_max_len(self, backend):
         seq = "ABCDEFGH"
         min_len = 6
         max_len = 7
@@ -302,7 +404,7 @@ class TestFullDigest:
         miscleavages = 2
         methionineCleavage = True
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -314,7 +416,7 @@ class TestFullDigest:
             )
         ) == set([])
 
-    def test_full_digest_no_miscleavage(self):
+    def test_full_digest_no_miscleavage(self, backend):
         seq = "ABCDEFGKX"
         min_len = 6
         max_len = 30
@@ -324,7 +426,7 @@ class TestFullDigest:
         miscleavages = 0
         methionineCleavage = True
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -336,7 +438,7 @@ class TestFullDigest:
             )
         ) == set(["ABCDEFGK"])
 
-    def test_full_digest_one_miscleavage(self):
+    def test_full_digest_one_miscleavage(self, backend):
         seq = "ABCDEFGKX"
         min_len = 6
         max_len = 30
@@ -346,7 +448,7 @@ class TestFullDigest:
         miscleavages = 1
         methionineCleavage = True
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -358,7 +460,7 @@ class TestFullDigest:
             )
         ) == set(["ABCDEFGK", "ABCDEFGKX"])
 
-    def test_full_digest_not_post(self):
+    def test_full_digest_not_post(self, backend):
         seq = "ABCDEFKPX"
         min_len = 6
         max_len = 30
@@ -368,7 +470,7 @@ class TestFullDigest:
         miscleavages = 0
         methionineCleavage = True
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -380,7 +482,7 @@ class TestFullDigest:
             )
         ) == set(["ABCDEFKPX"])
 
-    def test_full_digest_post(self):
+    def test_full_digest_post(self, backend):
         seq = "ABCDEFKPXAAA"
         min_len = 6
         max_len = 30
@@ -390,7 +492,7 @@ class TestFullDigest:
         miscleavages = 0
         methionineCleavage = True
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -402,7 +504,7 @@ class TestFullDigest:
             )
         ) == set(["ABCDEF", "KPXAAA"])
 
-    def test_full_digest_egfr(self):
+    def test_full_digest_egfr(self, backend):
         """
         from pyteomics import parser
 
@@ -435,7 +537,7 @@ class TestFullDigest:
         miscleavages = 2
         methionineCleavage = False
         assert set(
-            digest.full_digest(
+            backend.full_digest(
                 seq,
                 min_len,
                 max_len,
@@ -675,3 +777,1119 @@ class TestFullDigest:
                 "TPQHVK",
             ]
         )
+
+
+class TestEnzyme:
+    def test_enzyme_matches_rules(self, backend):
+        for seq in ["MABCDEFGHKKK", "ABCDEFGKX", "ABCDEFKPXAAA", "ABCDEFRPXKAAAAAAA"]:
+            for digestion in ["full", "semi"]:
+                assert list(
+                    backend.get_digested_peptides(
+                        seq,
+                        digestion=digestion,
+                        miscleavages=1,
+                        enzyme=backend.Enzyme(pre=["K", "R"], not_post=["P"]),
+                    )
+                ) == list(
+                    backend.get_digested_peptides(
+                        seq, digestion=digestion, miscleavages=1
+                    )
+                )
+
+    def test_enzyme_presets(self, backend):
+        seq = "ABCDEFKPXAAARAAAAAAEAAAAAADAAAAAAWAAAAAAA"
+        expected = {
+            "trypsin": ["ABCDEFKPXAAAR", "AAAAAAEAAAAAADAAAAAAWAAAAAAA"],
+            "trypsin/p": ["ABCDEFK", "PXAAAR", "AAAAAAEAAAAAADAAAAAAWAAAAAAA"],
+            "lys-c": ["ABCDEFKPXAAARAAAAAAEAAAAAADAAAAAAWAAAAAAA"],
+            "glu-c": ["FKPXAAARAAAAAAE", "AAAAAADAAAAAAWAAAAAAA"],
+            "asp-n": ["DEFKPXAAARAAAAAAEAAAAAA", "DAAAAAAWAAAAAAA"],
+            "chymotrypsin": ["ABCDEF", "KPXAAARAAAAAAEAAAAAADAAAAAAW", "AAAAAAA"],
+        }
+        assert sorted(backend.Enzyme.names()) == sorted(expected)
+        for name, peptides in expected.items():
+            assert (
+                list(
+                    backend.get_digested_peptides(
+                        seq,
+                        min_len=6,
+                        max_len=50,
+                        enzyme=backend.Enzyme.from_name(name),
+                    )
+                )
+                == peptides
+            ), name
+
+    def test_enzyme_post(self, backend):
+        assert list(
+            backend.get_digested_peptides(
+                "ABCDEFKPXAAA", enzyme=backend.Enzyme(post=["K"])
+            )
+        ) == ["ABCDEF", "KPXAAA"]
+
+    def test_enzyme_unknown_name(self, backend):
+        with pytest.raises(ValueError):
+            backend.Enzyme.from_name("pepsin")
+        with pytest.raises(ValueError):
+            backend.Enzyme.from_name("trypsin+pepsin")
+
+    def test_enzyme_non_ascii_residue(self):
+        with pytest.raises(ValueError):
+            digest.Enzyme(pre=["K", "é"])
+        with pytest.raises(ValueError):
+            digest.get_digested_peptides("AAAKAAA", pre=["é"])
+
+    def test_enzyme_union(self, backend):
+        seq = "ABCDEFKPXAAARAAAAAAEAAAAAADAAAAAAWAAAAAAA"
+        enzyme = backend.Enzyme.from_name("trypsin+asp-n")
+        assert len(enzyme.rules) == 2
+        assert list(backend.get_digested_peptides(seq, enzyme=enzyme)) == [
+            "DEFKPXAAAR",
+            "AAAAAAEAAAAAA",
+            "DAAAAAAWAAAAAAA",
+        ]
+        union = backend.Enzyme.union(
+            [backend.Enzyme.from_name("trypsin"), backend.Enzyme.from_name("asp-n")]
+        )
+        for digestion in ["full", "semi"]:
+            assert list(
+                backend.get_digested_peptides(
+                    seq, digestion=digestion, miscleavages=1, enzyme=union
+                )
+            ) == list(
+                backend.get_digested_peptides(
+                    seq, digestion=digestion, miscleavages=1, enzyme=enzyme
+                )
+            )
+
+    def test_enzyme_union_keeps_rules_apart(self, backend):
+        # R cleaves before P but K does not, which a single rule can't express
+        enzyme = backend.Enzyme.union(
+            [backend.Enzyme(pre=["K"], not_post=["P"]), backend.Enzyme(pre=["R"])]
+        )
+        assert list(
+            backend.get_digested_peptides(
+                "AAAAKPAAAARPAAAAKAAAA", min_len=3, enzyme=enzyme
+            )
+        ) == ["AAAAKPAAAAR", "PAAAAK", "AAAA"]
+
+    def test_enzyme_union_python(self):
+        enzyme = digest_py.Enzyme.union(
+            [digest_py.Enzyme(pre=["K"], not_post=["P"]), digest_py.Enzyme(pre=["R"])]
+        )
+        assert list(
+            digest_py.get_digested_peptides(
+                "AAAAKPAAAARPAAAAKAAAA", min_len=3, enzyme=enzyme
+            )
+        ) == ["AAAAKPAAAAR", "PAAAAK", "AAAA"]
+
+
+class TestSequenceValidation:
+    def test_non_ascii_sequence(self, backend):
+        with pytest.raises(ValueError):
+            backend.get_digested_peptides("ABCDEFGHÄKAAAAAA")
+
+    def test_non_ascii_sequence_in_batch(self):
+        with pytest.raises(ValueError):
+            digest.digest_many(["ABCDEFGHKAAAAAA", "ABCDEFGHÄKAAAAAA"])
+
+
+class TestDigestedOffsets:
+    def test_digested_offsets_match_peptides(self, backend):
+        for seq in ["MABCDEFGHKKK", "ABCDEFGKX", "ABCDEFKPXAAA", "ABCDEFGH"]:
+            for digestion in ["full", "semi", "none"]:
+                starts, ends = backend.get_digested_offsets(
+                    seq, min_len=6, max_len=30, digestion=digestion, miscleavages=1
+                )
+                assert starts.dtype == "uint32" and ends.dtype == "uint32"
+                assert [seq[start:end] for start, end in zip(starts, ends)] == list(
+                    backend.get_digested_peptides(
+                        seq,
+                        min_len=6,
+                        max_len=30,
+                        digestion=digestion,
+                        miscleavages=1,
+                    )
+                )
+
+    def test_digested_offsets_empty(self, backend):
+        starts, ends = backend.get_digested_offsets("ABCDEFGH", min_len=10)
+        assert len(starts) == 0 and len(ends) == 0
+
+
+class TestDigestedMetadata:
+    seq = "MPEPTIDEKAAKPAAAARAAAAAAK"
+
+    def test_metadata(self, backend):
+        metadata = backend.get_digested_metadata(self.seq, min_len=3, miscleavages=1)
+        assert list(metadata["start"]) == [0, 1, 0, 1, 9, 9, 18]
+        assert list(metadata["end"]) == [9, 9, 18, 18, 18, 25, 25]
+        assert list(metadata["missed_cleavages"]) == [0, 0, 1, 1, 0, 1, 0]
+        assert b"".join(metadata["preceding"]) == b"-M-MKKR"
+        assert b"".join(metadata["following"]) == b"AAAAA--"
+        assert list(metadata["protein_n_term"]) == [True] * 4 + [False] * 3
+        assert list(metadata["protein_c_term"]) == [False] * 5 + [True] * 2
+
+    def test_metadata_matches_peptides(self, backend):
+        for digestion in ["full", "semi", "none"]:
+            kwargs = dict(min_len=3, max_len=20, digestion=digestion, miscleavages=2)
+            metadata = backend.get_digested_metadata(self.seq, **kwargs)
+            assert [
+                self.seq[start:end]
+                for start, end in zip(metadata["start"], metadata["end"])
+            ] == list(backend.get_digested_peptides(self.seq, **kwargs))
+            for column in metadata.values():
+                assert len(column) == len(metadata["start"])
+
+    def test_metadata_empty(self, backend):
+        metadata = backend.get_digested_metadata("")
+        assert all(len(column) == 0 for column in metadata.values())
+
+
+class TestCountPeptides:
+    seq = "MRPSGTAGAALLALLAALCPASRALEEKKVCQGTSNKLTQLGTFEDHFLSLQRMFNNCEV"
+
+    @pytest.mark.parametrize("digestion", ["full", "semi", "none"])
+    @pytest.mark.parametrize("miscleavages", [0, 2])
+    def test_count_peptides(self, backend, digestion, miscleavages):
+        kwargs = dict(min_len=2, max_len=20, digestion=digestion)
+        peptides = backend.get_digested_peptides(
+            self.seq, miscleavages=miscleavages, **kwargs
+        )
+        assert backend.count_peptides(
+            self.seq, miscleavages=miscleavages, **kwargs
+        ) == (len(peptides), sum(map(len, peptides)))
+
+    @pytest.mark.parametrize("digestion", ["full", "semi", "none"])
+    def test_count_peptides_python(self, digestion):
+        enzyme = digest_py.Enzyme.from_name("trypsin+asp-n")
+        kwargs = dict(min_len=1, digestion=digestion, miscleavages=1, enzyme=enzyme)
+        peptides = list(digest_py.get_digested_peptides(self.seq, **kwargs))
+        assert digest_py.count_peptides(self.seq, **kwargs) == (
+            len(peptides),
+            sum(map(len, peptides)),
+        )
+
+    def test_count_peptides_empty(self, backend):
+        assert backend.count_peptides("") == (0, 0)
+
+    def test_count_peptides_many(self):
+        seqs = [self.seq, "", "PEPTIDEKAAAAAAR"]
+        n_peptides, n_residues = digest.count_peptides_many(seqs, digestion="semi")
+        assert list(n_peptides) == [
+            digest.count_peptides(seq, digestion="semi")[0] for seq in seqs
+        ]
+        assert list(n_residues) == [
+            digest.count_peptides(seq, digestion="semi")[1] for seq in seqs
+        ]
+
+
+class TestPeptideIterator:
+    seqs = ["MABCDEFGHKKK", "ABCDEFGKX", "ABCDEFKPXAAA", "ABCDEFGH", "M", ""]
+
+    def test_peptide_iterator_matches_list(self):
+        for seq in self.seqs:
+            for digestion in ["full", "semi", "none"]:
+                for miscleavages in [0, 2]:
+                    kwargs = dict(
+                        min_len=3,
+                        max_len=10,
+                        digestion=digestion,
+                        miscleavages=miscleavages,
+                    )
+                    assert list(
+                        digest.iter_digested_peptides(seq, **kwargs)
+                    ) == digest.get_digested_peptides(seq, **kwargs)
+
+    def test_peptide_iterator_chunks(self):
+        seq = "ABCDEFKPXAAARAAAAAAEAAAAAADAAAAAAWAAAAAAA"
+        peptides = digest.get_digested_peptides(seq, digestion="none")
+        chunks = list(
+            digest.iter_digested_peptides(seq, digestion="none", chunk_size=100)
+        )
+        assert [len(chunk) for chunk in chunks[:-1]] == [100] * (len(chunks) - 1)
+        assert 0 < len(chunks[-1]) <= 100
+        assert [peptide for chunk in chunks for peptide in chunk] == peptides
+
+    def test_peptide_iterator_early_stop(self):
+        peptides = digest.iter_digested_peptides("A" * 35000, digestion="none")
+        assert next(peptides) == "AAAAAA"
+        assert next(peptides) == "AAAAAAA"
+
+    def test_peptide_iterator_non_ascii(self):
+        with pytest.raises(ValueError):
+            digest.iter_digested_peptides("ABCDEFGHÄKAAAAAA")
+
+
+class TestPeptideMasses:
+    seq = "PEPTIDEKAACAAKXAAARAAAAAAAAAAAAAK"
+
+    def test_peptide_masses(self):
+        peptides, masses = digest.get_digested_peptides(
+            self.seq, min_len=5, return_masses=True
+        )
+        assert peptides == ["PEPTIDEK", "AACAAK", "XAAAR", "AAAAAAAAAAAAAK"]
+        assert masses.dtype == "float64"
+        assert masses[0] == pytest.approx(927.45493, abs=1e-5)
+        assert masses[1] == pytest.approx(533.26317, abs=1e-5)
+        assert np.isnan(masses[2])
+        assert masses[3] == pytest.approx(1069.58801, abs=1e-5)
+
+    def test_peptide_masses_fixed_mods(self):
+        _, masses = digest.get_digested_peptides(
+            self.seq, min_len=5, fixed_mods={"C": 57.021464}, return_masses=True
+        )
+        assert masses[1] == pytest.approx(590.28463, abs=1e-5)
+
+    def test_peptide_mass_filter(self):
+        assert digest.get_digested_peptides(
+            self.seq, min_len=5, min_mass=550.0, max_mass=1000.0
+        ) == ["PEPTIDEK"]
+        assert digest.get_digested_peptides(
+            self.seq,
+            min_len=5,
+            fixed_mods={"C": 57.021464},
+            min_mass=550.0,
+            max_mass=1000.0,
+        ) == ["PEPTIDEK", "AACAAK"]
+
+    def test_offset_masses(self):
+        starts, ends, masses = digest.get_digested_offsets(
+            self.seq, min_len=5, min_mass=900.0, return_masses=True
+        )
+        assert list(starts) == [0, 19]
+        assert list(ends) == [8, 33]
+        assert masses == pytest.approx([927.45493, 1069.58801], abs=1e-5)
+
+
+class TestModifiedPeptides:
+    oxidation = 15.994915
+    acetyl = 42.010565
+
+    def test_modified_forms(self):
+        forms = list(
+            digest.iter_modified_peptides(
+                "MAMKCSTYR",
+                {"M": self.oxidation, "[": self.acetyl},
+                max_mods=2,
+                min_len=4,
+            )
+        )
+        assert [peptide for peptide, _ in forms] == [
+            "MAMK",
+            f"[+{self.acetyl}]-MAMK",
+            f"M[+{self.oxidation}]AMK",
+            f"MAM[+{self.oxidation}]K",
+            f"[+{self.acetyl}]-M[+{self.oxidation}]AMK",
+            f"[+{self.acetyl}]-MAM[+{self.oxidation}]K",
+            f"M[+{self.oxidation}]AM[+{self.oxidation}]K",
+            "CSTYR",
+            f"[+{self.acetyl}]-CSTYR",
+        ]
+        _, base_masses = digest.get_digested_peptides(
+            "MAMKCSTYR", min_len=4, return_masses=True
+        )
+        assert [mass for _, mass in forms] == pytest.approx(
+            [base_masses[0]]
+            + [base_masses[0] + self.acetyl]
+            + [base_masses[0] + self.oxidation] * 2
+            + [base_masses[0] + self.acetyl + self.oxidation] * 2
+            + [base_masses[0] + 2 * self.oxidation]
+            + [base_masses[1], base_masses[1] + self.acetyl]
+        )
+
+    def test_max_mods(self):
+        for max_mods, n_forms in [(0, 1), (1, 4), (2, 7), (3, 8)]:
+            forms = digest.iter_modified_peptides(
+                "STYR", {"STY": 79.966331}, max_mods=max_mods, min_len=4
+            )
+            assert len(list(forms)) == n_forms
+
+    def test_same_sites(self):
+        forms = digest.iter_modified_peptides(
+            "ASK", [("S", 79.966331), ("S", 42.010565)], min_len=3
+        )
+        assert [peptide for peptide, _ in forms] == [
+            "ASK",
+            "AS[+79.966331]K",
+            "AS[+42.010565]K",
+        ]
+
+    def test_fixed_mods(self):
+        (_, mass), (_, oxidized_mass) = digest.iter_modified_peptides(
+            "ACMK", {"M": self.oxidation}, fixed_mods={"C": 57.021464}, min_len=4
+        )
+        _, masses = digest.get_digested_peptides(
+            "ACMK", min_len=4, fixed_mods={"C": 57.021464}, return_masses=True
+        )
+        assert mass == pytest.approx(masses[0])
+        assert oxidized_mass == pytest.approx(masses[0] + self.oxidation)
+
+    def test_chunks(self):
+        kwargs = dict(variable_mods={"STY": 79.966331, "M": self.oxidation})
+        kwargs.update(min_len=5, digestion="semi", max_mods=3)
+        seq = "MRPSGTAGAALLALLAALCPASRALEEKKVCQGTSNKLTQLGTFEDHFLSLQRMFNNCEV"
+        forms = list(digest.iter_modified_peptides(seq, **kwargs))
+        chunks = list(digest.iter_modified_peptides(seq, chunk_size=100, **kwargs))
+        assert [peptide for peptides, _ in chunks for peptide in peptides] == [
+            peptide for peptide, _ in forms
+        ]
+        assert np.concatenate([masses for _, masses in chunks]) == pytest.approx(
+            [mass for _, mass in forms]
+        )
+
+
+class TestDigestMany:
+    def test_digest_many_matches_single(self):
+        seqs = ["MABCDEFGHKKK", "ABCDEFGKX", "ABCDEFKPXAAA", "ABCDEFGH"]
+        for digestion in ["full", "semi", "none"]:
+            assert digest.digest_many(
+                seqs, min_len=6, max_len=30, digestion=digestion, miscleavages=1
+            ) == [
+                list(
+                    digest.get_digested_peptides(
+                        seq,
+                        min_len=6,
+                        max_len=30,
+                        digestion=digestion,
+                        miscleavages=1,
+                    )
+                )
+                for seq in seqs
+            ]
+
+    def test_digest_many_keeps_input_order(self):
+        seqs = ["ABCDEFGH", "MABCDEFGH", "", "ABCDEFGKX"] * 100
+        peptides = digest.digest_many(seqs, min_len=6, max_len=30)
+        assert len(peptides) == len(seqs)
+        assert peptides[:4] == [
+            ["ABCDEFGH"],
+            ["MABCDEFGH", "ABCDEFGH"],
+            [],
+            ["ABCDEFGK"],
+        ]
+        assert peptides[4:] == peptides[:4] * 99
+
+    def test_digest_many_empty(self):
+        assert digest.digest_many([]) == []
+
+
+class TestDecoys:
+    seq = "MPEPTIDEKAAAAAR"
+
+    def test_pseudo_reverse(self):
+        peptides, is_decoy = digest.get_digested_peptides_with_decoys(
+            self.seq, min_len=3
+        )
+        assert peptides == [
+            "MPEPTIDEK",
+            "EDITPEPMK",
+            "PEPTIDEK",
+            "EDITPEPK",
+            "AAAAAR",
+            "AAAAAR",
+        ]
+        assert is_decoy.dtype == bool
+        assert list(is_decoy) == [False, True] * 3
+
+    def test_reverse(self):
+        peptides, is_decoy = digest.get_digested_peptides_with_decoys(
+            self.seq, min_len=3, decoy="reverse"
+        )
+        targets = digest.get_digested_peptides(self.seq, min_len=3)
+        # the initial methionine is kept, MRAAAAAKEDITPEP
+        decoys = digest.get_digested_peptides("M" + self.seq[:0:-1], min_len=3)
+        assert decoys == ["AAAAAK", "EDITPEP"]
+        assert peptides == targets + decoys
+        assert list(is_decoy) == [False] * len(targets) + [True] * len(decoys)
+
+    def test_unknown_decoy(self):
+        with pytest.raises(ValueError):
+            digest.get_digested_peptides_with_decoys(self.seq, decoy="shuffle")
+
+    def test_digest_many_with_decoys(self):
+        seqs = ["MABCDEFGHKKK", "ABCDEFGKX", "", self.seq] * 10
+        for decoy in ["reverse", "pseudo-reverse"]:
+            digested = digest.digest_many_with_decoys(seqs, min_len=3, decoy=decoy)
+            assert len(digested) == len(seqs)
+            for seq, (peptides, is_decoy) in zip(seqs, digested):
+                expected, expected_decoy = digest.get_digested_peptides_with_decoys(
+                    seq, min_len=3, decoy=decoy
+                )
+                assert peptides == expected
+                assert list(is_decoy) == list(expected_decoy)
+
+
+class TestDigestFasta:
+    fasta = ">sp|P1|PROT1 first protein\nMABCDEFGHK\nKK\n\n>P2\nABCDEFGKX\n>P3\n"
+
+    def test_digest_fasta(self, tmp_path):
+        fasta_file = tmp_path / "proteins.fasta"
+        fasta_file.write_text(self.fasta)
+        assert list(
+            digest.digest_fasta(fasta_file, min_len=6, max_len=30, miscleavages=1)
+        ) == [
+            ("sp|P1|PROT1", ["MABCDEFGHK", "ABCDEFGHK", "MABCDEFGHKK", "ABCDEFGHKK"]),
+            ("P2", ["ABCDEFGK", "ABCDEFGKX"]),
+            ("P3", []),
+        ]
+
+    def test_digest_fasta_gzip(self, tmp_path):
+        fasta_file = tmp_path / "proteins.fasta.gz"
+        with gzip.open(fasta_file, "wt") as f:
+            f.write(self.fasta)
+        assert [
+            protein_id for protein_id, _ in digest.digest_fasta(fasta_file, batch_size=1)
+        ] == ["sp|P1|PROT1", "P2", "P3"]
+
+
+class TestPeptideIndex:
+    seqs = ["MABCDEFGHKKK", "ABCDEFGHKR", "XABCDEFGHKKK"]
+
+    def test_peptide_index(self):
+        index = digest.build_peptide_index(
+            self.seqs, min_len=6, max_len=30, miscleavages=1
+        )
+        assert index.peptides() == [
+            "ABCDEFGHK",
+            "ABCDEFGHKK",
+            "ABCDEFGHKR",
+            "MABCDEFGHK",
+            "MABCDEFGHKK",
+            "XABCDEFGHK",
+            "XABCDEFGHKK",
+        ]
+        assert len(index) == 7
+        assert index["ABCDEFGHK"] == [0, 1]
+        assert index["XABCDEFGHKK"] == [2]
+        assert "ABCDEFGH" not in index
+        assert index.find("ABCDEFGHKR") == 2
+        assert index.peptide(2) == "ABCDEFGHKR"
+        assert list(index.protein_offsets) == [0, 2, 3, 4, 5, 6, 7, 8]
+        assert list(index.protein_indices) == [0, 1, 0, 1, 0, 0, 2, 2]
+
+    def test_peptide_index_matches_digest(self):
+        index = digest.build_peptide_index(self.seqs, digestion="semi", miscleavages=2)
+        proteins = {}
+        for i, seq in enumerate(self.seqs):
+            for peptide in digest.get_digested_peptides(
+                seq, digestion="semi", miscleavages=2
+            ):
+                proteins.setdefault(peptide, set()).add(i)
+        assert index.peptides() == sorted(proteins)
+        assert all(index[peptide] == sorted(proteins[peptide]) for peptide in proteins)
+
+    @pytest.mark.parametrize("digestion", ["full", "semi", "none"])
+    def test_peptide_index_isoforms(self, digestion):
+        # identical proteins and isoforms sharing prefixes and suffixes
+        exons = ["MPEPTIDEKAAAR", "DEKRPLLK", "GGKDDAAR", "PEPKAK"]
+        seqs = [
+            "".join(exons),
+            "".join(exons),
+            exons[0] + exons[1] + exons[3],
+            exons[0] + exons[2] + exons[3],
+            exons[2] + exons[3],
+            exons[0][1:] + exons[1],
+        ]
+        index = digest.build_peptide_index(
+            seqs, min_len=2, max_len=20, digestion=digestion, miscleavages=2
+        )
+        proteins = {}
+        for i, seq in enumerate(seqs):
+            for peptide in digest.get_digested_peptides(
+                seq, min_len=2, max_len=20, digestion=digestion, miscleavages=2
+            ):
+                proteins.setdefault(peptide, set()).add(i)
+        assert index.peptides() == sorted(proteins)
+        assert all(index[peptide] == sorted(proteins[peptide]) for peptide in proteins)
+
+    def test_peptide_index_missing_peptide(self):
+        index = digest.build_peptide_index(self.seqs)
+        with pytest.raises(KeyError):
+            index["ABCDEFGH"]
+
+
+class TestMassIndex:
+    seqs = ["PEPTIDEKAACAAKXAAARPEPTIDEK", "AACAAKMMMMMMR", "PEPTIDEK"]
+
+    def test_mass_index_query(self):
+        index = digest.build_mass_index(self.seqs, min_len=3, miscleavages=1)
+        assert len(index) == 7
+        offsets, indices = index.query([927.4549, 533.2632, 100.0], 10, unit="ppm")
+        assert offsets.dtype == "uint64" and indices.dtype == "uint32"
+        assert list(offsets) == [0, 1, 2, 2]
+        assert index.peptide(indices[0]) == "PEPTIDEK"
+        assert index.proteins(indices[0]) == [0, 2]
+        assert index.peptide(indices[1]) == "AACAAK"
+
+    def test_mass_index_matches_brute_force(self):
+        index = digest.build_mass_index(
+            self.seqs, min_len=3, miscleavages=2, fixed_mods={"C": 57.021464}
+        )
+        masses = index.masses
+        precursors = np.linspace(500, 2000, 301)
+        for tolerance, unit in [(0.5, "da"), (20, "ppm"), (50, "Da")]:
+            offsets, indices = index.query(precursors, tolerance, unit=unit)
+            for i, precursor in enumerate(precursors):
+                if unit.lower() == "da":
+                    delta = tolerance
+                else:
+                    delta = precursor * tolerance * 1e-6
+                expected = np.flatnonzero(np.abs(masses - precursor) <= delta)
+                assert sorted(indices[offsets[i] : offsets[i + 1]]) == list(expected)
+
+    def test_mass_index_query_strided(self):
+        index = digest.build_mass_index(self.seqs, min_len=3, miscleavages=1)
+        precursors = np.array([927.4549, 0.0, 533.2632, 0.0])
+        offsets, indices = index.query(precursors[::2], 10, unit="ppm")
+        expected = index.query(precursors[::2].copy(), 10, unit="ppm")
+        assert list(offsets) == list(expected[0]) == [0, 1, 2]
+        assert list(indices) == list(expected[1])
+
+    def test_mass_index_unknown_residues(self):
+        index = digest.build_mass_index(self.seqs, min_len=3)
+        assert np.isnan(index.masses).sum() == 1
+        offsets, indices = index.query([0.0], 1e6, unit="da")
+        assert len(indices) == len(index) - 1
+
+    def test_mass_index_unknown_unit(self):
+        index = digest.build_mass_index(self.seqs)
+        with pytest.raises(ValueError):
+            index.query([927.4549], 10, unit="mmu")
+
+
+class TestPeptideDatabase:
+    seqs = ["PEPTIDEKAACAAKXAAARPEPTIDEK", "AACAAKMMMMMMR", "PEPTIDEK"]
+
+    def test_peptide_database(self, tmp_path):
+        path = tmp_path / "peptides.pepdb"
+        digest.write_peptide_database(path, self.seqs, min_len=3, miscleavages=1)
+        index = digest.build_peptide_index(self.seqs, min_len=3, miscleavages=1)
+        with PeptideDatabase(path) as db:
+            assert len(db) == len(index) == 7
+            assert db.n_proteins == 3
+            assert db.masses is None
+            assert db.peptides() == index.peptides()
+            assert list(db.protein_offsets) == list(index.protein_offsets)
+            assert list(db.protein_indices) == list(index.protein_indices)
+            assert list(db["PEPTIDEK"]) == [0, 2]
+            assert "AACAAK" in db and "PEPTIDE" not in db
+            assert db.peptide(db.find("MMMMMMR")) == "MMMMMMR"
+            with pytest.raises(KeyError):
+                db["PEPTIDE"]
+
+    def test_peptide_database_masses(self, tmp_path):
+        path = tmp_path / "peptides.pepdb"
+        digest.write_peptide_database(
+            path, self.seqs, min_len=3, with_masses=True, fixed_mods={"C": 57.021464}
+        )
+        with PeptideDatabase(path) as db:
+            masses = dict(zip(db.peptides(), db.masses))
+            assert masses["PEPTIDEK"] == pytest.approx(927.45493, abs=1e-5)
+            assert masses["AACAAK"] == pytest.approx(590.28463, abs=1e-5)
+            assert np.isnan(masses["XAAARPEPTIDEK"])
+
+    def test_peptide_database_views_after_close(self, tmp_path):
+        path = tmp_path / "peptides.pepdb"
+        digest.write_peptide_database(path, self.seqs, min_len=3, with_masses=True)
+        with PeptideDatabase(path) as db:
+            masses = db.masses
+            proteins = db["PEPTIDEK"]
+            expected = masses.copy()
+        assert list(masses) == list(expected)
+        assert list(proteins) == [0, 2]
+        db = PeptideDatabase(path)
+        residues = db.residues
+        db.close()
+        assert len(residues) > 0
+
+    def test_peptide_database_empty(self, tmp_path):
+        path = tmp_path / "peptides.pepdb"
+        digest.write_peptide_database(path, [], with_masses=True)
+        with PeptideDatabase(path) as db:
+            assert len(db) == 0 and db.peptides() == [] and len(db.masses) == 0
+            assert db.find("PEPTIDEK") is None
+
+    def test_not_a_peptide_database(self, tmp_path):
+        path = tmp_path / "peptides.pepdb"
+        path.write_bytes(b"\0" * 64)
+        with pytest.raises(ValueError):
+            PeptideDatabase(path)
+
+
+class TestUniquePeptides:
+    seq = "MAAAAAAKAAAAAAKAAAAAAKPEPTIDEK"
+
+    def test_unique(self, backend):
+        for digestion in ["full", "semi", "none"]:
+            peptides = backend.get_digested_peptides(
+                self.seq, digestion=digestion, miscleavages=1
+            )
+            assert backend.get_digested_peptides(
+                self.seq, digestion=digestion, miscleavages=1, unique=True
+            ) == list(dict.fromkeys(peptides))
+        assert backend.get_digested_peptides(self.seq, unique=True) == [
+            "MAAAAAAK",
+            "AAAAAAK",
+            "AAAAAAKPEPTIDEK",
+        ]
+
+    def test_unique_python(self):
+        assert list(digest_py.get_digested_peptides(self.seq, unique=True)) == [
+            "MAAAAAAK",
+            "AAAAAAK",
+            "AAAAAAKPEPTIDEK",
+        ]
+
+    def test_unique_masses(self):
+        peptides, masses = digest.get_digested_peptides(
+            self.seq, unique=True, return_masses=True
+        )
+        assert peptides == ["MAAAAAAK", "AAAAAAK", "AAAAAAKPEPTIDEK"]
+        assert len(masses) == 3
+
+
+class TestBackends:
+    def test_get_backend(self):
+        assert get_backend("numpy") is digest_np
+        assert get_backend("rust") is digest
+        assert get_backend() is digest
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            get_backend("fortran")
+
+    def test_no_backend_available(self, monkeypatch):
+        monkeypatch.setattr("protein_digest.BACKENDS", {"rust": "missing_backend"})
+        with pytest.raises(ImportError) as excinfo:
+            get_backend()
+        assert isinstance(excinfo.value.__cause__, ImportError)
+
+
+class TestThreads:
+    """Concurrent digestion from many threads, which run in parallel with the
+    GIL released and on free-threaded Python builds"""
+
+    seqs = [
+        "MRPSGTAGAALLALLAALCPASRALEEKKVCQGTSNKLTQLGTFEDHFLSLQRMFNNCEV" * 20,
+        "VLGNLEITYVQRNYDLSFLKTIQEVAGYVLIALNTVERIPLENLQIIRGNMYYENSYALA" * 20,
+        "ABCDEFKPXAAARAAAAAAEAAAAAADAAAAAAWAAAAAAA" * 20,
+    ]
+
+    def test_concurrent_digestion(self, backend):
+        from concurrent.futures import ThreadPoolExecutor
+
+        def digest_all(i):
+            seq = self.seqs[i % len(self.seqs)]
+            return (
+                backend.get_digested_peptides(seq, digestion="semi", miscleavages=2),
+                backend.get_digested_offsets(seq, miscleavages=2),
+                backend.count_peptides(seq, digestion="none"),
+            )
+
+        expected = [digest_all(i) for i in range(len(self.seqs))]
+        with ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(digest_all, range(480)))
+        for i, (peptides, (starts, ends), counts) in enumerate(results):
+            expected_peptides, (expected_starts, expected_ends), expected_counts = (
+                expected[i % len(self.seqs)]
+            )
+            assert peptides == expected_peptides
+            assert np.array_equal(starts, expected_starts)
+            assert np.array_equal(ends, expected_ends)
+            assert counts == expected_counts
+
+    def test_concurrent_index(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        expected = digest.build_peptide_index(self.seqs, digestion="semi").peptides()
+        with ThreadPoolExecutor(8) as executor:
+            indices = list(
+                executor.map(
+                    lambda _: digest.build_peptide_index(self.seqs, digestion="semi"),
+                    range(32),
+                )
+            )
+        assert all(index.peptides() == expected for index in indices)
+
+
+class TestAsyncDigest:
+    seqs = [
+        "MRPSGTAGAALLALLAALCPASRALEEKKVCQGTSNKLTQLGTFEDHFLSLQRMFNNCEV",
+        "VLGNLEITYVQRNYDLSFLKTIQEVAGYVLIALNTVERIPLENLQIIRGNMYYENSYALA",
+        "ABCDEFKPXAAARAAAAAAEAAAAAADAAAAAAWAAAAAAA" * 30,
+    ]
+
+    def test_adigest(self):
+        peptides = asyncio.run(adigest(self.seqs[0], miscleavages=1))
+        assert peptides == digest.get_digested_peptides(self.seqs[0], miscleavages=1)
+
+    @pytest.mark.parametrize("backend", ["rust", "numpy", "python"])
+    def test_batched_requests(self, backend, monkeypatch):
+        digester = AsyncDigester(batch_size=8, batch_delay=0.05, batch_max_len=100)
+        digester.module = get_backend(backend)
+        batches = []
+        digest_batch = digester.digest_batch
+
+        def count_batches(seqs, kwargs):
+            batches.append(len(seqs))
+            return digest_batch(seqs, kwargs)
+
+        monkeypatch.setattr(digester, "digest_batch", count_batches)
+
+        async def digest_all():
+            return await asyncio.gather(
+                *[digester.digest(seq, digestion="semi") for seq in self.seqs * 4]
+            )
+
+        results = asyncio.run(digest_all())
+        digester.shutdown()
+        for seq, peptides in zip(self.seqs * 4, results):
+            assert peptides == list(
+                digest_py.get_digested_peptides(seq, digestion="semi")
+            )
+        # the long sequences are digested separately, the short ones in a batch
+        assert sorted(batches) == [1, 1, 1, 1, 8]
+
+    @pytest.mark.parametrize("backend", ["numpy", "python"])
+    def test_batch_with_empty_sequence(self, backend):
+        seqs = [self.seqs[0], "", self.seqs[1]]
+
+        async def digest_all():
+            async with AsyncDigester(batch_delay=0.05, backend=backend) as digester:
+                return await asyncio.gather(*[digester.digest(seq) for seq in seqs])
+
+        results = asyncio.run(digest_all())
+        assert results == [list(digest_np.get_digested_peptides(seq)) for seq in seqs]
+        assert results[1] == []
+
+    def test_cancel_request(self):
+        digester = AsyncDigester(batch_delay=0.05, backend="numpy")
+
+        async def digest_and_cancel():
+            cancelled = asyncio.ensure_future(digester.digest(self.seqs[0]))
+            other = asyncio.ensure_future(digester.digest(self.seqs[1]))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            return await other
+
+        peptides = asyncio.run(digest_and_cancel())
+        digester.shutdown()
+        assert peptides == digest_np.get_digested_peptides(self.seqs[1])
+
+    def test_adigest_proteome(self, tmp_path):
+        fasta_file = tmp_path / "proteins.fasta"
+        fasta_file.write_text(
+            "".join(f">P{i}\n{seq}\n" for i, seq in enumerate(self.seqs * 3))
+        )
+
+        async def collect():
+            return [
+                protein
+                async for protein in adigest_proteome(
+                    fasta_file, batch_size=2, miscleavages=1
+                )
+            ]
+
+        assert asyncio.run(collect()) == [
+            (f"P{i}", digest.get_digested_peptides(seq, miscleavages=1))
+            for i, seq in enumerate(self.seqs * 3)
+        ]
+
+
+class TestDigestProteome:
+    seqs = [
+        "MRPSGTAGAALLALLAALCPASRALEEKKVCQGTSNKLTQLGTFEDHFLSLQRMFNNCEV",
+        "ABCDEFGHKAAAAAA",
+        "M",
+        "ABCDEFKPXAAARAAAAAAEAAAAAADAAAAAAWAAAAAAA" * 3,
+        "VLGNLEITYVQRNYDLSFLKTIQEVAGYVLIALNTVERIPLENLQIIRGNMYYENSYALA",
+    ] * 5
+
+    def test_digest_proteome_matches_single(self):
+        for digestion in ["full", "semi"]:
+            expected = [
+                list(
+                    digest_py.get_digested_peptides(
+                        seq, digestion=digestion, miscleavages=1
+                    )
+                )
+                for seq in self.seqs
+            ]
+            for workers in [1, 2]:
+                assert (
+                    list(
+                        digest_py.digest_proteome(
+                            self.seqs,
+                            digestion=digestion,
+                            miscleavages=1,
+                            workers=workers,
+                        )
+                    )
+                    == expected
+                )
+
+    def test_digest_proteome_enzyme(self):
+        enzyme = digest_py.Enzyme.from_name("asp-n")
+        assert list(digest_py.digest_proteome(self.seqs, enzyme=enzyme, workers=2)) == [
+            list(digest_py.get_digested_peptides(seq, enzyme=enzyme))
+            for seq in self.seqs
+        ]
+
+    def test_digest_proteome_empty_record(self, tmp_path):
+        fasta_file = tmp_path / "proteins.fasta"
+        fasta_file.write_text(">P1\nMAAAAAAKAAAAAAR\n>P2\n>P3\nAAAAAAK\n")
+        seqs = [seq for _, seq in digest_py.read_fasta(fasta_file)]
+        assert seqs[1] == ""
+        for digestion in ["full", "semi", "none"]:
+            expected = [
+                list(digest_np.get_digested_peptides(seq, digestion=digestion))
+                for seq in seqs
+            ]
+            assert expected[1] == []
+            for workers in [1, 2]:
+                assert (
+                    list(
+                        digest_py.digest_proteome(
+                            seqs, digestion=digestion, workers=workers
+                        )
+                    )
+                    == expected
+                )
+
+    def test_balanced_chunks(self):
+        seqs = ["A" * 100] * 10 + ["A" * 1000]
+        chunks = list(digest_py.balanced_chunks(seqs, 4))
+        assert [seq for chunk in chunks for seq in chunk] == seqs
+        assert len(chunks) <= 4
+
+
+class TestDigestCache:
+    fasta = (
+        ">sp|P1|A\nMRPSGTAGAALLALLAALCPASRALEEKKVCQGTSNKLTQLGTFEDHFLSLQRMFNNCEV\n"
+        ">sp|P2|B\nVLGNLEITYVQRNYDLSFLKTIQEVAGYVLIALNT\nVERIPLENLQIIRGNMYYENSYALA\n"
+        ">sp|P3|C\nAAAAA\n"
+    )
+
+    def test_cache_hit(self, tmp_path):
+        fasta_file = tmp_path / "proteins.fasta"
+        fasta_file.write_text(self.fasta)
+        cache = DigestCache(tmp_path / "cache")
+
+        proteome = cache.digest_fasta(fasta_file, miscleavages=1, backend="python")
+        expected = [
+            (protein_id, list(digest_py.get_digested_peptides(seq, miscleavages=1)))
+            for protein_id, seq in digest_py.read_fasta(fasta_file)
+        ]
+        assert list(proteome) == expected
+        assert len(cache.entries()) == 1
+
+        proteome = cache.digest_fasta(fasta_file, miscleavages=1, backend="python")
+        assert list(proteome) == expected
+        assert proteome.peptides() == [p for _, peptides in expected for p in peptides]
+        assert len(cache.entries()) == 1
+
+    def test_cache_non_ascii_ids(self, tmp_path):
+        fasta_file = tmp_path / "proteins.fasta"
+        fasta_file.write_text(">Pé1\nAAAKBBBBBBR\n>P2\nCCCCCCK\n", encoding="utf-8")
+        cache = DigestCache(tmp_path / "cache")
+        for _ in range(2):
+            proteome = cache.digest_fasta(fasta_file, backend="python")
+            assert proteome.protein_ids == ["Pé1", "P2"]
+
+    def test_cache_key_parameters(self, tmp_path):
+        fasta_file = tmp_path / "proteins.fasta"
+        fasta_file.write_text(self.fasta)
+        cache = DigestCache(tmp_path / "cache")
+        cache.digest_fasta(fasta_file, backend="python")
+        cache.digest_fasta(fasta_file, miscleavages=2, backend="python")
+        cache.digest_fasta(fasta_file, digestion="semi", backend="python")
+        enzyme = digest_py.Enzyme(pre=["K", "R"], not_post=["P"])
+        cache.digest_fasta(fasta_file, enzyme=enzyme, backend="python")
+        assert len(cache.entries()) == 3
+
+        fasta_file.write_text(self.fasta + ">sp|P4|D\nKKKK\n")
+        assert len(cache.digest_fasta(fasta_file, backend="python")) == 4
+        assert len(cache.entries()) == 4
+
+    def test_cache_key_backend(self, tmp_path):
+        cache = DigestCache(tmp_path)
+        cache.digest_sequences(["M"], min_len=1, backend="python")
+        cache.digest_sequences(["M"], min_len=1, backend="numpy")
+        cache.digest_sequences(["M"], min_len=1, backend="numpy")
+        assert len(cache.entries()) == 2
+
+    def test_cache_empty_record(self, tmp_path):
+        fasta_file = tmp_path / "proteins.fasta"
+        fasta_file.write_text(">P1\nMAAAAAAKAAAAAAR\n>P2\n>P3\nAAAAAAK\n")
+        cache = DigestCache(tmp_path / "cache")
+        for backend in ["python", "numpy"]:
+            proteome = cache.digest_fasta(fasta_file, backend=backend)
+            assert list(proteome) == [
+                ("P1", ["MAAAAAAK", "AAAAAAK", "AAAAAAR"]),
+                ("P2", []),
+                ("P3", ["AAAAAAK"]),
+            ]
+        assert not list((tmp_path / "cache").glob("*.tmp"))
+
+    def test_cache_sequences(self, tmp_path):
+        seqs = ["ABCDEFGHKAAAAAA", "ABCDEFKPXAAARAAAAAAE", "AAA"]
+        cache = DigestCache(tmp_path)
+        for _ in range(2):
+            proteome = cache.digest_sequences(seqs, backend="numpy")
+            assert proteome.protein_ids == ["0", "1", "2"]
+            assert [peptides for _, peptides in proteome] == [
+                digest_np.get_digested_peptides(seq) for seq in seqs
+            ]
+
+    def test_cache_eviction(self, tmp_path):
+        cache = DigestCache(tmp_path)
+        # entries of equally long sequences have the same size
+        seqs = {aa: [aa + "BCDEFGHKAAAAAA" * 10] for aa in "ABCD"}
+        for i, aa in enumerate("ABC"):
+            cache.digest_sequences(seqs[aa], digestion="none", backend="numpy")
+            os.utime(cache.entries()[-1], (i, i))
+        cache.max_size = cache.size()
+
+        # accessing the oldest entry makes it the most recently used
+        cache.digest_sequences(seqs["A"], digestion="none", backend="numpy")
+        cache.digest_sequences(seqs["D"], digestion="none", backend="numpy")
+        assert cache.size() <= cache.max_size
+        assert sorted(
+            CachedProteome(path)[0][1][0][0] for path in cache.entries()
+        ) == ["A", "C", "D"]
+
+    def test_cache_corrupt_entry(self, tmp_path):
+        cache = DigestCache(tmp_path)
+        cache.digest_sequences(["ABCDEFGHKAAAAAA"], backend="python")
+        with open(cache.entries()[0], "wb") as f:
+            f.write(b"corrupt")
+        proteome = cache.digest_sequences(["ABCDEFGHKAAAAAA"], backend="python")
+        assert proteome[0] == ("0", ["ABCDEFGHK", "AAAAAA"])
+
+
+class TestDigestMemo:
+    seq = "MRPSGTAGAALLALLAALCPASRALEEKKVCQGTSNKLTQLGTFEDHFLSLQRMFNNCEV"
+
+    @pytest.mark.parametrize("backend", ["rust", "python"])
+    def test_memo_hit(self, backend):
+        memo = DigestMemo(backend=backend)
+        peptides = memo.get_digested_peptides(self.seq, miscleavages=1)
+        assert peptides == tuple(
+            digest_py.get_digested_peptides(self.seq, miscleavages=1)
+        )
+        assert memo.get_digested_peptides(self.seq, miscleavages=1) is peptides
+        assert memo.stats[:2] == (1, 1)
+        assert len(memo) == 1
+
+    def test_memo_key_parameters(self):
+        memo = DigestMemo(backend="python")
+        memo.get_digested_peptides(self.seq)
+        memo.get_digested_peptides(self.seq, miscleavages=2)
+        memo.get_digested_peptides(self.seq, unique=True)
+        memo.get_digested_peptides(self.seq, enzyme=digest_py.Enzyme.from_name("lys-c"))
+        memo.get_digested_peptides(self.seq, pre=["R", "K"])
+        assert memo.stats.misses == 4
+        assert memo.stats.hits == 1
+
+    def test_memo_eviction(self):
+        memo = DigestMemo(max_entries=2, backend="python")
+        seqs = ["AAAAAAKCCCCCCK", "DDDDDDKEEEEEEK", "FFFFFFKGGGGGGK"]
+        for seq in seqs:
+            memo.get_digested_peptides(seq)
+        assert len(memo) == 2
+        assert memo.stats.evictions == 1
+        memo.get_digested_peptides(seqs[0])
+        assert memo.stats.misses == 4
+
+        n_bytes = memo.stats.n_bytes // 2
+        memo = DigestMemo(max_bytes=n_bytes + 1, backend="python")
+        for seq in seqs:
+            memo.get_digested_peptides(seq)
+        assert len(memo) == 1
+        assert memo.stats.n_bytes <= n_bytes + 1
+
+    def test_memo_masses_read_only(self):
+        memo = DigestMemo(backend="rust")
+        peptides, masses = memo.get_digested_peptides(self.seq, return_masses=True)
+        assert isinstance(peptides, tuple)
+        with pytest.raises(ValueError):
+            masses[0] = 0.0
+
+    def test_memo_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        memo = DigestMemo(max_entries=8, backend="python")
+        seqs = [self.seq[i:] for i in range(16)]
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(memo.get_digested_peptides, seqs * 20))
+        for seq, peptides in zip(seqs * 20, results):
+            assert peptides == tuple(digest_py.get_digested_peptides(seq))
+        stats = memo.stats
+        assert stats.hits + stats.misses == 320
+        assert stats.entries == len(memo) <= 8
+
+
+class TestArrowExport:
+    fasta = TestDigestCache.fasta
+    seqs = [
+        "MRPSGTAGAALLALLAALCPASRALEEKKVCQGTSNKLTQLGTFEDHFLSLQRMFNNCEV",
+        "",
+        "ABCDEFKPXAAARAAAAAAEAAAAAADAAAAAAWAAAAAAA",
+        "AAAAA",
+    ]
+
+    @pytest.mark.parametrize("backend_name", ["rust", "numpy", "python"])
+    def test_record_batch(self, backend_name):
+        arrow = pytest.importorskip("protein_digest.arrow")
+        batch = arrow.to_record_batch(
+            self.seqs, ["a", "b", "c", "d"], miscleavages=1, backend=backend_name
+        )
+        assert batch.schema == arrow.SCHEMA
+        expected = [
+            (protein_id, peptide)
+            for protein_id, seq in zip("abcd", self.seqs)
+            if seq
+            for peptide in digest_py.get_digested_peptides(seq, miscleavages=1)
+        ]
+        rows = batch.to_pydict()
+        assert list(zip(rows["protein_id"], rows["peptide"])) == expected
+        assert [
+            self.seqs["abcd".index(protein_id)][start:end]
+            for protein_id, start, end in zip(
+                rows["protein_id"], rows["start"], rows["end"]
+            )
+        ] == rows["peptide"]
+
+    def test_digest_many_columnar(self):
+        arrow = pytest.importorskip("protein_digest.arrow")
+        for digestion in ["full", "semi"]:
+            for rust, numpy in zip(
+                digest.digest_many_columnar(self.seqs, digestion=digestion),
+                arrow.digest_columns(self.seqs, digestion=digestion, backend="numpy"),
+            ):
+                assert rust.dtype == numpy.dtype
+                assert list(rust) == list(numpy)
+
+    def test_write_parquet(self, tmp_path):
+        arrow = pytest.importorskip("protein_digest.arrow")
+        import pyarrow.parquet as pq
+
+        fasta_file = tmp_path / "proteins.fasta.gz"
+        with gzip.open(fasta_file, "wt") as f:
+            f.write(self.fasta)
+        path = tmp_path / "peptides.parquet"
+        n_peptides = arrow.write_parquet(path, fasta_file, batch_size=2)
+
+        table = pq.read_table(path)
+        assert table.num_rows == n_peptides
+        assert list(zip(*table.to_pydict().values())) == [
+            (protein_id, peptide, start, start + len(peptide))
+            for protein_id, seq in digest_py.read_fasta(fasta_file)
+            for peptide, start in zip(
+                digest_np.get_digested_peptides(seq),
+                digest_np.get_digested_offsets(seq)[0],
+            )
+        ]